@@ -0,0 +1,110 @@
+import time
+
+# Estados de una conversacion en el almacen
+AGRUPANDO = "agrupando"  # Acumulando fragmentos hasta que la ventana se cierre
+PROCESANDO = "procesando"  # El pipeline esta generando la respuesta
+CERRADA = "cerrada"  # Respuesta enviada; lo que llegue espera al fin del enfriamiento
+
+
+class AgregadorMensajes:
+    """
+    Ventana de agrupacion (debounce) por numero: los fragmentos que llegan
+    mientras la ventana esta abierta se acumulan y, cuando pasan `ventana`
+    segundos sin mensajes nuevos, se entregan concatenados para una sola
+    extraccion.
+
+    Los fragmentos que llegan mientras se procesa la conversacion o durante
+    el enfriamiento no se pierden: quedan en el buffer y abren la proxima
+    ventana cuando termina la ejecucion en curso (o el enfriamiento).
+
+    El estado vive en un `Almacen`, por lo que funciona igual con varios
+    procesos: cada fragmento programa un temporizador local y solo el que
+    vence despues del ultimo fragmento reclama el buffer.
+    """
+
+    def __init__(self, almacen, ventana=1, enfriamiento=5, ttl=3600, limite_procesando=120):
+        self.almacen = almacen
+        self.ventana = ventana
+        self.enfriamiento = enfriamiento
+        self.ttl = ttl
+        # Si un trabajador muere a mitad del pipeline la conversacion no
+        # queda bloqueada mas alla de este limite
+        self.limite_procesando = limite_procesando
+
+    def _vencida(self, conv, ahora):
+        if conv["estado"] == PROCESANDO:
+            return ahora - conv["timestamp"] >= self.limite_procesando
+        if conv["estado"] == CERRADA:
+            return ahora - conv["timestamp"] >= self.enfriamiento
+        return False
+
+    def agregar(self, numero, message_id, texto, ahora=None):
+        """
+        Acumula el fragmento; hay que programar el cierre de la ventana.
+        Devuelve False solo si el mensaje ya estaba en el buffer (reintento).
+        """
+        ahora = ahora or time.time()
+
+        def agregar(conv):
+            if conv is None or self._vencida(conv, ahora):
+                conv = {"estado": AGRUPANDO, "timestamp": ahora, "textos": [], "message_ids": []}
+            elif message_id in conv["message_ids"]:
+                return conv, False
+            elif conv["estado"] == CERRADA:
+                # La ventana nueva no cierra antes de que termine el enfriamiento
+                conv["estado"] = AGRUPANDO
+                conv["no_antes"] = conv["timestamp"] + self.enfriamiento
+            conv["textos"].append(texto)
+            conv["message_ids"].append(message_id)
+            if conv["estado"] == AGRUPANDO:
+                conv["timestamp"] = ahora
+            return conv, True
+
+        return self.almacen.actualizar(numero, agregar, self.ttl)
+
+    def reclamar(self, numero, ahora=None):
+        """
+        Cierra la ventana si ya vencio. Devuelve `(texto, message_ids)` si este
+        llamador debe procesar la conversacion, los segundos que faltan si la
+        ventana sigue abierta (o se esta procesando la anterior), o None si no
+        hay nada que procesar.
+        """
+        ahora = ahora or time.time()
+
+        def reclamar(conv):
+            if conv is None or not conv["textos"]:
+                return conv, None
+            if conv["estado"] == PROCESANDO and not self._vencida(conv, ahora):
+                # Fragmentos llegados durante la ejecucion: esperar a que termine
+                return conv, float(self.ventana)
+            restante = max(conv["timestamp"] + self.ventana, conv.get("no_antes", 0)) - ahora
+            if conv["estado"] == AGRUPANDO and restante > 0:
+                return conv, restante
+            texto = "\n".join(conv["textos"])
+            message_ids = conv["message_ids"]
+            return {"estado": PROCESANDO, "timestamp": ahora, "textos": [], "message_ids": []}, (texto, message_ids)
+
+        return self.almacen.actualizar(numero, reclamar, self.ttl)
+
+    def _terminar(self, numero, enfriar):
+        def terminar(conv):
+            if conv is None:
+                return None, None
+            ahora = time.time()
+            if conv["textos"]:
+                # Llegaron fragmentos durante la ejecucion: abren la ventana siguiente
+                return {"estado": AGRUPANDO, "timestamp": ahora,
+                        "textos": conv["textos"], "message_ids": conv["message_ids"]}, None
+            if not enfriar:
+                return None, None
+            return {"estado": CERRADA, "timestamp": ahora, "textos": [], "message_ids": []}, None
+
+        self.almacen.actualizar(numero, terminar, self.ttl)
+
+    def cerrar(self, numero):
+        """Termina la ejecucion con enfriamiento"""
+        self._terminar(numero, True)
+
+    def liberar(self, numero):
+        """Termina la ejecucion sin enfriamiento"""
+        self._terminar(numero, False)
@@ -0,0 +1,235 @@
+"""
+Almacenes clave/valor con expiracion (TTL) para el estado del bot:
+ids de mensajes ya procesados y conversaciones activas.
+
+- AlmacenMemoria: un solo proceso; expiracion O(1) con OrderedDict.
+- AlmacenSQLite: archivo SQLite compartido entre procesos (gunicorn -w N).
+
+Ambos exponen la misma interfaz; `actualizar` es la operacion atomica de
+lectura-modificacion-escritura sobre la que se construye la logica de
+agrupacion y deduplicacion.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Almacen(ABC):
+    @abstractmethod
+    def obtener(self, clave):
+        pass
+
+    @abstractmethod
+    def guardar(self, clave, valor, ttl=None):
+        pass
+
+    @abstractmethod
+    def eliminar(self, clave):
+        pass
+
+    @abstractmethod
+    def actualizar(self, clave, funcion, ttl=None):
+        """
+        Aplica `funcion(valor_actual)` de forma atomica. La funcion devuelve
+        `(nuevo_valor, resultado)`; si `nuevo_valor` es None la clave se elimina.
+        Devuelve `resultado`.
+        """
+
+    def agregar_si_no_existe(self, clave, valor=True, ttl=None):
+        """Guarda la clave solo si no existe (o expiro). True si se agrego."""
+        def agregar(actual):
+            if actual is not None:
+                return actual, False
+            return valor, True
+        return self.actualizar(clave, agregar, ttl)
+
+    @abstractmethod
+    def purgar(self):
+        pass
+
+    @abstractmethod
+    def tamano(self):
+        pass
+
+
+class AlmacenMemoria(Almacen):
+    """
+    Almacen en memoria. Las entradas se mantienen en orden de escritura, que
+    con un TTL uniforme es tambien el orden de vencimiento: la purga solo
+    revisa la cabeza del OrderedDict. Los bloqueos por clave se reparten en
+    un numero fijo de locks (striping) para no crecer con las claves.
+    """
+
+    def __init__(self, ttl=3600, max_entradas=100000, num_locks=64):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(num_locks)]
+
+    @contextmanager
+    def bloqueo(self, clave):
+        with self._locks[hash(clave) % len(self._locks)]:
+            yield
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            vence, valor = entrada
+            if vence <= time.time():
+                del self._datos[clave]
+                return None
+            return valor
+
+    def guardar(self, clave, valor, ttl=None):
+        vence = time.time() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._datos[clave] = (vence, valor)
+            self._datos.move_to_end(clave)
+            self._purgar_cabeza()
+
+    def eliminar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def actualizar(self, clave, funcion, ttl=None):
+        with self.bloqueo(clave):
+            nuevo_valor, resultado = funcion(self.obtener(clave))
+            if nuevo_valor is None:
+                self.eliminar(clave)
+            else:
+                self.guardar(clave, nuevo_valor, ttl)
+            return resultado
+
+    def purgar(self):
+        with self._lock:
+            self._purgar_cabeza()
+
+    def tamano(self):
+        return len(self._datos)
+
+    def _purgar_cabeza(self):
+        ahora = time.time()
+        while self._datos:
+            clave, (vence, _) = next(iter(self._datos.items()))
+            if vence > ahora and len(self._datos) <= self.max_entradas:
+                break
+            del self._datos[clave]
+
+
+class AlmacenSQLite(Almacen):
+    """
+    Almacen respaldado por SQLite en modo WAL, compartido por todos los
+    procesos que abren el mismo archivo. `actualizar` corre dentro de una
+    transaccion BEGIN IMMEDIATE, que serializa a los escritores entre procesos.
+    Los valores se guardan como JSON.
+
+    Las lecturas ya ignoran lo vencido: borrarlo solo recupera espacio. Se
+    borra cada `purgar_cada` escrituras y, con `purgar`, como mucho una vez
+    cada `purgar_intervalo` segundos por proceso, para no tomar el lock de
+    escritura en cada webhook.
+    """
+
+    def __init__(self, ruta, tabla, ttl=3600, purgar_cada=500, purgar_intervalo=60):
+        self.ruta = ruta
+        self.tabla = tabla
+        self.ttl = ttl
+        self.purgar_cada = purgar_cada
+        self.purgar_intervalo = purgar_intervalo
+        self._local = threading.local()
+        self._escrituras = 0
+        self._proxima_purga = 0.0
+        with self._transaccion() as con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {tabla} ("
+                "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, vence REAL NOT NULL)"
+            )
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_vence ON {tabla} (vence)")
+
+    def _conexion(self):
+        # Una conexion por hilo y por proceso: tras un fork (gunicorn con
+        # preload) el hijo no reutiliza la conexion heredada del padre.
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    @contextmanager
+    def _transaccion(self):
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    def _leer(self, con, clave):
+        fila = con.execute(
+            f"SELECT valor FROM {self.tabla} WHERE clave = ? AND vence > ?",
+            (clave, time.time()),
+        ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def _escribir(self, con, clave, valor, ttl):
+        vence = time.time() + (ttl if ttl is not None else self.ttl)
+        con.execute(
+            f"INSERT OR REPLACE INTO {self.tabla} (clave, valor, vence) VALUES (?, ?, ?)",
+            (clave, json.dumps(valor), vence),
+        )
+        self._escrituras += 1
+        if self._escrituras % self.purgar_cada == 0:
+            con.execute(f"DELETE FROM {self.tabla} WHERE vence <= ?", (time.time(),))
+
+    def obtener(self, clave):
+        return self._leer(self._conexion(), clave)
+
+    def guardar(self, clave, valor, ttl=None):
+        with self._transaccion() as con:
+            self._escribir(con, clave, valor, ttl)
+
+    def eliminar(self, clave):
+        self._conexion().execute(f"DELETE FROM {self.tabla} WHERE clave = ?", (clave,))
+
+    def actualizar(self, clave, funcion, ttl=None):
+        with self._transaccion() as con:
+            nuevo_valor, resultado = funcion(self._leer(con, clave))
+            if nuevo_valor is None:
+                con.execute(f"DELETE FROM {self.tabla} WHERE clave = ?", (clave,))
+            else:
+                self._escribir(con, clave, nuevo_valor, ttl)
+            return resultado
+
+    def purgar(self):
+        ahora = time.monotonic()
+        if ahora < self._proxima_purga:
+            return
+        self._proxima_purga = ahora + self.purgar_intervalo
+        self._conexion().execute(f"DELETE FROM {self.tabla} WHERE vence <= ?", (time.time(),))
+
+    def tamano(self):
+        fila = self._conexion().execute(
+            f"SELECT COUNT(*) FROM {self.tabla} WHERE vence > ?", (time.time(),)
+        ).fetchone()
+        return fila[0]
+
+
+def crear_almacen(nombre, backend="memoria", ruta_sqlite=None, ttl=3600):
+    """Crea el almacen `nombre` con el backend configurado"""
+    if backend == "memoria":
+        return AlmacenMemoria(ttl=ttl)
+    if backend == "sqlite":
+        return AlmacenSQLite(ruta_sqlite, nombre, ttl=ttl)
+    raise ValueError(f"Backend de almacen desconocido: {backend}")
@@ -1,242 +1,202 @@
-from flask import Flask, request, jsonify
-import requests
-import time
-import json
-from datetime import datetime
-from config import (
-    API_KEY, EVOLUTION_API_BASE, WEBHOOK_TOKEN,
-    DURACION_ESCRIBIENDO, TIEMPO_MENSAJE_ANTIGUO, TIEMPO_AGRUPACION,
-    NUMERO_AUTORIZADO
-)
-from extractor import extraer_informacion_reserva
-from pdf_generator import generar_cotizacion_pdf
-from precios import obtener_precios_habitaciones, calcular_totales
-
-app = Flask(__name__)
-
-conversaciones_activas = {}
-mensajes_procesados = set()
-
-def debe_procesar_mensaje(numero, message_id, timestamp_mensaje):
-    ahora = time.time()
-    
-    if message_id in mensajes_procesados:
-        return False
-    
-    diferencia = ahora - timestamp_mensaje
-    if diferencia > TIEMPO_MENSAJE_ANTIGUO:
-        mensajes_procesados.add(message_id)
-        return False
-    
-    if numero in conversaciones_activas:
-        conv = conversaciones_activas[numero]
-        
-        if conv["estado"] == "cerrada":
-            tiempo_desde_cierre = ahora - conv["timestamp"]
-            if tiempo_desde_cierre < 5:
-                mensajes_procesados.add(message_id)
-                return False
-            else:
-                conv["estado"] = "activa"
-                conv["timestamp"] = ahora
-                conv["message_ids"] = [message_id]
-        
-        elif conv["estado"] == "activa":
-            tiempo_desde_ultimo = ahora - conv["timestamp"]
-            if tiempo_desde_ultimo < TIEMPO_AGRUPACION:
-                conv["message_ids"].append(message_id)
-                conv["timestamp"] = ahora
-                mensajes_procesados.add(message_id)
-                return False
-    else:
-        conversaciones_activas[numero] = {
-            "estado": "activa",
-            "timestamp": ahora,
-            "message_ids": [message_id]
-        }
-    
-    mensajes_procesados.add(message_id)
-    return True
-
-def cerrar_conversacion(numero):
-    if numero in conversaciones_activas:
-        conversaciones_activas[numero]["estado"] = "cerrada"
-        conversaciones_activas[numero]["timestamp"] = time.time()
-
-def limpiar_cache():
-    if len(mensajes_procesados) > 1000:
-        mensajes_procesados.clear()
-    
-    ahora = time.time()
-    for numero in list(conversaciones_activas.keys()):
-        if ahora - conversaciones_activas[numero]["timestamp"] > 3600:
-            del conversaciones_activas[numero]
-
-def marcar_como_leido(remote_jid, message_id, instance_name):
-    url = f"{EVOLUTION_API_BASE}/chat/markMessageAsRead/{instance_name}"
-    headers = {"Content-Type": "application/json", "apikey": API_KEY}
-    payload = {"remoteJid": remote_jid, "id": message_id}
-    try:
-        requests.post(url, headers=headers, json=payload, timeout=10)
-        return True
-    except Exception:
-        return False
-
-def mostrar_escribiendo(numero, instance_name, duracion=3):
-    url = f"{EVOLUTION_API_BASE}/chat/sendPresence/{instance_name}"
-    headers = {"Content-Type": "application/json", "apikey": API_KEY}
-    payload = {"number": numero, "presence": "composing", "delay": duracion * 1000}
-    try:
-        requests.post(url, headers=headers, json=payload, timeout=10)
-        time.sleep(duracion)
-        return True
-    except Exception:
-        return False
-
-def enviar_mensaje(numero, texto, instance_name):
-    url = f"{EVOLUTION_API_BASE}/message/sendText/{instance_name}"
-    headers = {"Content-Type": "application/json", "apikey": API_KEY}
-    payload = {"number": numero, "text": texto}
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
-        return True
-    except Exception:
-        return False
-
-def enviar_pdf(numero, pdf_base64, instance_name, filename="cotizacion.pdf"):
-    url = f"{EVOLUTION_API_BASE}/message/sendMedia/{instance_name}"
-    headers = {"Content-Type": "application/json", "apikey": API_KEY}
-    payload = {
-        "number": numero,
-        "mediatype": "document",
-        "media": pdf_base64,
-        "fileName": filename
-    }
-    try:
-        requests.post(url, headers=headers, json=payload, timeout=30)
-        return True
-    except Exception:
-        return False
-
-@app.route('/webhook', methods=['POST'])
-def webhook():
-    token = request.args.get('token')
-    if token != WEBHOOK_TOKEN:
-        return jsonify({"error": "Token invalido"}), 401
-    
-    data = request.json
-    try:
-        event = data.get('event')
-        if event != 'messages.upsert':
-            return jsonify({"status": "ok"}), 200
-        
-        instance_name = data.get('instance')
-        mensaje_data = data.get('data', {})
-        
-        if mensaje_data.get('key', {}).get('fromMe'):
-            return jsonify({"status": "ok"}), 200
-        
-        key = mensaje_data.get('key', {})
-        remote_jid = key.get('remoteJid', '')
-        message_id = key.get('id', '')
-        numero = remote_jid.split('@')[0]
-        
-        if numero != NUMERO_AUTORIZADO:
-            return jsonify({"status": "no_autorizado"}), 200
-            
-        timestamp_mensaje = mensaje_data.get('messageTimestamp', 0)
-        message = mensaje_data.get('message', {})
-        texto = (message.get('conversation') or 
-                message.get('extendedTextMessage', {}).get('text') or '')
-        
-        if not texto or not numero:
-            return jsonify({"status": "ok"}), 200
-        
-        if not debe_procesar_mensaje(numero, message_id, timestamp_mensaje):
-            return jsonify({"status": "ok"}), 200
-        
-        limpiar_cache()
-        marcar_como_leido(remote_jid, message_id, instance_name)
-        
-        info_reserva = extraer_informacion_reserva(texto)
-        
-        campos_requeridos = ['check_in', 'check_out', 'cant_personas', 
-                           'cantidad_habitaciones', 'tipo_habitaciones']
-        
-        campos_faltantes = [campo for campo in campos_requeridos 
-                          if not info_reserva.get(campo)]
-        
-        if campos_faltantes:
-            mostrar_escribiendo(numero, instance_name, duracion=DURACION_ESCRIBIENDO)
-            mensaje_error = (
-                "Necesito mas informacion para la cotizacion. Por favor indica: "
-                "Fecha de entrada, fecha de salida, cantidad de personas, "
-                "cantidad de habitaciones y tipo de habitaciones."
-            )
-            enviar_mensaje(numero, mensaje_error, instance_name)
-            cerrar_conversacion(numero)
-            return jsonify({"status": "info_incompleta"}), 200
-        
-        mostrar_escribiendo(numero, instance_name, duracion=DURACION_ESCRIBIENDO)
-        
-        try:
-            check_in = datetime.strptime(info_reserva['check_in'], '%Y-%m-%d')
-            check_out = datetime.strptime(info_reserva['check_out'], '%Y-%m-%d')
-            cantidad_noches = (check_out - check_in).days
-            
-            if cantidad_noches <= 0:
-                raise ValueError("Fechas invalidas")
-            
-            precios = obtener_precios_habitaciones()
-            totales = calcular_totales(
-                info_reserva['tipo_habitaciones'],
-                cantidad_noches,
-                precios
-            )
-            
-            pdf_base64 = generar_cotizacion_pdf(
-                info_reserva,
-                totales,
-                cantidad_noches
-            )
-            
-            # Construir mensaje de resumen
-            habitaciones_lista = []
-            for hab in totales['habitaciones']:
-                habitaciones_lista.append(f"{hab['cantidad']} {hab['tipo'].replace('Habitación ', '')}")
-            
-            mensaje_exito = (
-                f"Cotizacion generada:\n"
-                f"Check-in: {info_reserva['check_in']}\n"
-                f"Check-out: {info_reserva['check_out']}\n"
-                f"Noches: {cantidad_noches}\n"
-                f"Habitaciones: {', '.join(habitaciones_lista)}\n"
-                f"Total: ${totales['total_bruto']:,} CLP\n"
-                f"Enviando PDF..."
-            )
-            
-            enviar_mensaje(numero, mensaje_exito, instance_name)
-            time.sleep(1)
-            enviar_pdf(numero, pdf_base64, instance_name)
-            
-        except Exception as e:
-            print(f"Error generando cotizacion: {e}")
-            enviar_mensaje(
-                numero,
-                "Error generando la cotizacion. Intente nuevamente.",
-                instance_name
-            )
-        
-        cerrar_conversacion(numero)
-        return jsonify({"status": "success"}), 200
-        
-    except Exception as e:
-        print(f"Error en webhook: {e}")
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({"status": "activo"}), 200
-
-if __name__ == '__main__':
+from flask import Flask, Response, request, jsonify
+import base64
+import io
+import time
+from config import (
+    API_KEY, EVOLUTION_API_BASE, TIEMPO_AGRUPACION,
+    NUM_TRABAJADORES, TAMANO_MAXIMO_COLA,
+    HTTP_TAM_POOL, HTTP_TIMEOUT, HTTP_MAX_REINTENTOS, HTTP_BACKOFF,
+    ENVIO_PDF_STREAMING
+)
+from cliente_evolution import ClienteEvolution
+from cola_trabajos import ColaTrabajos
+from metricas import registro
+from nucleo import (
+    admitir, agregador, analizar_webhook, debe_procesar_mensaje, errores_api, estadisticas,
+    hist_api, hist_etapas, limpiar_cache, procesar_mensaje, salida
+)
+import nucleo
+from salida import DOCUMENTO, MARCAR_LEIDO, MENSAJE, PRESENCIA
+
+cliente = ClienteEvolution(
+    EVOLUTION_API_BASE, API_KEY,
+    tam_pool=HTTP_TAM_POOL, timeout=HTTP_TIMEOUT,
+    max_reintentos=HTTP_MAX_REINTENTOS, backoff=HTTP_BACKOFF,
+    histograma=hist_api,
+    contador_errores=errores_api
+)
+cola = ColaTrabajos(
+    num_trabajadores=NUM_TRABAJADORES, tamano_maximo=TAMANO_MAXIMO_COLA,
+    histograma_etapas=hist_etapas,
+    histograma_espera=registro.histograma(
+        "bot_cola_espera_segundos", "Tiempo de espera en la cola antes de ejecutarse"
+    )
+)
+
+registro.gauge("bot_cola_profundidad", "Trabajos pendientes en la cola", cola.profundidad)
+registro.gauge("bot_cola_programados", "Etapas diferidas esperando su temporizador", cola.programados)
+registro.contador_funcion("bot_cola_rechazados_total", "Trabajos rechazados por cola llena", lambda: cola.rechazados)
+
+# Un drenador por numero con envios pendientes, como trabajo de la cola
+salida.al_activar = lambda numero: cola.continuar(0, drenar_salida, numero)
+
+def marcar_como_leido(remote_jid, message_id, instance_name):
+    try:
+        cliente.marcar_como_leido(remote_jid, message_id, instance_name)
+        return True
+    except Exception:
+        return False
+
+def mostrar_escribiendo(numero, instance_name, duracion=3):
+    """Envia la presencia "escribiendo..."; el retardo lo programa quien llama"""
+    try:
+        cliente.enviar_presencia(numero, instance_name, duracion)
+        return True
+    except Exception:
+        return False
+
+def enviar_mensaje(numero, texto, instance_name):
+    try:
+        cliente.enviar_texto(numero, texto, instance_name)
+        return True
+    except Exception:
+        return False
+
+def enviar_pdf(numero, pdf_base64, instance_name, filename="cotizacion.pdf", caption=None):
+    try:
+        cliente.enviar_media(numero, pdf_base64, instance_name, filename, caption=caption)
+        return True
+    except Exception:
+        return False
+
+def enviar_pdf_stream(numero, archivo, instance_name, filename="cotizacion.pdf", caption=None):
+    """Envia el PDF desde un file-like sin materializar el base64 completo"""
+    try:
+        cliente.enviar_media_stream(numero, archivo, instance_name, filename, caption=caption)
+        return True
+    except Exception:
+        return False
+
+def cerrar_agrupacion(numero, remote_jid, instance_name):
+    """
+    Vence la ventana de agrupacion: si no llegaron mas fragmentos, procesa el
+    texto acumulado; si llegaron, vuelve a programarse por el tiempo restante.
+    """
+    reclamo = agregador.reclamar(numero)
+    if reclamo is None:
+        return
+    if isinstance(reclamo, float):
+        cola.continuar(reclamo, cerrar_agrupacion, numero, remote_jid, instance_name)
+        return
+    texto, message_ids = reclamo
+    procesar_mensaje(numero, remote_jid, message_ids[-1], texto, instance_name, cola.etapa)
+
+def drenar_salida(numero):
+    """
+    Envia en orden lo pendiente para `numero`; si el proximo envio aun no
+    corresponde, libera el trabajador y se programa para ese momento.
+    Un envio que falla no detiene a los siguientes; si el drenador termina
+    por un error, el numero se libera igual.
+    """
+    try:
+        while True:
+            envio = salida.siguiente(numero)
+            if envio is None:
+                return
+            if isinstance(envio, float):
+                cola.continuar(envio, drenar_salida, numero)
+                return
+            if envio.escribiendo_desde is not None:
+                cola.registrar_etapa("escribiendo", time.time() - envio.escribiendo_desde)
+            try:
+                with cola.etapa(envio.tipo):
+                    despachar(envio)
+            except Exception as e:
+                print(f"Error enviando {envio.tipo} a {numero}: {e}")
+            finally:
+                if envio.al_terminar is not None:
+                    envio.al_terminar()
+    except BaseException:
+        salida.liberar(numero)
+        raise
+
+def despachar(envio):
+    if envio.tipo == MARCAR_LEIDO:
+        marcar_como_leido(*envio.args, envio.instance)
+    elif envio.tipo == PRESENCIA:
+        numero, duracion = envio.args
+        mostrar_escribiendo(numero, envio.instance, duracion)
+    elif envio.tipo == MENSAJE:
+        numero, texto = envio.args
+        enviar_mensaje(numero, texto, envio.instance)
+    elif envio.tipo == DOCUMENTO:
+        numero, pdf_bytes, caption = envio.args
+        if ENVIO_PDF_STREAMING:
+            # BytesIO comparte el buffer de los bytes en cache, no los copia
+            enviar_pdf_stream(numero, io.BytesIO(pdf_bytes), envio.instance, caption=caption)
+        else:
+            enviar_pdf(numero, base64.b64encode(pdf_bytes).decode('utf-8'), envio.instance, caption=caption)
+
+def webhook():
+    try:
+        mensaje, respuesta = analizar_webhook(request.args.get('token'), request.get_data(cache=False))
+        if respuesta is not None:
+            return jsonify(respuesta[0]), respuesta[1]
+        
+        numero = mensaje["numero"]
+        espera, respuesta = admitir(numero, cola.saturada(), mensaje["message_id"], mensaje["timestamp"])
+        if respuesta is not None:
+            return jsonify(respuesta[0]), respuesta[1]
+        
+        with cola.etapa("dedup"):
+            aceptado = debe_procesar_mensaje(numero, mensaje["message_id"], mensaje["timestamp"], mensaje["texto"])
+        if not aceptado:
+            return jsonify({"status": "ok"}), 200
+        
+        limpiar_cache()
+        
+        # Cada fragmento programa el cierre de la ventana; solo el que vence
+        # despues del ultimo fragmento procesa la conversacion
+        cierre = (TIEMPO_AGRUPACION + espera, cerrar_agrupacion, numero, mensaje["remote_jid"], mensaje["instance"])
+        if not cola.programar(*cierre):
+            # La cola se lleno despues de admitir(); el fragmento ya esta en
+            # su ventana y su id registrado, asi que el cierre no se descarta
+            cola.continuar(*cierre)
+        
+        return jsonify({"status": "encolado"}), 202
+        
+    except Exception as e:
+        print(f"Error en webhook: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def metrics():
+    return Response(registro.texto_prometheus(), mimetype="text/plain; version=0.0.4")
+
+def health():
+    return jsonify({"status": "activo", "cola": cola.estadisticas(),
+                    "evolution_api": cliente.estadisticas(),
+                    **estadisticas()}), 200
+
+def crear_app():
+    """
+    Crea la app Flask. Importar este modulo es liviano: ReportLab, requests,
+    NumPy y el catalogo de precios se cargan con el primer uso o con
+    `precalentar()`, por lo que gunicorn puede precargar la app en el master
+    (preload_app) y cada worker calentarse despues del fork.
+    """
+    app = Flask(__name__)
+    app.add_url_rule('/webhook', view_func=webhook, methods=['POST'])
+    app.add_url_rule('/metrics', view_func=metrics, methods=['GET'])
+    app.add_url_rule('/health', view_func=health, methods=['GET'])
+    return app
+
+def precalentar():
+    """Carga los subsistemas pesados antes de recibir trafico; llamar despues del fork"""
+    nucleo.precalentar()
+    cliente.session
+
+app = crear_app()
+
+if __name__ == '__main__':
+    precalentar()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+Variante asyncio del servicio: una app ASGI con las mismas rutas que
+`app.py` (/webhook, /health, /metrics) y el mismo nucleo (`nucleo.py`).
+
+Cada conversacion es una tarea del loop y los envios de cada numero los
+drena otra tarea con `ClienteEvolutionAsync`; las pausas de "escribiendo"
+son `asyncio.sleep` y la extraccion, los precios y el PDF corren en un pool
+de hilos (el PDF, a su vez, en el pool de procesos de `ServicioPDF`). Una
+conversacion esperando no ocupa un hilo, asi que un proceso sostiene miles
+en curso; pasado ASGI_MAX_TAREAS el webhook responde 503.
+
+No depende de ningun framework; corre con cualquier servidor ASGI:
+
+    uvicorn app_asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import base64
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from config import (
+    API_KEY, EVOLUTION_API_BASE, TIEMPO_AGRUPACION, HTTP_TIMEOUT,
+    HTTP_MAX_REINTENTOS, HTTP_BACKOFF, ENVIO_PDF_STREAMING, ALMACEN_BACKEND, ASGI_MAX_TAREAS, ASGI_HILOS_CPU,
+    ASGI_TAM_POOL_HTTP
+)
+from cliente_evolution import ClienteEvolutionAsync
+from metricas import registro
+from nucleo import (
+    admitir, agregador, analizar_webhook, debe_procesar_mensaje, errores_api, estadisticas,
+    etapa, hist_api, hist_etapas, limpiar_cache, procesar_mensaje, salida, servicio_pdf
+)
+import nucleo
+from salida import DOCUMENTO, MARCAR_LEIDO, MENSAJE, PRESENCIA
+
+ejecutor = ThreadPoolExecutor(max_workers=ASGI_HILOS_CPU, thread_name_prefix="asgi-cpu")
+cliente = None  # Se crea dentro del loop, con la primera llamada o al arrancar
+bucle = None  # Loop del servidor; lo fija la primera tarea lanzada
+tareas = set()
+
+registro.gauge("bot_asgi_tareas", "Conversaciones en curso en la variante asyncio", lambda: len(tareas))
+
+
+def obtener_cliente():
+    global cliente
+    if cliente is None:
+        cliente = ClienteEvolutionAsync(
+            EVOLUTION_API_BASE, API_KEY,
+            tam_pool=ASGI_TAM_POOL_HTTP, timeout=HTTP_TIMEOUT,
+            max_reintentos=HTTP_MAX_REINTENTOS, backoff=HTTP_BACKOFF,
+            histograma=hist_api,
+            contador_errores=errores_api
+        )
+    return cliente
+
+async def en_hilo(funcion, *args):
+    """Ejecuta trabajo de CPU o bloqueante en el pool de hilos"""
+    return await asyncio.get_running_loop().run_in_executor(ejecutor, funcion, *args)
+
+async def en_almacen(funcion, *args):
+    """Los almacenes en memoria responden en microsegundos; SQLite puede bloquear"""
+    if ALMACEN_BACKEND == "sqlite":
+        return await en_hilo(funcion, *args)
+    return funcion(*args)
+
+def lanzar(corrutina):
+    global bucle
+    bucle = asyncio.get_running_loop()
+    tarea = bucle.create_task(corrutina)
+    tareas.add(tarea)
+    tarea.add_done_callback(_fin_tarea)
+    return tarea
+
+def _fin_tarea(tarea):
+    tareas.discard(tarea)
+    if not tarea.cancelled() and tarea.exception() is not None:
+        print(f"Error en conversacion: {tarea.exception()}")
+
+async def marcar_como_leido(remote_jid, message_id, instance_name):
+    try:
+        await obtener_cliente().marcar_como_leido(remote_jid, message_id, instance_name)
+        return True
+    except Exception:
+        return False
+
+async def mostrar_escribiendo(numero, instance_name, duracion=3):
+    try:
+        await obtener_cliente().enviar_presencia(numero, instance_name, duracion)
+        return True
+    except Exception:
+        return False
+
+async def enviar_mensaje(numero, texto, instance_name):
+    try:
+        await obtener_cliente().enviar_texto(numero, texto, instance_name)
+        return True
+    except Exception:
+        return False
+
+async def enviar_pdf(numero, pdf_base64, instance_name, filename="cotizacion.pdf", caption=None):
+    try:
+        await obtener_cliente().enviar_media(numero, pdf_base64, instance_name, filename, caption=caption)
+        return True
+    except Exception:
+        return False
+
+async def enviar_pdf_stream(numero, archivo, instance_name, filename="cotizacion.pdf", caption=None):
+    try:
+        await obtener_cliente().enviar_media_stream(numero, archivo, instance_name, filename, caption=caption)
+        return True
+    except Exception:
+        return False
+
+async def cerrar_agrupacion(numero, remote_jid, instance_name, retraso):
+    """
+    Espera a que venza la ventana de agrupacion; si llegaron mas fragmentos
+    vuelve a esperar el tiempo restante, y si no procesa el texto acumulado.
+    """
+    while True:
+        await asyncio.sleep(retraso)
+        reclamo = await en_almacen(agregador.reclamar, numero)
+        if reclamo is None:
+            return
+        if not isinstance(reclamo, float):
+            break
+        retraso = reclamo
+    texto, message_ids = reclamo
+    await en_hilo(procesar_mensaje, numero, remote_jid, message_ids[-1], texto, instance_name)
+
+def activar_salida(numero):
+    """Se llama desde los hilos del pool: el drenador se lanza en el loop"""
+    bucle.call_soon_threadsafe(lambda: lanzar(drenar_salida(numero)))
+
+salida.al_activar = activar_salida
+
+async def drenar_salida(numero):
+    """
+    Envia en orden lo pendiente para `numero`, durmiendo hasta que corresponda.
+    Un envio que falla no detiene a los siguientes; si la tarea termina por un
+    error o se cancela, el numero se libera igual.
+    """
+    try:
+        while True:
+            envio = salida.siguiente(numero)
+            if envio is None:
+                return
+            if isinstance(envio, float):
+                await asyncio.sleep(envio)
+                continue
+            if envio.escribiendo_desde is not None:
+                hist_etapas.observar(time.time() - envio.escribiendo_desde, "escribiendo")
+            try:
+                with etapa(envio.tipo):
+                    await despachar(envio)
+            except Exception as e:
+                print(f"Error enviando {envio.tipo} a {numero}: {e}")
+            finally:
+                if envio.al_terminar is not None:
+                    await en_almacen(envio.al_terminar)
+    except BaseException:
+        salida.liberar(numero)
+        raise
+
+async def despachar(envio):
+    if envio.tipo == MARCAR_LEIDO:
+        await marcar_como_leido(*envio.args, envio.instance)
+    elif envio.tipo == PRESENCIA:
+        numero, duracion = envio.args
+        await mostrar_escribiendo(numero, envio.instance, duracion)
+    elif envio.tipo == MENSAJE:
+        numero, texto = envio.args
+        await enviar_mensaje(numero, texto, envio.instance)
+    elif envio.tipo == DOCUMENTO:
+        numero, pdf_bytes, caption = envio.args
+        if ENVIO_PDF_STREAMING:
+            await enviar_pdf_stream(numero, io.BytesIO(pdf_bytes), envio.instance, caption=caption)
+        else:
+            await enviar_pdf(numero, base64.b64encode(pdf_bytes).decode('utf-8'), envio.instance, caption=caption)
+
+async def webhook(token, cuerpo):
+    """Devuelve `(respuesta, status)`"""
+    try:
+        mensaje, respuesta = analizar_webhook(token, cuerpo)
+        if respuesta is not None:
+            return respuesta
+
+        numero = mensaje["numero"]
+        espera, respuesta = await en_almacen(
+            admitir, numero, len(tareas) >= ASGI_MAX_TAREAS, mensaje["message_id"], mensaje["timestamp"]
+        )
+        if respuesta is not None:
+            return respuesta
+
+        with etapa("dedup"):
+            aceptado = await en_almacen(
+                debe_procesar_mensaje, numero, mensaje["message_id"], mensaje["timestamp"], mensaje["texto"]
+            )
+        if not aceptado:
+            return {"status": "ok"}, 200
+
+        await en_almacen(limpiar_cache)
+
+        # Cada fragmento lanza su espera de la ventana; solo la que vence
+        # despues del ultimo fragmento procesa la conversacion
+        lanzar(cerrar_agrupacion(numero, mensaje["remote_jid"], mensaje["instance"], TIEMPO_AGRUPACION + espera))
+
+        return {"status": "encolado"}, 202
+
+    except Exception as e:
+        print(f"Error en webhook: {e}")
+        return {"error": str(e)}, 500
+
+def health():
+    return {"status": "activo", "tareas": len(tareas),
+            "evolution_api": cliente.estadisticas() if cliente is not None else {},
+            **estadisticas()}, 200
+
+async def iniciar():
+    """Crea el cliente HTTP en el loop y precalienta en el pool de hilos"""
+    obtener_cliente()
+    await en_hilo(nucleo.precalentar)
+
+async def detener(timeout=10):
+    """Espera hasta `timeout` las conversaciones en curso y libera recursos"""
+    global cliente
+    if tareas:
+        _, pendientes = await asyncio.wait(list(tareas), timeout=timeout)
+        for tarea in pendientes:
+            tarea.cancel()
+    if cliente is not None:
+        await cliente.cerrar()
+        cliente = None
+    await en_hilo(servicio_pdf.detener)
+
+async def _leer_cuerpo(receive):
+    partes = []
+    while True:
+        evento = await receive()
+        partes.append(evento.get("body", b""))
+        if not evento.get("more_body"):
+            return b"".join(partes)
+
+async def _responder(send, status, cuerpo, tipo=b"application/json"):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", tipo), (b"content-length", str(len(cuerpo)).encode())]})
+    await send({"type": "http.response.body", "body": cuerpo})
+
+async def _responder_json(send, datos, status):
+    await _responder(send, status, json.dumps(datos).encode("utf-8"))
+
+async def _lifespan(receive, send):
+    while True:
+        evento = await receive()
+        if evento["type"] == "lifespan.startup":
+            try:
+                await iniciar()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif evento["type"] == "lifespan.shutdown":
+            await detener()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+_METODOS = {"/webhook": "POST", "/health": "GET", "/metrics": "GET"}
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    ruta = scope["path"]
+    if ruta not in _METODOS:
+        await _responder_json(send, {"error": "No encontrado"}, 404)
+    elif scope["method"] != _METODOS[ruta]:
+        await _responder_json(send, {"error": "Metodo no permitido"}, 405)
+    elif ruta == "/webhook":
+        token = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("token", [None])[0]
+        datos, status = await webhook(token, await _leer_cuerpo(receive))
+        await _responder_json(send, datos, status)
+    elif ruta == "/health":
+        await _responder_json(send, *health())
+    else:
+        await _responder(send, 200, registro.texto_prometheus().encode("utf-8"),
+                         b"text/plain; version=0.0.4")
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: para ejecutar app_asgi.py directamente instale uvicorn")
+        sys.exit(1)
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,73 @@
+"""
+Benchmark del arranque de un worker.
+
+Cada corrida es un interprete nuevo que importa la app, responde el primer
+/health y luego ejecuta `precalentar()`. Se compara:
+
+- diferido: la app tal cual (ReportLab, requests, NumPy y el catalogo se
+  cargan con el primer uso o al precalentar)
+- ansioso: importando antes esos modulos, como lo hacia la app al cargarse
+
+El pool de PDFs se desactiva (PDF_PROCESOS=0) para medir solo imports y
+preparacion del renderizador.
+
+    python -m benchmarks.bench_arranque [-n 7]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_CODIGO = """
+import json, sys, time
+inicio = time.perf_counter()
+if sys.argv[1] == "ansioso":
+    import numpy, requests, pdf_generator
+    try:
+        import httpx
+    except ImportError:
+        pass
+import app
+importada = time.perf_counter()
+app.app.test_client().get('/health')
+lista = time.perf_counter()
+app.precalentar()
+caliente = time.perf_counter()
+print(json.dumps({
+    "import_ms": (importada - inicio) * 1000,
+    "primer_health_ms": (lista - inicio) * 1000,
+    "precalentar_ms": (caliente - lista) * 1000,
+}))
+"""
+
+
+def medir(modo, n):
+    entorno = dict(os.environ, PDF_PROCESOS="0")
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    corridas = []
+    for _ in range(n):
+        salida = subprocess.run(
+            [sys.executable, "-c", _CODIGO, modo],
+            cwd=raiz, env=entorno, capture_output=True, text=True, check=True,
+        )
+        corridas.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+    return {clave: round(statistics.median(c[clave] for c in corridas), 1) for clave in corridas[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=7, help="corridas por modo (se reporta la mediana)")
+    args = parser.parse_args()
+
+    resultados = {modo: medir(modo, args.n) for modo in ("ansioso", "diferido")}
+    for modo, r in resultados.items():
+        print(f"{modo:9s} import {r['import_ms']:7.1f} ms  primer /health {r['primer_health_ms']:7.1f} ms  "
+              f"precalentar {r['precalentar_ms']:7.1f} ms")
+    ahorro = 1 - resultados["diferido"]["primer_health_ms"] / resultados["ansioso"]["primer_health_ms"]
+    print(f"Reduccion del tiempo hasta el primer /health: {ahorro:.1%}")
+
+
+if __name__ == "__main__":
+    main()
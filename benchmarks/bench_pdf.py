@@ -0,0 +1,148 @@
+"""
+Benchmark del renderizado de cotizaciones PDF.
+
+Compara el renderizador con bloques estaticos en cache contra uno que
+prepara estilos, logo y encabezado/pie en cada cotizacion (el comportamiento
+anterior). Reporta CPU por PDF y memoria asignada (tracemalloc).
+
+Con --procesos mide ademas PDFs/s por reloj con `hilos` clientes
+concurrentes, renderizando en el proceso y en el pool de ServicioPDF.
+
+Con --perfiles compara el perfil estandar (logo tal cual, ASCII85) con el
+compacto: bytes por PDF, bytes en base64 (lo que viaja a Evolution API) y
+CPU por PDF. Sin --logo usa un logo sintetico de 1200x1200 px con
+transparencia, como el que se suele copiar sin reducir.
+
+    python -m benchmarks.bench_pdf [-n 200] [--procesos 4 --hilos 8] [--perfiles [--logo logo.png]]
+"""
+import argparse
+import base64
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_generator import RenderizadorCotizacion
+from servicio_pdf import ServicioPDF
+
+INFO_RESERVA = {"check_in": "2026-11-10", "check_out": "2026-11-13", "cant_personas": "4"}
+TOTALES = {
+    "habitaciones": [
+        {"tipo": "Habitación Doble 2 Camas", "cantidad": 1, "precio_noche": 79980, "total": 239940},
+        {"tipo": "Habitación Estándar", "cantidad": 2, "precio_noche": 79980, "total": 479880},
+    ],
+    "total_neto": 719820,
+    "iva": 136765,
+    "total_bruto": 856585,
+}
+NOCHES = 3
+
+
+def medir(renderizar, n):
+    renderizar()  # calentamiento
+    inicio_cpu = time.process_time()
+    for _ in range(n):
+        renderizar()
+    cpu = time.process_time() - inicio_cpu
+
+    tracemalloc.start()
+    for _ in range(min(n, 20)):
+        renderizar()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_ms_por_pdf": round(cpu / n * 1000, 3), "pico_kib": round(pico / 1024, 1)}
+
+
+def ejecutar(n=200):
+    cacheado = RenderizadorCotizacion()
+
+    def con_cache():
+        cacheado.renderizar(INFO_RESERVA, TOTALES, NOCHES)
+
+    def sin_cache():
+        RenderizadorCotizacion().renderizar(INFO_RESERVA, TOTALES, NOCHES)
+
+    return {"sin_cache": medir(sin_cache, n), "con_cache": medir(con_cache, n)}
+
+
+def logo_sintetico(lado=1200):
+    """PNG con transparencia y degradados, en un directorio temporal"""
+    from PIL import Image, ImageDraw
+
+    imagen = Image.new("RGBA", (lado, lado), (0, 0, 0, 0))
+    dibujo = ImageDraw.Draw(imagen)
+    for i in range(0, lado // 2, 20):
+        dibujo.ellipse((i, i, lado - i, lado - i), outline=(i % 256, 90, 255 - i % 256, 255), width=10)
+    ruta = os.path.join(tempfile.mkdtemp(), "logo.png")
+    imagen.save(ruta)
+    return ruta
+
+
+def comparar_perfiles(n, logo):
+    """Bytes y CPU por PDF con el perfil estandar y el compacto"""
+    resultados = {}
+    for nombre, compacto in (("estandar", False), ("compacto", True)):
+        renderizador = RenderizadorCotizacion(logo, compacto=compacto)
+        pdf_bytes = renderizador.renderizar(INFO_RESERVA, TOTALES, NOCHES)
+        inicio_cpu = time.process_time()
+        for _ in range(n):
+            renderizador.renderizar(INFO_RESERVA, TOTALES, NOCHES)
+        resultados[nombre] = {
+            "bytes_por_pdf": len(pdf_bytes),
+            "bytes_base64": len(base64.b64encode(pdf_bytes)),
+            "cpu_ms_por_pdf": round((time.process_time() - inicio_cpu) / n * 1000, 3),
+        }
+    return resultados
+
+
+def medir_servicio(procesos, n, hilos):
+    """PDFs por segundo (reloj) con `hilos` envios concurrentes"""
+    servicio = ServicioPDF(procesos=procesos, max_pendientes=hilos)
+    servicio.iniciar()
+    servicio.renderizar(INFO_RESERVA, TOTALES, NOCHES)
+    try:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            for _ in pool.map(lambda _: servicio.renderizar(INFO_RESERVA, TOTALES, NOCHES), range(n)):
+                pass
+        return round(n / (time.perf_counter() - inicio), 1)
+    finally:
+        servicio.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=200, help="PDFs por escenario")
+    parser.add_argument("--procesos", type=int, default=0, help="procesos del pool a comparar")
+    parser.add_argument("--hilos", type=int, default=8, help="envios concurrentes con --procesos")
+    parser.add_argument("--perfiles", action="store_true", help="comparar el perfil estandar con el compacto")
+    parser.add_argument("--logo", help="logo a usar con --perfiles (por defecto uno sintetico)")
+    args = parser.parse_args()
+
+    if args.perfiles:
+        logo = args.logo or logo_sintetico()
+        perfiles = comparar_perfiles(args.n, logo)
+        for nombre, r in perfiles.items():
+            print(f"{nombre:10s} {r['bytes_por_pdf']:8d} bytes/PDF  {r['bytes_base64']:8d} en base64  "
+                  f"{r['cpu_ms_por_pdf']:8.3f} ms/PDF")
+        estandar, compacto = perfiles["estandar"], perfiles["compacto"]
+        print(f"Reduccion de bytes por PDF: {1 - compacto['bytes_por_pdf'] / estandar['bytes_por_pdf']:.1%}")
+        print(f"Reduccion de CPU por PDF:   {1 - compacto['cpu_ms_por_pdf'] / estandar['cpu_ms_por_pdf']:.1%}")
+        return
+
+    resultados = ejecutar(args.n)
+    for nombre, r in resultados.items():
+        print(f"{nombre:10s} {r['cpu_ms_por_pdf']:8.3f} ms/PDF  pico {r['pico_kib']:8.1f} KiB")
+    ahorro = 1 - resultados["con_cache"]["cpu_ms_por_pdf"] / resultados["sin_cache"]["cpu_ms_por_pdf"]
+    print(f"Reduccion de CPU por PDF: {ahorro:.1%}")
+
+    if args.procesos:
+        en_proceso = medir_servicio(0, args.n, args.hilos)
+        en_pool = medir_servicio(args.procesos, args.n, args.hilos)
+        print(f"En el proceso:          {en_proceso:8.1f} PDFs/s ({args.hilos} hilos)")
+        print(f"Pool de {args.procesos} procesos:     {en_pool:8.1f} PDFs/s ({args.hilos} hilos)")
+
+
+if __name__ == "__main__":
+    main()
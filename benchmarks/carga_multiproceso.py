@@ -0,0 +1,164 @@
+"""
+Prueba de carga del modo multiproceso.
+
+Levanta N procesos con la app (como workers de gunicorn detras de un
+balanceador) compartiendo el almacen SQLite, y un stub de Evolution API.
+Dispara en paralelo fragmentos de una misma conversacion repartidos entre
+todos los workers y verifica que cada rafaga produce exactamente una
+cotizacion (una sola ejecucion del pipeline): un resumen y un PDF.
+
+    python -m benchmarks.carga_multiproceso [--workers 4] [--fragmentos 8] [--rondas 3]
+
+Sale con codigo 1 si alguna rafaga no produce exactamente un resumen y un
+PDF, o si alguna respuesta es el mensaje de error de la cotizacion.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_evolution import ServidorStubEvolution
+
+NUMERO = "56900000000"
+TOKEN = "token-carga"
+ENFRIAMIENTO = 0.5
+AGRUPACION = 0.3
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _servir(puerto, url_stub, ruta_sqlite):
+    """Proceso worker: ajusta la configuracion antes de importar la app"""
+    os.environ["ALMACEN_BACKEND"] = "sqlite"
+    os.environ["ALMACEN_RUTA_SQLITE"] = ruta_sqlite
+    import config
+    config.EVOLUTION_API_BASE = url_stub
+    config.WEBHOOK_TOKEN = TOKEN
+    config.NUMEROS_AUTORIZADOS = frozenset({NUMERO})
+    config.DURACION_ESCRIBIENDO = 0
+    config.LIMITE_MENSAJES_POR_MINUTO = 0  # Las rafagas salen de un solo numero
+    config.PDF_PROCESOS = 0  # Un proceso daemon no puede crear el pool de PDFs
+    config.TIEMPO_ENFRIAMIENTO = ENFRIAMIENTO
+    config.TIEMPO_AGRUPACION = AGRUPACION
+    config.HISTORIAL_RUTA = os.path.join(os.path.dirname(ruta_sqlite), "cotizaciones.db")
+
+    import logging
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    make_server("127.0.0.1", puerto, app, threaded=True).serve_forever()
+
+
+def _payload(message_id, texto):
+    return {
+        "event": "messages.upsert",
+        "instance": "carga",
+        "data": {
+            "key": {"remoteJid": f"{NUMERO}@s.whatsapp.net", "id": message_id, "fromMe": False},
+            "messageTimestamp": int(time.time()),
+            "message": {"conversation": texto},
+        },
+    }
+
+
+def _enviar(puerto, payload):
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{puerto}/webhook?token={TOKEN}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return resp.status
+
+
+def _esperar_listo(puerto, limite=15):
+    fin = time.time() + limite
+    while time.time() < fin:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/health", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"El worker en el puerto {puerto} no respondio")
+
+
+def ejecutar(workers=4, fragmentos=8, rondas=3):
+    # Los workers (spawn) importan este modulo: el nucleo solo en el proceso principal
+    from nucleo import MENSAJE_ERROR_COTIZACION
+
+    fragmentos_texto = ["Hola", "del 10 al 12", "2 doble", "somos 4", "gracias"]
+    ruta_sqlite = os.path.join(tempfile.mkdtemp(), "estado.db")
+    ctx = multiprocessing.get_context("spawn")
+
+    with ServidorStubEvolution() as stub:
+        puertos = [_puerto_libre() for _ in range(workers)]
+        procesos = [ctx.Process(target=_servir, args=(p, stub.url, ruta_sqlite), daemon=True) for p in puertos]
+        for proc in procesos:
+            proc.start()
+        try:
+            for p in puertos:
+                _esperar_listo(p)
+
+            respuestas_por_ronda = []
+            with ThreadPoolExecutor(max_workers=fragmentos) as pool:
+                for ronda in range(rondas):
+                    stub.limpiar()
+                    envios = [
+                        pool.submit(
+                            _enviar,
+                            puertos[i % workers],
+                            _payload(f"r{ronda}-f{i}", fragmentos_texto[i % len(fragmentos_texto)]),
+                        )
+                        for i in range(fragmentos)
+                    ]
+                    for envio in envios:
+                        envio.result()
+                    # Esperar el cierre de la ventana, la respuesta y el enfriamiento
+                    time.sleep(AGRUPACION + 1.0 + ENFRIAMIENTO)
+                    textos = [llamada.get("text", "") for llamada in stub.llamadas_a("message/sendText")]
+                    respuestas_por_ronda.append({
+                        "textos": len(textos),
+                        "pdfs": len(stub.llamadas_a("message/sendMedia")),
+                        "errores": sum(MENSAJE_ERROR_COTIZACION in texto for texto in textos),
+                    })
+        finally:
+            for proc in procesos:
+                proc.terminate()
+                proc.join()
+
+    return respuestas_por_ronda
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--fragmentos", type=int, default=8)
+    parser.add_argument("--rondas", type=int, default=3)
+    args = parser.parse_args()
+
+    respuestas = ejecutar(args.workers, args.fragmentos, args.rondas)
+    for ronda, r in enumerate(respuestas):
+        print(f"ronda {ronda}: {r['textos']} texto(s), {r['pdfs']} PDF(s), {r['errores']} error(es)")
+    if any(r["errores"] for r in respuestas):
+        print("FALLO: alguna cotizacion respondio con el mensaje de error")
+        sys.exit(1)
+    if any(r["textos"] != 1 or r["pdfs"] != 1 for r in respuestas):
+        print("FALLO: se esperaba exactamente una cotizacion (un resumen y un PDF) por conversacion")
+        sys.exit(1)
+    print("OK: una cotizacion por conversacion")
+
+
+if __name__ == "__main__":
+    main()
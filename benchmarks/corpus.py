@@ -0,0 +1,77 @@
+"""
+Corpus sintetico y reproducible de mensajes de reserva en espanol.
+
+Combina las formas que entiende el extractor (rangos "del X al Y", fechas
+dd/mm, "mañana", numeros en palabras, mezclas de tipos, acentos) con saludos
+y relleno, e incluye fragmentos incompletos como los que llegan por WhatsApp.
+
+    from benchmarks.corpus import generar_corpus, FECHA_REFERENCIA
+    mensajes = generar_corpus(1000)
+"""
+import random
+from datetime import datetime
+
+# Fecha fija para que la extraccion (y por lo tanto los precios) sea reproducible
+FECHA_REFERENCIA = datetime(2026, 11, 3, 10, 0)
+
+_SALUDOS = ["Hola", "Buenas tardes", "Buen día", "Hola, cómo están?", "Estimados", ""]
+_CIERRES = ["Gracias", "Quedo atento", "Saludos!", "Muchas gracias de antemano", ""]
+_NUMEROS_PALABRA = {1: "una", 2: "dos", 3: "tres", 4: "cuatro", 5: "cinco", 6: "seis"}
+_TIPOS = ["doble", "dobles", "single", "sencilla", "simple", "estándar", "standard",
+          "superior", "matrimonial"]
+
+
+def _cantidad(rng, n):
+    if n in _NUMEROS_PALABRA and rng.random() < 0.3:
+        return _NUMEROS_PALABRA[n]
+    return str(n)
+
+
+def _fechas(rng):
+    forma = rng.random()
+    if forma < 0.55:
+        inicio = rng.randint(1, 25)
+        return f"del {inicio} al {inicio + rng.randint(1, 5)}"
+    if forma < 0.8:
+        return f"para el {rng.randint(1, 28)}/{rng.randint(1, 12)}"
+    if forma < 0.9:
+        return "para mañana"
+    return "desde hoy"
+
+
+def _habitaciones(rng):
+    forma = rng.random()
+    if forma < 0.6:
+        items = [
+            f"{_cantidad(rng, rng.randint(1, 3))} {rng.choice(_TIPOS)}"
+            for _ in range(rng.randint(1, 3))
+        ]
+        if len(items) == 1:
+            return items[0]
+        return ", ".join(items[:-1]) + " y " + items[-1]
+    if forma < 0.85:
+        n = rng.randint(1, 4)
+        return f"{_cantidad(rng, n)} {'habitación' if n == 1 else 'habitaciones'}"
+    return f"{_cantidad(rng, rng.randint(1, 3))} piezas"
+
+
+def _personas(rng):
+    n = rng.randint(1, 8)
+    return rng.choice([f"somos {_cantidad(rng, n)}", f"para {n} personas",
+                       f"{n} adultos", f"son {n} pax"])
+
+
+def generar_mensaje(rng, completo=False):
+    """Un mensaje; ~70% completos, el resto con algun dato faltante"""
+    partes = [_fechas(rng), _habitaciones(rng), _personas(rng)]
+    if not completo and rng.random() < 0.3:
+        del partes[rng.randrange(len(partes))]
+    rng.shuffle(partes)
+    cuerpo = rng.choice(["necesito ", "quisiera cotizar ", "me interesa reservar ", ""]) + ", ".join(partes)
+    texto = " ".join(p for p in (rng.choice(_SALUDOS), cuerpo, rng.choice(_CIERRES)) if p)
+    return texto.upper() if rng.random() < 0.05 else texto
+
+
+def generar_corpus(n=1000, semilla=42, solo_completos=False):
+    rng = random.Random(semilla)
+    return [generar_mensaje(rng, solo_completos) for _ in range(n)]
@@ -0,0 +1,300 @@
+"""
+Reproduce trafico capturado de webhooks contra la app y un stub de Evolution API.
+
+Lee un JSONL con un payload `messages.upsert` por linea (tal como lo envia
+Evolution API) o envuelto como {"recibido": <epoch s>, "payload": {...}}.
+Los envia a `/webhook` a un ritmo fijo o con los tiempos originales
+(`recibido`, o `messageTimestamp` si no esta), y registra la latencia y el
+estado de cada peticion y cada llamada saliente que recibe el stub.
+
+Los `messageTimestamp` se llevan al presente conservando la antiguedad que
+tenia cada mensaje al recibirse, para que no se descarten por antiguos. El
+numeros de la captura se autorizan y la ventana de agrupacion y el enfriamiento
+son los de config.py, asi que el informe refleja la logica de agrupacion real.
+
+    python -m benchmarks.reproducir capturas.jsonl [--ritmo 20 | --original --velocidad 4]
+        [--modo cliente|http|asgi] [--rapido] [--informe informe.json] [--esperado informe_previo.json]
+
+El modo asgi envia a `app_asgi.app` (variante asyncio) con el transporte
+ASGI de httpx, en un loop propio. --rapido pone en cero las pausas de
+"escribiendo". Con --esperado compara
+la secuencia de llamadas salientes (endpoint, numero, texto) por numero y
+sale con codigo 1 si difiere.
+"""
+import argparse
+import copy
+import json
+import statistics
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_evolution import ServidorStubEvolution
+
+TOKEN = "token-reproduccion"
+
+
+def leer_capturas(ruta):
+    """Lista de (instante_original, payload)"""
+    capturas = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            if "payload" in registro:
+                payload = registro["payload"]
+                instante = registro.get("recibido")
+            else:
+                payload = registro
+                instante = None
+            if instante is None:
+                instante = (payload.get("data") or {}).get("messageTimestamp") or 0
+            capturas.append((float(instante), payload))
+    capturas.sort(key=lambda c: c[0])
+    return capturas
+
+
+def _numero(payload):
+    remote_jid = ((payload.get("data") or {}).get("key") or {}).get("remoteJid", "")
+    return remote_jid.split("@")[0]
+
+
+def _configurar(url_stub, numeros, rapido, modo="cliente"):
+    import config
+    config.EVOLUTION_API_BASE = url_stub
+    config.WEBHOOK_TOKEN = TOKEN
+    config.NUMEROS_AUTORIZADOS = frozenset(numeros)
+    config.HISTORIAL_RUTA = os.path.join(tempfile.mkdtemp(), "cotizaciones.db")
+    if rapido:
+        config.DURACION_ESCRIBIENDO = 0
+
+    if modo == "asgi":
+        from app_asgi import app
+        return app, config
+
+    import logging
+    from app import app
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    return app, config
+
+
+def _resumen_llamada(ruta, payload):
+    """Forma comparable de una llamada saliente (sin el base64 del PDF)"""
+    endpoint = "/".join(ruta.strip("/").split("/")[:2])
+    resumen = {"endpoint": endpoint}
+    if isinstance(payload, dict):
+        resumen["numero"] = payload.get("number") or payload.get("remoteJid", "").split("@")[0]
+        if "text" in payload:
+            resumen["texto"] = payload["text"]
+        if "fileName" in payload:
+            resumen["archivo"] = payload["fileName"]
+    return resumen
+
+
+def _percentiles(valores):
+    if not valores:
+        return {}
+    ordenados = sorted(valores)
+
+    def p(q):
+        return round(ordenados[min(len(ordenados) - 1, max(0, round(q * len(ordenados)) - 1))] * 1000, 2)
+
+    return {"p50_ms": p(0.50), "p90_ms": p(0.90), "p99_ms": p(0.99),
+            "max_ms": round(ordenados[-1] * 1000, 2), "media_ms": round(statistics.mean(ordenados) * 1000, 2)}
+
+
+def reproducir(capturas, modo="cliente", ritmo=None, velocidad=1.0, rapido=False, concurrencia=16):
+    numeros = {_numero(p) for _, p in capturas if _numero(p)}
+
+    with ServidorStubEvolution() as stub:
+        app, config = _configurar(stub.url, numeros, rapido, modo)
+        salientes = []
+        stub.al_recibir(lambda ruta, payload: salientes.append(
+            dict(_resumen_llamada(ruta, payload), t_ms=round((time.perf_counter() - origen) * 1000, 1))
+        ))
+
+        servidor = loop = None
+        if modo == "asgi":
+            import asyncio
+            import httpx
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True).start()
+            cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://asgi")
+
+            async def post_asgi(payload):
+                respuesta = await cliente.post(f"/webhook?token={TOKEN}", json=payload)
+                return respuesta.status_code, respuesta.json().get("status")
+
+            def post(payload):
+                return asyncio.run_coroutine_threadsafe(post_asgi(payload), loop).result()
+        elif modo == "http":
+            import requests
+            from werkzeug.serving import make_server
+            servidor = make_server("127.0.0.1", 0, app, threaded=True)
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{servidor.server_port}/webhook?token={TOKEN}"
+            local = threading.local()
+
+            def post(payload):
+                if not hasattr(local, "sesion"):
+                    local.sesion = requests.Session()
+                respuesta = local.sesion.post(url, json=payload, timeout=30)
+                return respuesta.status_code, respuesta.json().get("status")
+        else:
+            cliente = app.test_client()
+            lock = threading.Lock()
+
+            def post(payload):
+                # El test client de Flask no es seguro entre hilos
+                with lock:
+                    respuesta = cliente.post(f"/webhook?token={TOKEN}", json=payload)
+                return respuesta.status_code, (respuesta.get_json() or {}).get("status")
+
+        primero = capturas[0][0] if capturas else 0
+        peticiones = []
+
+        def enviar(indice, payload):
+            inicio = time.perf_counter()
+            try:
+                codigo, estado = post(payload)
+            except Exception as e:
+                codigo, estado = None, f"error: {e}"
+            peticiones.append({
+                "indice": indice,
+                "t_ms": round((inicio - origen) * 1000, 1),
+                "latencia": time.perf_counter() - inicio,
+                "codigo": codigo,
+                "estado": estado,
+            })
+
+        origen = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            for indice, (instante, payload) in enumerate(capturas):
+                if ritmo:
+                    objetivo = indice / ritmo
+                else:
+                    objetivo = (instante - primero) / velocidad
+                espera = objetivo - (time.perf_counter() - origen)
+                if espera > 0:
+                    time.sleep(espera)
+                payload = copy.deepcopy(payload)
+                data = payload.get("data") or {}
+                if data.get("messageTimestamp"):
+                    # Al presente, conservando la antiguedad que tenia al recibirse
+                    data["messageTimestamp"] = int(time.time() - max(0, instante - data["messageTimestamp"]))
+                pool.submit(enviar, indice, payload)
+        duracion_envio = time.perf_counter() - origen
+
+        # Esperar a que el pipeline termine: sin llamadas salientes durante un margen
+        margen = config.TIEMPO_AGRUPACION + config.DURACION_ESCRIBIENDO + 1
+        ultimo = -1
+        while len(salientes) != ultimo:
+            ultimo = len(salientes)
+            time.sleep(margen)
+
+        if servidor is not None:
+            servidor.shutdown()
+        if loop is not None:
+            import app_asgi
+            asyncio.run_coroutine_threadsafe(cliente.aclose(), loop).result()
+            asyncio.run_coroutine_threadsafe(app_asgi.detener(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        else:
+            from app import cola
+            cola.detener()
+
+    estados = {}
+    for peticion in peticiones:
+        clave = f"{peticion['codigo']} {peticion['estado']}"
+        estados[clave] = estados.get(clave, 0) + 1
+    return {
+        "modo": modo,
+        "peticiones": len(peticiones),
+        "duracion_envio_s": round(duracion_envio, 2),
+        "peticiones_por_s": round(len(peticiones) / duracion_envio, 1) if duracion_envio else None,
+        "estados": estados,
+        "latencia": _percentiles([p["latencia"] for p in peticiones]),
+        "llamadas_salientes": len(salientes),
+        "salientes_por_endpoint": _contar(s["endpoint"] for s in salientes),
+        "detalle_peticiones": sorted(
+            ({k: v for k, v in p.items() if k != "latencia"} | {"latencia_ms": round(p["latencia"] * 1000, 2)}
+             for p in peticiones),
+            key=lambda p: p["indice"],
+        ),
+        "detalle_salientes": salientes,
+    }
+
+
+def _contar(valores):
+    conteo = {}
+    for valor in valores:
+        conteo[valor] = conteo.get(valor, 0) + 1
+    return conteo
+
+
+def _secuencias(informe):
+    """Llamadas salientes por numero, en orden y sin tiempos"""
+    por_numero = {}
+    for llamada in informe["detalle_salientes"]:
+        comparable = {k: v for k, v in llamada.items() if k != "t_ms"}
+        por_numero.setdefault(str(comparable.get("numero")), []).append(comparable)
+    return por_numero
+
+
+def comparar(informe, esperado):
+    """Diferencias entre las llamadas salientes de dos informes"""
+    actual, previo = _secuencias(informe), _secuencias(esperado)
+    diferencias = []
+    for numero in sorted(set(actual) | set(previo)):
+        a, p = actual.get(numero, []), previo.get(numero, [])
+        for i in range(max(len(a), len(p))):
+            llamada_a = a[i] if i < len(a) else None
+            llamada_p = p[i] if i < len(p) else None
+            if llamada_a != llamada_p:
+                diferencias.append({"numero": numero, "posicion": i, "esperado": llamada_p, "actual": llamada_a})
+                break
+    return diferencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capturas", help="JSONL de payloads de webhook")
+    parser.add_argument("--modo", choices=("cliente", "http", "asgi"), default="cliente",
+                        help="test client de Flask en el proceso, HTTP contra un servidor local, "
+                             "o la variante asyncio por ASGI")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument("--ritmo", type=float, help="peticiones por segundo")
+    grupo.add_argument("--original", action="store_true", help="tiempos originales (por defecto)")
+    parser.add_argument("--velocidad", type=float, default=1.0, help="factor sobre los tiempos originales")
+    parser.add_argument("--rapido", action="store_true", help="sin pausas de 'escribiendo'")
+    parser.add_argument("--informe", help="escribe el informe completo en JSON")
+    parser.add_argument("--esperado", help="informe previo contra el que comparar las llamadas salientes")
+    args = parser.parse_args()
+
+    capturas = leer_capturas(args.capturas)
+    informe = reproducir(capturas, args.modo, args.ritmo, args.velocidad, args.rapido)
+
+    resumen = {k: v for k, v in informe.items() if not k.startswith("detalle_")}
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    if args.informe:
+        with open(args.informe, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+    if args.esperado:
+        with open(args.esperado, encoding="utf-8") as f:
+            diferencias = comparar(informe, json.load(f))
+        for d in diferencias:
+            print(f"Diferencia para {d['numero']} en la llamada {d['posicion']}: "
+                  f"esperado {d['esperado']}, obtenido {d['actual']}")
+        if diferencias:
+            sys.exit(1)
+        print("OK: mismas llamadas salientes que el informe esperado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Suite de benchmarks reproducible con linea base en JSON.
+
+Mide, sobre el corpus sintetico de `benchmarks.corpus`:
+
+- extraccion: `extraer_informacion_reserva`, mensajes/s
+- precios: `calcular_totales` (tabla base) y `calcular_totales_estadia`
+  (tarifas por noche), operaciones/s
+- pdf: `generar_cotizacion_pdf_bytes`, PDFs/s y tamano medio
+- webhook: latencia HTTP de `/webhook` con clientes concurrentes y latencia
+  de punta a punta (mensaje -> PDF recibido por el stub de Evolution API),
+  p50/p99 en ms
+
+Cada escenario reporta ademas el pico de memoria asignada (tracemalloc) sobre
+una muestra. El webhook corre sobre un servidor werkzeug real en un hilo, con
+las pausas de "escribiendo" en cero. Como hay un solo numero autorizado, las
+conversaciones de punta a punta se miden una tras otra.
+
+    python -m benchmarks.suite [--rapido] [--guardar benchmarks/linea_base.json]
+    python -m benchmarks.suite --comparar benchmarks/linea_base.json [--tolerancia 0.2]
+
+Con --comparar sale con codigo 1 si alguna metrica empeora mas que la tolerancia.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.corpus import FECHA_REFERENCIA, generar_corpus
+
+NUMERO = "56911111111"
+TOKEN = "token-benchmark"
+
+# (escenario, metrica, mayor_es_mejor)
+METRICAS_COMPARADAS = [
+    ("extraccion", "msgs_por_s", True),
+    ("precios", "calcular_totales_ops_por_s", True),
+    ("precios", "calcular_totales_estadia_ops_por_s", True),
+    ("pdf", "pdfs_por_s", True),
+    ("pdf", "pico_kib", False),
+    ("webhook", "http_p50_ms", False),
+    ("webhook", "http_p99_ms", False),
+    ("webhook", "http_por_s", True),
+    ("webhook", "punta_a_punta_p50_ms", False),
+    ("webhook", "punta_a_punta_p99_ms", False),
+]
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[indice]
+
+
+def _por_segundo(funcion, argumentos, repeticiones=1):
+    """Mejor de `repeticiones` pasadas, para que el ruido de la maquina pese menos"""
+    funcion(argumentos[0])  # calentamiento
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for argumento in argumentos:
+            funcion(argumento)
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return len(argumentos) / mejor
+
+
+def _pico_kib(funcion, argumentos):
+    tracemalloc.start()
+    for argumento in argumentos:
+        funcion(argumento)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(pico / 1024, 1)
+
+
+def _cotizaciones(mensajes):
+    """(info, mezcla, check_in, noches) de los mensajes completos del corpus"""
+    from extractor import extraer_informacion_reserva
+    from reservas import campos_faltantes
+
+    cotizaciones = []
+    for mensaje in mensajes:
+        info = extraer_informacion_reserva(mensaje, FECHA_REFERENCIA)
+        if campos_faltantes(info):
+            continue
+        try:
+            check_in = datetime.strptime(info['check_in'], '%Y-%m-%d').date()
+            check_out = datetime.strptime(info['check_out'], '%Y-%m-%d').date()
+        except ValueError:
+            continue
+        noches = (check_out - check_in).days
+        if noches > 0:
+            cotizaciones.append((info, info['mezcla_habitaciones'], check_in, noches))
+    return cotizaciones
+
+
+def medir_extraccion(mensajes):
+    from extractor import extraer_informacion_reserva
+
+    def extraer(mensaje):
+        extraer_informacion_reserva(mensaje, FECHA_REFERENCIA)
+
+    return {
+        "mensajes": len(mensajes),
+        "msgs_por_s": round(_por_segundo(extraer, mensajes, 3)),
+        "pico_kib": _pico_kib(extraer, mensajes[:200]),
+    }
+
+
+def medir_precios(cotizaciones):
+    from precios import calcular_totales, calcular_totales_estadia, obtener_precios_habitaciones
+
+    precios = obtener_precios_habitaciones()
+
+    def totales(cotizacion):
+        _, mezcla, _, noches = cotizacion
+        calcular_totales(mezcla, noches, precios)
+
+    def totales_estadia(cotizacion):
+        _, mezcla, check_in, noches = cotizacion
+        calcular_totales_estadia(mezcla, check_in, noches)
+
+    return {
+        "cotizaciones": len(cotizaciones),
+        "calcular_totales_ops_por_s": round(_por_segundo(totales, cotizaciones, 5)),
+        "calcular_totales_estadia_ops_por_s": round(_por_segundo(totales_estadia, cotizaciones, 5)),
+        "pico_kib": _pico_kib(totales_estadia, cotizaciones[:200]),
+    }
+
+
+def medir_pdf(cotizaciones, n):
+    from pdf_generator import generar_cotizacion_pdf_bytes
+    from precios import calcular_totales_estadia
+
+    entradas = []
+    for info, mezcla, check_in, noches in cotizaciones[:n]:
+        entradas.append((info, calcular_totales_estadia(mezcla, check_in, noches), noches))
+    tamanos = []
+
+    def generar(entrada):
+        tamanos.append(len(generar_cotizacion_pdf_bytes(*entrada)))
+
+    return {
+        "pdfs": len(entradas),
+        "pdfs_por_s": round(_por_segundo(generar, entradas), 1),
+        "bytes_medio": round(statistics.mean(tamanos)),
+        "pico_kib": _pico_kib(generar, entradas[:20]),
+    }
+
+
+def _configurar_app(url_stub):
+    """Ajusta la configuracion antes del primer import de la app"""
+    import config
+    config.EVOLUTION_API_BASE = url_stub
+    config.WEBHOOK_TOKEN = TOKEN
+    config.NUMEROS_AUTORIZADOS = frozenset({NUMERO})
+    config.DURACION_ESCRIBIENDO = 0
+    config.LIMITE_MENSAJES_POR_MINUTO = 0  # Las rafagas salen de un solo numero
+    config.TIEMPO_ENFRIAMIENTO = 0
+    config.TIEMPO_AGRUPACION = 0.05
+    config.HISTORIAL_RUTA = os.path.join(tempfile.mkdtemp(), "cotizaciones.db")
+
+    import logging
+    from app import app
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    return app
+
+
+def _payload(message_id, texto):
+    return {
+        "event": "messages.upsert",
+        "instance": "benchmark",
+        "data": {
+            "key": {"remoteJid": f"{NUMERO}@s.whatsapp.net", "id": message_id, "fromMe": False},
+            "messageTimestamp": int(time.time()),
+            "message": {"conversation": texto},
+        },
+    }
+
+
+def medir_webhook(mensajes, peticiones, concurrencia, conversaciones):
+    import requests
+    from werkzeug.serving import make_server
+    from stub_evolution import ServidorStubEvolution
+
+    with ServidorStubEvolution() as stub:
+        app = _configurar_app(stub.url)
+        servidor = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{servidor.server_port}/webhook?token={TOKEN}"
+        local = threading.local()
+
+        def sesion():
+            if not hasattr(local, "sesion"):
+                local.sesion = requests.Session()
+            return local.sesion
+
+        def enviar(i, prefijo="c"):
+            payload = _payload(f"{prefijo}{i}", mensajes[i % len(mensajes)])
+            inicio = time.perf_counter()
+            respuesta = sesion().post(url, json=payload, timeout=10)
+            return time.perf_counter() - inicio, respuesta.json().get("status")
+
+        try:
+            # Latencia HTTP con clientes concurrentes
+            enviar(0, "calentamiento")
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+                latencias = [l for l, _ in pool.map(enviar, range(peticiones))]
+            duracion = time.perf_counter() - inicio
+            # Que la rafaga termine de procesarse antes de medir conversaciones
+            time.sleep(0.5)
+
+            # Punta a punta: del POST al PDF recibido por el stub
+            recibido = threading.Event()
+            stub.al_recibir(lambda ruta, payload: ruta.startswith("/message/sendMedia/") and recibido.set())
+            completos = generar_corpus(conversaciones, semilla=7, solo_completos=True)
+            punta_a_punta = []
+            for i, texto in enumerate(completos):
+                recibido.clear()
+                inicio = time.perf_counter()
+                # La conversacion anterior puede estar cerrandose todavia; el id
+                # rechazado ya quedo registrado, cada reintento usa uno nuevo
+                intento = 0
+                while sesion().post(url, json=_payload(f"e{i}-{intento}", texto), timeout=10).json().get("status") != "encolado":
+                    intento += 1
+                    time.sleep(0.002)
+                if recibido.wait(10):
+                    punta_a_punta.append(time.perf_counter() - inicio)
+        finally:
+            servidor.shutdown()
+            from app import cola
+            cola.detener()
+
+    return {
+        "peticiones": peticiones,
+        "concurrencia": concurrencia,
+        "http_p50_ms": round(_percentil(latencias, 50) * 1000, 2),
+        "http_p99_ms": round(_percentil(latencias, 99) * 1000, 2),
+        "http_por_s": round(peticiones / duracion),
+        "conversaciones": len(punta_a_punta),
+        "ventana_agrupacion_ms": 50,
+        "punta_a_punta_p50_ms": round(_percentil(punta_a_punta, 50) * 1000, 2),
+        "punta_a_punta_p99_ms": round(_percentil(punta_a_punta, 99) * 1000, 2),
+    }
+
+
+def ejecutar(rapido=False):
+    mensajes = generar_corpus(500 if rapido else 2000)
+    cotizaciones = _cotizaciones(mensajes)
+    return {
+        "entorno": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "rapido": rapido,
+        },
+        "extraccion": medir_extraccion(mensajes),
+        "precios": medir_precios(cotizaciones),
+        "pdf": medir_pdf(cotizaciones, 30 if rapido else 150),
+        "webhook": medir_webhook(
+            mensajes,
+            peticiones=300 if rapido else 2000,
+            concurrencia=8,
+            conversaciones=20 if rapido else 100,
+        ),
+    }
+
+
+def comparar(resultados, linea_base, tolerancia):
+    """Imprime la variacion de cada metrica y devuelve las que empeoraron"""
+    regresiones = []
+    for escenario, metrica, mayor_es_mejor in METRICAS_COMPARADAS:
+        actual = resultados.get(escenario, {}).get(metrica)
+        base = linea_base.get(escenario, {}).get(metrica)
+        if not actual or not base:
+            continue
+        cambio = actual / base - 1
+        empeora = -cambio if mayor_es_mejor else cambio
+        marca = "REGRESION" if empeora > tolerancia else ""
+        print(f"  {escenario}.{metrica:36s} {base:>12} -> {actual:>12}  {cambio:+7.1%} {marca}")
+        if marca:
+            regresiones.append(f"{escenario}.{metrica}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rapido", action="store_true", help="corpus y cargas reducidas")
+    parser.add_argument("--guardar", help="escribe los resultados como linea base JSON")
+    parser.add_argument("--comparar", help="linea base JSON contra la que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="empeoramiento relativo admitido")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.rapido)
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Linea base guardada en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            linea_base = json.load(f)
+        print(f"Comparacion con {args.comparar} (tolerancia {args.tolerancia:.0%}):")
+        regresiones = comparar(resultados, linea_base, args.tolerancia)
+        if regresiones:
+            print(f"FALLO: {len(regresiones)} metrica(s) empeoraron: {', '.join(regresiones)}")
+            sys.exit(1)
+        print("OK: sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
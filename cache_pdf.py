@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def clave_cotizacion(info_reserva, totales, cantidad_noches, version_precios, fecha_emision, firma_renderizador=None):
+    """
+    Hash canonico de todo lo que determina el contenido del PDF; la firma del
+    renderizador (`servicio_pdf.firma_renderizador`) cubre perfil, logo y datos del hotel.
+    """
+    canonico = json.dumps(
+        {
+            "info_reserva": info_reserva,
+            "totales": totales,
+            "noches": cantidad_noches,
+            "version_precios": version_precios,
+            "fecha_emision": fecha_emision,
+            "renderizador": firma_renderizador,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+class CachePDF:
+    """
+    Cache LRU de PDFs generados, direccionada por contenido.
+    Nivel en memoria acotado por `max_bytes` y nivel opcional en disco
+    (`directorio`) acotado por `max_bytes_disco`.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, directorio=None, max_bytes_disco=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evictions_disco = 0
+
+        self._bytes_disco = 0
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            self._bytes_disco = sum(
+                entrada.stat().st_size for entrada in os.scandir(directorio)
+                if entrada.name.endswith(".pdf")
+            )
+
+    def obtener(self, clave):
+        with self._lock:
+            pdf_bytes = self._items.get(clave)
+            if pdf_bytes is not None:
+                self._items.move_to_end(clave)
+                self.hits += 1
+                return pdf_bytes
+
+        pdf_bytes = self._leer_disco(clave)
+        with self._lock:
+            if pdf_bytes is None:
+                self.misses += 1
+                return None
+            self.hits_disco += 1
+            self._guardar_memoria(clave, pdf_bytes)
+        return pdf_bytes
+
+    def guardar(self, clave, pdf_bytes):
+        with self._lock:
+            self._guardar_memoria(clave, pdf_bytes)
+        self._escribir_disco(clave, pdf_bytes)
+
+    def obtener_o_generar(self, clave, generar):
+        """Devuelve el PDF en cache o lo genera con `generar()` y lo guarda"""
+        pdf_bytes = self.obtener(clave)
+        if pdf_bytes is None:
+            pdf_bytes = generar()
+            self.guardar(clave, pdf_bytes)
+        return pdf_bytes
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes_disco": self._bytes_disco,
+                "evictions_disco": self.evictions_disco,
+            }
+
+    def _guardar_memoria(self, clave, pdf_bytes):
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        anterior = self._items.pop(clave, None)
+        if anterior is not None:
+            self._bytes -= len(anterior)
+        self._items[clave] = pdf_bytes
+        self._bytes += len(pdf_bytes)
+        while self._bytes > self.max_bytes:
+            _, expulsado = self._items.popitem(last=False)
+            self._bytes -= len(expulsado)
+            self.evictions += 1
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pdf")
+
+    def _leer_disco(self, clave):
+        if not self.directorio:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as f:
+                pdf_bytes = f.read()
+            os.utime(ruta)  # Marca de uso para el LRU del disco
+            return pdf_bytes
+        except OSError:
+            return None
+
+    def _escribir_disco(self, clave, pdf_bytes):
+        if not self.directorio or len(pdf_bytes) > self.max_bytes_disco:
+            return
+        ruta = self._ruta(clave)
+        if os.path.exists(ruta):
+            return
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"Error escribiendo cache PDF en disco: {e}")
+            return
+        with self._lock:
+            self._bytes_disco += len(pdf_bytes)
+            if self._bytes_disco > self.max_bytes_disco:
+                self._podar_disco()
+
+    def _podar_disco(self):
+        """Elimina los archivos menos usados hasta volver bajo el limite"""
+        entradas = sorted(
+            (e for e in os.scandir(self.directorio) if e.name.endswith(".pdf")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        for entrada in entradas:
+            if self._bytes_disco <= self.max_bytes_disco:
+                break
+            try:
+                tamano = entrada.stat().st_size
+                os.remove(entrada.path)
+            except OSError:
+                continue
+            self._bytes_disco -= tamano
+            self.evictions_disco += 1
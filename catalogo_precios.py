@@ -0,0 +1,234 @@
+"""
+Catalogo de precios versionado y recargable en caliente.
+
+Fuente: un archivo JSON o SQLite (segun la extension). Se relee cuando cambia
+su mtime, sin reiniciar los workers. Si no existe se usan los precios de
+`config.PRECIOS_HABITACIONES`.
+
+Formato JSON:
+
+    {
+      "base": {"Habitación Single": 79980, ...},
+      "fin_de_semana": {"Habitación Single": 89990},
+      "temporadas": [
+        {"desde": "2026-12-20", "hasta": "2027-02-28",
+         "precios": {"Habitación Single": 95000},
+         "fin_de_semana": {"Habitación Single": 99000}}
+      ]
+    }
+
+En SQLite: tablas `precios_base(tipo, precio)`, `precios_fin_de_semana(tipo, precio)`
+y `temporadas(desde, hasta, tipo, precio, fin_de_semana)` con fin_de_semana 0/1.
+
+`hasta` es inclusivo. Las noches de fin de semana son viernes y sabado.
+Las temporadas pueden solaparse o anidarse: en cada noche manda, para cada
+tipo, la ultima en empezar que le fija precio; fuera de ella vuelve a regir
+la que la contiene.
+La fuente se lee con la primera consulta, no al crear el catalogo.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import date
+
+from config import PRECIOS_HABITACIONES
+
+PRECIO_POR_DEFECTO = 50000
+DIAS_FIN_DE_SEMANA = (4, 5)
+
+
+def _tramos(temporadas):
+    """Parte las temporadas (ordenadas por inicio) en tramos sin solapes"""
+    cortes = sorted({t[0] for t in temporadas} | {t[1] + 1 for t in temporadas})
+    tramos = []
+    for desde, hasta in zip(cortes, cortes[1:]):
+        cubren = tuple(t for t in temporadas if t[0] <= desde and t[1] >= desde)
+        if cubren:
+            tramos.append((desde, hasta, cubren))
+    return tramos
+
+
+class _Tabla:
+    """Snapshot inmutable de una version del catalogo con indice por fecha"""
+
+    def __init__(self, datos):
+        self.base = dict(datos.get("base") or PRECIOS_HABITACIONES)
+        self.fin_de_semana = dict(datos.get("fin_de_semana") or {})
+        temporadas = sorted(datos.get("temporadas") or [], key=lambda t: t["desde"])
+        self.temporadas = [
+            (
+                date.fromisoformat(t["desde"]).toordinal(),
+                date.fromisoformat(t["hasta"]).toordinal(),
+                dict(t.get("precios") or {}),
+                dict(t.get("fin_de_semana") or {}),
+            )
+            for t in temporadas
+        ]
+        # Tramos sin solapes `(desde, hasta_exclusivo, temporadas que lo cubren)`,
+        # con las temporadas en orden de inicio; indice por fecha de inicio
+        self._tramos = _tramos(self.temporadas)
+        self._inicios = [t[0] for t in self._tramos]
+        canonico = json.dumps(
+            {"base": self.base, "fin_de_semana": self.fin_de_semana, "temporadas": temporadas},
+            sort_keys=True, ensure_ascii=False,
+        )
+        self.version = hashlib.sha1(canonico.encode("utf-8")).hexdigest()[:12]
+
+    def temporadas_en(self, ordinal):
+        """Temporadas que cubren el dia, en orden de inicio"""
+        i = bisect_right(self._inicios, ordinal) - 1
+        if i >= 0 and ordinal < self._tramos[i][1]:
+            return self._tramos[i][2]
+        return ()
+
+    def tarifas(self, tipo, check_in, cantidad_noches):
+        """
+        Precio de cada noche como `array('q')`. Se rellena por tramos (base,
+        noches de fin de semana con paso 7, temporadas que se solapan) en vez
+        de resolver noche por noche.
+        """
+        inicio = check_in.toordinal()
+        fin = inicio + cantidad_noches
+        resultado = array('q', [self.base.get(tipo, PRECIO_POR_DEFECTO)]) * cantidad_noches
+        # Posiciones de viernes y sabado dentro de la estadia
+        viernes = (DIAS_FIN_DE_SEMANA[0] - check_in.weekday()) % 7
+        posiciones_fds = [(viernes + k) % 7 for k in range(len(DIAS_FIN_DE_SEMANA))]
+
+        def aplicar_fds(precio, desde, hasta):
+            for pos in posiciones_fds:
+                primero = desde + (pos - desde) % 7
+                if primero < hasta:
+                    n = len(range(primero, hasta, 7))
+                    resultado[primero:hasta:7] = array('q', [precio]) * n
+
+        if tipo in self.fin_de_semana:
+            aplicar_fds(self.fin_de_semana[tipo], 0, cantidad_noches)
+
+        i = max(bisect_right(self._inicios, inicio) - 1, 0)
+        while i < len(self._tramos) and self._tramos[i][0] < fin:
+            t_desde, t_hasta, temporadas = self._tramos[i]
+            desde = max(t_desde, inicio) - inicio
+            hasta = min(t_hasta, fin) - inicio
+            if desde < hasta:
+                # En orden de inicio: la temporada anidada pisa a la que la contiene
+                for _, _, precios, precios_fds in temporadas:
+                    if tipo in precios:
+                        resultado[desde:hasta] = array('q', [precios[tipo]]) * (hasta - desde)
+                    if tipo in precios_fds:
+                        aplicar_fds(precios_fds[tipo], desde, hasta)
+            i += 1
+        return resultado
+
+    def tarifa(self, tipo, fecha):
+        ordinal = fecha.toordinal()
+        fin_de_semana = fecha.weekday() in DIAS_FIN_DE_SEMANA
+        for _, _, precios, precios_fds in reversed(self.temporadas_en(ordinal)):
+            if fin_de_semana and tipo in precios_fds:
+                return precios_fds[tipo]
+            if tipo in precios:
+                return precios[tipo]
+        if fin_de_semana and tipo in self.fin_de_semana:
+            return self.fin_de_semana[tipo]
+        return self.base.get(tipo, PRECIO_POR_DEFECTO)
+
+
+def _leer_json(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _leer_sqlite(ruta):
+    con = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    try:
+        datos = {
+            "base": dict(con.execute("SELECT tipo, precio FROM precios_base")),
+            "fin_de_semana": {},
+            "temporadas": [],
+        }
+        try:
+            datos["fin_de_semana"] = dict(con.execute("SELECT tipo, precio FROM precios_fin_de_semana"))
+        except sqlite3.OperationalError:
+            pass
+        try:
+            filas = con.execute("SELECT desde, hasta, tipo, precio, fin_de_semana FROM temporadas").fetchall()
+        except sqlite3.OperationalError:
+            filas = []
+    finally:
+        con.close()
+
+    temporadas = {}
+    for desde, hasta, tipo, precio, fds in filas:
+        temporada = temporadas.setdefault(
+            (desde, hasta), {"desde": desde, "hasta": hasta, "precios": {}, "fin_de_semana": {}}
+        )
+        temporada["fin_de_semana" if fds else "precios"][tipo] = precio
+    datos["temporadas"] = list(temporadas.values())
+    return datos
+
+
+class CatalogoPrecios:
+    def __init__(self, ruta=None, intervalo_revision=5):
+        self.ruta = ruta
+        self.intervalo_revision = intervalo_revision
+        self.recargas = 0
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._proxima_revision = 0.0
+        self._tabla = None
+
+    @property
+    def version(self):
+        return self.tabla().version
+
+    def tabla(self):
+        """Snapshot vigente; revisa el mtime de la fuente como mucho cada `intervalo_revision` s"""
+        if self._tabla is None or time.monotonic() >= self._proxima_revision:
+            self._revisar()
+        return self._tabla
+
+    def precios_base(self):
+        return dict(self.tabla().base)
+
+    def tarifa(self, tipo, fecha):
+        return self.tabla().tarifa(tipo, fecha)
+
+    def tarifas(self, tipo, check_in, cantidad_noches):
+        """Precio de cada noche de la estadia, en orden"""
+        return self.tabla().tarifas(tipo, check_in, cantidad_noches)
+
+    def _revisar(self, forzar=False):
+        with self._lock:
+            # La primera revision siempre carga, aunque la fuente no exista
+            forzar = forzar or self._tabla is None
+            if not forzar and time.monotonic() < self._proxima_revision:
+                return
+            self._proxima_revision = time.monotonic() + self.intervalo_revision
+            try:
+                mtime = os.stat(self.ruta).st_mtime_ns if self.ruta else None
+            except OSError:
+                mtime = None
+            if mtime == self._mtime and not forzar:
+                return
+            if mtime is None:
+                self._mtime = None
+                self._tabla = _Tabla({})
+                return
+            try:
+                if self.ruta.endswith((".db", ".sqlite", ".sqlite3")):
+                    datos = _leer_sqlite(self.ruta)
+                else:
+                    datos = _leer_json(self.ruta)
+                self._tabla = _Tabla(datos)
+                # El mtime se recuerda solo si la carga funciono: si no, se reintenta en la proxima revision
+                self._mtime = mtime
+                self.recargas += 1
+            except Exception as e:
+                # Se mantiene la version anterior si la fuente esta a medio escribir o es invalida
+                print(f"Error cargando catalogo de precios {self.ruta}: {e}")
+                if self._tabla is None:
+                    self._tabla = _Tabla({})
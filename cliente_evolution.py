@@ -0,0 +1,316 @@
+import base64
+import json
+import random
+import threading
+import time
+
+# requests y httpx se importan al crear la primera sesion: el arranque del
+# worker (y /health) no paga ese costo.
+
+
+# Multiplo de 3 para que los bloques base64 concatenados sean validos
+TAMANO_BLOQUE_MEDIA = 3 * 16 * 1024
+
+
+class ErrorEvolution(Exception):
+    """La llamada a Evolution API fallo tras agotar los reintentos"""
+
+
+def cuerpo_media_base64(numero, archivo, filename, tamano_bloque=TAMANO_BLOQUE_MEDIA, caption=None):
+    """
+    Genera el JSON de sendMedia por partes, leyendo `archivo` desde el inicio
+    y codificando base64 bloque a bloque. La memoria usada es la de un bloque,
+    independiente del tamano del PDF.
+    """
+    campos = {"number": numero, "mediatype": "document", "fileName": filename}
+    if caption:
+        campos["caption"] = caption
+    cabecera = json.dumps(campos)
+    yield (cabecera[:-1] + ', "media": "').encode("utf-8")
+    archivo.seek(0)
+    while True:
+        bloque = archivo.read(tamano_bloque)
+        if not bloque:
+            break
+        yield base64.b64encode(bloque)
+    yield b'"}'
+
+
+async def _iterar_async(iterable):
+    for parte in iterable:
+        yield parte
+
+
+class _BaseCliente:
+    """
+    Logica comun: URLs, politica de reintentos y estadisticas por endpoint.
+
+    Los envios de texto y documentos no son idempotentes: tras un timeout de
+    lectura Evolution API pudo haber entregado el mensaje, asi que solo se
+    reintentan si la conexion no llego a establecerse o si la respuesta es 5xx.
+    """
+
+    def __init__(self, base_url, api_key, timeout=10, max_reintentos=3,
+                 backoff=0.5, backoff_max=8.0, histograma=None, contador_errores=None):
+        self.base_url = base_url.rstrip('/')
+        # Metricas opcionales por endpoint (metricas.Histograma / metricas.Contador)
+        self.histograma = histograma
+        self.contador_errores = contador_errores
+        self.timeout = timeout
+        self.max_reintentos = max_reintentos
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.headers = {"Content-Type": "application/json", "apikey": api_key}
+        self._lock_stats = threading.Lock()
+        self._stats = {}
+
+    def _url(self, endpoint, instance_name):
+        return f"{self.base_url}/{endpoint}/{instance_name}"
+
+    def _espera_reintento(self, intento):
+        """Backoff exponencial con jitter completo"""
+        techo = min(self.backoff_max, self.backoff * (2 ** intento))
+        return random.uniform(0, techo)
+
+    @staticmethod
+    def _reintentable(status):
+        return status >= 500
+
+    def _registrar(self, endpoint, duracion, error=False, reintento=False):
+        if self.histograma is not None and not reintento:
+            self.histograma.observar(duracion, endpoint)
+        if self.contador_errores is not None and (error or reintento):
+            self.contador_errores.incrementar(endpoint, "reintento" if reintento else "error")
+        with self._lock_stats:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = {
+                    "llamadas": 0, "errores": 0, "reintentos": 0,
+                    "latencia_total": 0.0, "latencia_max": 0.0,
+                }
+            if reintento:
+                stats["reintentos"] += 1
+                return
+            stats["llamadas"] += 1
+            if error:
+                stats["errores"] += 1
+            stats["latencia_total"] += duracion
+            if duracion > stats["latencia_max"]:
+                stats["latencia_max"] = duracion
+
+    def estadisticas(self):
+        with self._lock_stats:
+            return {
+                endpoint: {
+                    "llamadas": s["llamadas"],
+                    "errores": s["errores"],
+                    "reintentos": s["reintentos"],
+                    "latencia_promedio_ms": round(s["latencia_total"] / s["llamadas"] * 1000, 2) if s["llamadas"] else 0.0,
+                    "latencia_max_ms": round(s["latencia_max"] * 1000, 2),
+                }
+                for endpoint, s in self._stats.items()
+            }
+
+    # Payloads de cada endpoint de Evolution API
+    @staticmethod
+    def _payload_leido(remote_jid, message_id):
+        return {"remoteJid": remote_jid, "id": message_id}
+
+    @staticmethod
+    def _payload_presencia(numero, duracion):
+        return {"number": numero, "presence": "composing", "delay": int(duracion * 1000)}
+
+    @staticmethod
+    def _payload_texto(numero, texto):
+        return {"number": numero, "text": texto}
+
+    @staticmethod
+    def _payload_media(numero, media_base64, filename, caption=None):
+        payload = {
+            "number": numero,
+            "mediatype": "document",
+            "media": media_base64,
+            "fileName": filename
+        }
+        if caption:
+            payload["caption"] = caption
+        return payload
+
+
+class ClienteEvolution(_BaseCliente):
+    """
+    Cliente sincrono de Evolution API sobre una `requests.Session` con pool
+    de conexiones keep-alive, reintentos acotados en 5xx/errores de red y
+    estadisticas de latencia por endpoint.
+    """
+
+    def __init__(self, base_url, api_key, tam_pool=10, **kwargs):
+        super().__init__(base_url, api_key, **kwargs)
+        self.tam_pool = tam_pool
+        self._session = None
+        self._errores_red = ()
+        self._errores_conexion = ()
+        self._lock_session = threading.Lock()
+
+    @property
+    def session(self):
+        """Sesion con pool de conexiones, creada con la primera llamada"""
+        if self._session is None:
+            with self._lock_session:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    session.headers.update(self.headers)
+                    adaptador = HTTPAdapter(pool_connections=self.tam_pool, pool_maxsize=self.tam_pool)
+                    session.mount("http://", adaptador)
+                    session.mount("https://", adaptador)
+                    self._errores_red = (requests.Timeout, requests.ConnectionError)
+                    self._errores_conexion = (requests.ConnectTimeout, requests.ConnectionError)
+                    self._session = session
+        return self._session
+
+    def post(self, endpoint, instance_name, payload=None, timeout=None, cuerpo=None, idempotente=True):
+        """
+        POST con reintentos. `cuerpo`, si se indica, es una funcion que devuelve
+        un iterable de bytes nuevo por intento (se envia con chunked encoding).
+        Sin `idempotente` los errores de red solo se reintentan si no se conecto.
+        """
+        url = self._url(endpoint, instance_name)
+        timeout = timeout or self.timeout
+        session = self.session
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                if cuerpo is not None:
+                    response = session.post(url, data=cuerpo(), timeout=timeout)
+                else:
+                    response = session.post(url, json=payload, timeout=timeout)
+                error = None if not self._reintentable(response.status_code) else f"HTTP {response.status_code}"
+                reintentar = True
+            except self._errores_red as e:
+                response = None
+                error = str(e)
+                reintentar = idempotente or isinstance(e, self._errores_conexion)
+            duracion = time.perf_counter() - inicio
+
+            if error is None:
+                self._registrar(endpoint, duracion)
+                return response
+            if intento >= self.max_reintentos or not reintentar:
+                self._registrar(endpoint, duracion, error=True)
+                raise ErrorEvolution(f"{endpoint}: {error}")
+            self._registrar(endpoint, duracion, reintento=True)
+            time.sleep(self._espera_reintento(intento))
+            intento += 1
+
+    def marcar_como_leido(self, remote_jid, message_id, instance_name):
+        return self.post("chat/markMessageAsRead", instance_name,
+                         self._payload_leido(remote_jid, message_id))
+
+    def enviar_presencia(self, numero, instance_name, duracion=3):
+        return self.post("chat/sendPresence", instance_name,
+                         self._payload_presencia(numero, duracion))
+
+    def enviar_texto(self, numero, texto, instance_name):
+        return self.post("message/sendText", instance_name,
+                         self._payload_texto(numero, texto), idempotente=False)
+
+    def enviar_media(self, numero, media_base64, instance_name, filename="cotizacion.pdf", timeout=30,
+                     caption=None):
+        return self.post("message/sendMedia", instance_name,
+                         self._payload_media(numero, media_base64, filename, caption),
+                         timeout=timeout, idempotente=False)
+
+    def enviar_media_stream(self, numero, archivo, instance_name, filename="cotizacion.pdf", timeout=30,
+                            caption=None):
+        """Envia el PDF de `archivo` codificando base64 por bloques, sin copias completas"""
+        return self.post("message/sendMedia", instance_name, timeout=timeout, idempotente=False,
+                         cuerpo=lambda: cuerpo_media_base64(numero, archivo, filename, caption=caption))
+
+    def cerrar(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class ClienteEvolutionAsync(_BaseCliente):
+    """Variante asincrona del cliente sobre `httpx.AsyncClient`"""
+
+    def __init__(self, base_url, api_key, tam_pool=100, **kwargs):
+        try:
+            import httpx
+        except ImportError:  # El cliente asincrono es opcional
+            raise ImportError("ClienteEvolutionAsync requiere el paquete httpx")
+        super().__init__(base_url, api_key, **kwargs)
+        self._errores_red = (httpx.TimeoutException, httpx.TransportError)
+        # La peticion no llego a enviarse
+        self._errores_conexion = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+        limites = httpx.Limits(max_connections=tam_pool, max_keepalive_connections=tam_pool)
+        self.client = httpx.AsyncClient(headers=self.headers, limits=limites)
+        # Con miles de llamadas simultaneas la espera por conexion se hace
+        # aca: la cola del pool de httpx se recorre en cada liberacion y su
+        # espera cuenta para el timeout, asi que se reintentaria sin haber enviado
+        self._cupos = None
+        self.tam_pool = tam_pool
+
+    async def post(self, endpoint, instance_name, payload=None, timeout=None, cuerpo=None, idempotente=True):
+        import asyncio
+
+        if self._cupos is None:
+            self._cupos = asyncio.Semaphore(self.tam_pool)
+        url = self._url(endpoint, instance_name)
+        timeout = timeout or self.timeout
+        intento = 0
+        while True:
+            async with self._cupos:
+                inicio = time.perf_counter()
+                try:
+                    if cuerpo is not None:
+                        response = await self.client.post(url, content=_iterar_async(cuerpo()), timeout=timeout)
+                    else:
+                        response = await self.client.post(url, json=payload, timeout=timeout)
+                    error = None if not self._reintentable(response.status_code) else f"HTTP {response.status_code}"
+                    reintentar = True
+                except self._errores_red as e:
+                    response = None
+                    error = str(e) or e.__class__.__name__
+                    reintentar = idempotente or isinstance(e, self._errores_conexion)
+                duracion = time.perf_counter() - inicio
+
+            if error is None:
+                self._registrar(endpoint, duracion)
+                return response
+            if intento >= self.max_reintentos or not reintentar:
+                self._registrar(endpoint, duracion, error=True)
+                raise ErrorEvolution(f"{endpoint}: {error}")
+            self._registrar(endpoint, duracion, reintento=True)
+            await asyncio.sleep(self._espera_reintento(intento))
+            intento += 1
+
+    async def marcar_como_leido(self, remote_jid, message_id, instance_name):
+        return await self.post("chat/markMessageAsRead", instance_name,
+                               self._payload_leido(remote_jid, message_id))
+
+    async def enviar_presencia(self, numero, instance_name, duracion=3):
+        return await self.post("chat/sendPresence", instance_name,
+                               self._payload_presencia(numero, duracion))
+
+    async def enviar_texto(self, numero, texto, instance_name):
+        return await self.post("message/sendText", instance_name,
+                               self._payload_texto(numero, texto), idempotente=False)
+
+    async def enviar_media(self, numero, media_base64, instance_name, filename="cotizacion.pdf", timeout=30,
+                     caption=None):
+        return await self.post("message/sendMedia", instance_name,
+                               self._payload_media(numero, media_base64, filename, caption),
+                               timeout=timeout, idempotente=False)
+
+    async def enviar_media_stream(self, numero, archivo, instance_name, filename="cotizacion.pdf", timeout=30,
+                            caption=None):
+        return await self.post("message/sendMedia", instance_name, timeout=timeout, idempotente=False,
+                               cuerpo=lambda: cuerpo_media_base64(numero, archivo, filename, caption=caption))
+
+    async def cerrar(self):
+        await self.client.aclose()
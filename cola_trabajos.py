@@ -0,0 +1,191 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos en proceso con un pool de hilos trabajadores.
+    Las etapas diferidas (p. ej. el retardo de "escribiendo...") se programan
+    con un temporizador que las re-encola al vencer, sin dormir un trabajador.
+    `tamano_maximo` limita los pendientes, programados o en la cola: pasado
+    ese numero `programar` rechaza el trabajo nuevo, pero `continuar` acepta
+    siempre la continuacion de uno ya aceptado.
+    """
+
+    def __init__(self, num_trabajadores=4, tamano_maximo=500,
+                 histograma_etapas=None, histograma_espera=None):
+        self.num_trabajadores = num_trabajadores
+        self.tamano_maximo = tamano_maximo
+        # Histogramas opcionales (metricas.Histograma) para /metrics
+        self.histograma_etapas = histograma_etapas
+        self.histograma_espera = histograma_espera
+        self._cola = queue.Queue(maxsize=tamano_maximo)
+        self._programados = []
+        self._secuencia = itertools.count()
+        self._cond_programados = threading.Condition()
+        self._lock_inicio = threading.Lock()
+        self._lock_stats = threading.Lock()
+        self._hilos = []
+        self._activa = False
+
+        self.encolados = 0
+        self.completados = 0
+        self.errores = 0
+        self.rechazados = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._etapas = {}
+
+    def iniciar(self):
+        with self._lock_inicio:
+            if self._activa:
+                return
+            self._activa = True
+            for i in range(self.num_trabajadores):
+                hilo = threading.Thread(target=self._trabajador, name=f"trabajador-{i}", daemon=True)
+                hilo.start()
+                self._hilos.append(hilo)
+            hilo = threading.Thread(target=self._temporizador, name="temporizador", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def programar(self, retraso, funcion, *args, **kwargs):
+        """
+        Encola el trabajo cuando transcurran `retraso` segundos. Devuelve False,
+        sin programarlo, si ya hay `tamano_maximo` trabajos pendientes.
+        """
+        return self._programar(True, retraso, funcion, args, kwargs)
+
+    def continuar(self, retraso, funcion, *args, **kwargs):
+        """Como `programar`, para la continuacion de un trabajo ya aceptado: no se rechaza"""
+        self._programar(False, retraso, funcion, args, kwargs)
+
+    def _programar(self, limitado, retraso, funcion, args, kwargs):
+        if not self._activa:
+            self.iniciar()
+        vence = time.monotonic() + retraso
+        with self._cond_programados:
+            if limitado and self.pendientes() >= self.tamano_maximo:
+                with self._lock_stats:
+                    self.rechazados += 1
+                return False
+            heapq.heappush(self._programados, (vence, next(self._secuencia), funcion, args, kwargs))
+            self._cond_programados.notify()
+        return True
+
+    def detener(self, timeout=5):
+        with self._lock_inicio:
+            if not self._activa:
+                return
+            self._activa = False
+        with self._cond_programados:
+            self._cond_programados.notify_all()
+        for _ in range(self.num_trabajadores):
+            self._cola.put(None)
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+
+    def saturada(self):
+        return self.pendientes() >= self.tamano_maximo
+
+    def pendientes(self):
+        return len(self._programados) + self._cola.qsize()
+
+    def profundidad(self):
+        return self._cola.qsize()
+
+    def programados(self):
+        return len(self._programados)
+
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide la latencia de una etapa del pipeline"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_etapa(nombre, time.perf_counter() - inicio)
+
+    def registrar_etapa(self, nombre, duracion):
+        if self.histograma_etapas is not None:
+            self.histograma_etapas.observar(duracion, nombre)
+        with self._lock_stats:
+            stats = self._etapas.get(nombre)
+            if stats is None:
+                stats = self._etapas[nombre] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duracion
+            if duracion > stats[2]:
+                stats[2] = duracion
+
+    def estadisticas(self):
+        with self._lock_stats:
+            atendidos = self.completados + self.errores
+            return {
+                "trabajadores": self.num_trabajadores,
+                "profundidad": self.profundidad(),
+                "programados": self.programados(),
+                "encolados": self.encolados,
+                "completados": self.completados,
+                "errores": self.errores,
+                "rechazados": self.rechazados,
+                "espera_promedio_ms": round(self._espera_total / atendidos * 1000, 2) if atendidos else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 2),
+                "etapas": {
+                    nombre: {
+                        "cantidad": cantidad,
+                        "promedio_ms": round(total / cantidad * 1000, 2),
+                        "max_ms": round(maximo * 1000, 2),
+                    }
+                    for nombre, (cantidad, total, maximo) in self._etapas.items()
+                },
+            }
+
+    def _trabajador(self):
+        while True:
+            item = self._cola.get()
+            if item is None:
+                break
+            encolado_en, funcion, args, kwargs = item
+            espera = time.monotonic() - encolado_en
+            if self.histograma_espera is not None:
+                self.histograma_espera.observar(espera)
+            try:
+                funcion(*args, **kwargs)
+                exito = True
+            except Exception as e:
+                print(f"Error en trabajo {getattr(funcion, '__name__', funcion)}: {e}")
+                exito = False
+            with self._lock_stats:
+                self._espera_total += espera
+                if espera > self._espera_max:
+                    self._espera_max = espera
+                if exito:
+                    self.completados += 1
+                else:
+                    self.errores += 1
+
+    def _temporizador(self):
+        while True:
+            with self._cond_programados:
+                while self._activa:
+                    if self._programados:
+                        espera = self._programados[0][0] - time.monotonic()
+                        if espera <= 0:
+                            break
+                        self._cond_programados.wait(espera)
+                    else:
+                        self._cond_programados.wait()
+                if not self._activa:
+                    return
+                _, _, funcion, args, kwargs = heapq.heappop(self._programados)
+            # Una etapa programada continua un trabajo ya aceptado: se espera
+            # lugar en la cola en vez de descartarla.
+            self._cola.put((time.monotonic(), funcion, args, kwargs))
+            with self._lock_stats:
+                self.encolados += 1
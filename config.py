@@ -1,12 +1,66 @@
+import os
+
 # Evolution API Configuration
 EVOLUTION_API_BASE = "URL DE EVOLUTIONAPI"
 API_KEY = "APIKEY"
 WEBHOOK_TOKEN = "TOKEN"
+HTTP_TAM_POOL = 10  # Conexiones keep-alive por host
+HTTP_TIMEOUT = 10  # Segundos por llamada
+HTTP_MAX_REINTENTOS = 3  # Reintentos en 5xx/timeouts
+HTTP_BACKOFF = 0.5  # Base del backoff exponencial (segundos)
+ENVIO_PDF_STREAMING = True  # Codificar y enviar el PDF por bloques
 
 # Bot Configuration
 DURACION_ESCRIBIENDO = 3  # Segundos mostrando "escribiendo..."
 TIEMPO_MENSAJE_ANTIGUO = 60  # Ignorar mensajes más antiguos (segundos)
 TIEMPO_AGRUPACION = 1  # Agrupar mensajes en ventana de N segundos
+TIEMPO_ENFRIAMIENTO = 5  # Lo que llega N segundos tras cerrar una conversacion espera a que terminen
+PDF_CON_RESUMEN = False  # Enviar el resumen como texto del PDF (una llamada menos por cotizacion)
+
+# Estado compartido (dedup y conversaciones)
+# "memoria" (un proceso) o "sqlite" (varios procesos, ver gunicorn.conf.py)
+ALMACEN_BACKEND = os.environ.get("ALMACEN_BACKEND", "memoria")
+ALMACEN_RUTA_SQLITE = os.environ.get("ALMACEN_RUTA_SQLITE", "estado_bot.db")
+TTL_MENSAJES_PROCESADOS = 3600  # Segundos que se recuerda un id de mensaje
+TTL_CONVERSACION = 3600  # Segundos sin actividad antes de olvidar una conversacion
+
+# Cola de trabajos
+NUM_TRABAJADORES = 4  # Hilos que ejecutan el pipeline de cotizacion
+TAMANO_MAXIMO_COLA = 500  # Trabajos pendientes antes de responder 503
+
+# Limite por numero y sobrecarga del webhook
+LIMITE_RAFAGA_POR_NUMERO = 10  # Mensajes seguidos de un numero sin esperar
+LIMITE_MENSAJES_POR_MINUTO = 10  # Ritmo sostenido por numero (0 = sin limite)
+LIMITE_ESPERA_MAXIMA = 30  # Segundos que se difiere un mensaje antes de rechazarlo (429)
+
+# Variante asyncio (app_asgi.py)
+ASGI_MAX_TAREAS = 10000  # Conversaciones en curso antes de responder 503
+ASGI_HILOS_CPU = 4  # Hilos para extraccion, precios y PDF
+ASGI_TAM_POOL_HTTP = 100  # Conexiones a Evolution API
+
+# Cache de PDFs generados
+CACHE_PDF_MAX_BYTES = 32 * 1024 * 1024  # Limite del nivel en memoria
+CACHE_PDF_DIRECTORIO = None  # Directorio del nivel en disco (None = desactivado)
+CACHE_PDF_MAX_BYTES_DISCO = 256 * 1024 * 1024
+
+# Renderizado de PDFs en un pool de procesos (ver servicio_pdf.py)
+# 0 = en el proceso; gunicorn.conf.py lo fija en 0 (cada worker es un proceso)
+PDF_PROCESOS = int(os.environ.get("PDF_PROCESOS", os.cpu_count() or 1))
+PDF_MAX_PENDIENTES = 32  # Renderizados en curso o esperando antes de rechazar
+PDF_TIMEOUT = 20  # Segundos maximos por PDF
+PDF_LOGO = "logo.png"  # Sin el archivo el encabezado lleva el nombre del hotel
+# Perfil compacto: logo reducido al tamaño impreso y flujos sin ASCII85
+PDF_COMPACTO = True
+PDF_LOGO_DPI = 150  # Resolucion del logo reducido
+PDF_LOGO_CALIDAD = 85  # Calidad JPEG del logo reducido
+
+# Historial de cotizaciones emitidas (ver historial_cotizaciones.py)
+# Desactivado salvo que se indique el archivo; sin historial no hay reenvio de
+# la ultima cotizacion. Tamano y purga: ver historial_cotizaciones.py
+HISTORIAL_RUTA = os.environ.get("HISTORIAL_RUTA") or None
+HISTORIAL_GUARDAR_PDF = True  # Guardar el PDF para reenviarlo sin volver a generarlo
+HISTORIAL_TAM_LOTE = 200  # Cotizaciones por transaccion
+HISTORIAL_INTERVALO = 0.5  # Segundos que el escritor junta cotizaciones antes de escribir
 
 OPENAI_API_KEY = "KEY DE OPENAI"  
 
@@ -18,7 +72,18 @@ PRECIOS_HABITACIONES = {
     "Habitación Doble 2 Camas": 79980,
 }
 
+# Catalogo de precios (JSON o SQLite, ver catalogo_precios.py); si el archivo
+# no existe se usa PRECIOS_HABITACIONES
+ARCHIVO_PRECIOS = os.environ.get("ARCHIVO_PRECIOS", "precios.json")
+INTERVALO_REVISION_PRECIOS = 5  # Segundos entre revisiones del mtime del archivo
+
 NUMERO_AUTORIZADO = "NUMERO AUTORIZADP"
+# Todos los numeros que pueden pedir cotizaciones (busqueda O(1)); se suman
+# los de la variable de entorno NUMEROS_AUTORIZADOS, separados por comas
+NUMEROS_AUTORIZADOS = frozenset(
+    {NUMERO_AUTORIZADO}
+    | {n.strip() for n in os.environ.get("NUMEROS_AUTORIZADOS", "").split(",") if n.strip()}
+)
 
 
 HOTEL_INFO = {
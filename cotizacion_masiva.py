@@ -0,0 +1,227 @@
+"""
+Generacion masiva de cotizaciones (bloqueos de agencias, eventos).
+
+Lee reservas de un CSV o JSONL, las cotiza con el mismo calculo de precios
+que el bot (`calcular_totales_estadia`) y renderiza los PDFs en paralelo con
+el pool de `ServicioPDF`. Cada PDF se escribe apenas termina, en un
+directorio o en un unico zip, junto a un `resumen.jsonl` con el total o el
+error de cada fila.
+
+Columnas / claves de cada reserva:
+
+    id                 opcional; nombre del archivo (por defecto el numero de fila).
+                       Si se repite, las filas siguientes agregan "_fila<N>"
+    check_in           AAAA-MM-DD
+    check_out          AAAA-MM-DD
+    cant_personas
+    tipo_habitaciones  "1 doble, 2 estandar"
+    mensaje            opcional; texto libre que se pasa por el extractor y
+                       completa los campos que falten
+
+    python cotizacion_masiva.py reservas.csv --salida cotizaciones/
+    python cotizacion_masiva.py reservas.jsonl --salida cotizaciones.zip --procesos 4
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from extractor import extraer_informacion_reserva
+from habitaciones import MezclaHabitaciones
+from precios import calcular_totales_estadia
+from reservas import CAMPOS_REQUERIDOS, campos_faltantes
+from servicio_pdf import ServicioPDF
+
+_PATRON_NOMBRE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def leer_reservas(ruta):
+    """Itera las reservas de un CSV o JSONL como diccionarios"""
+    with open(ruta, encoding="utf-8", newline="") as f:
+        if ruta.endswith((".jsonl", ".ndjson")):
+            for linea in f:
+                if linea.strip():
+                    yield json.loads(linea)
+        else:
+            yield from csv.DictReader(f)
+
+
+def preparar_reserva(fila, fecha_actual=None):
+    """Fila de entrada -> (info_reserva, check_in, noches). Lanza ValueError si esta incompleta."""
+    info = {campo: (str(fila[campo]).strip() if fila.get(campo) else None) for campo in CAMPOS_REQUERIDOS}
+    # La mezcla sale de la columna si la hay; la del mensaje solo si esta vacia
+    info['mezcla_habitaciones'] = None
+    tipo_en_fila = info['tipo_habitaciones']
+    if tipo_en_fila:
+        info['mezcla_habitaciones'] = MezclaHabitaciones.desde_texto(info['tipo_habitaciones'])
+        if not info['cantidad_habitaciones'] and info['mezcla_habitaciones']:
+            info['cantidad_habitaciones'] = str(info['mezcla_habitaciones'].cantidad_total())
+    if fila.get("mensaje"):
+        extraida = extraer_informacion_reserva(fila["mensaje"], fecha_actual)
+        for campo in CAMPOS_REQUERIDOS:
+            if not info[campo]:
+                info[campo] = extraida.get(campo)
+        if not tipo_en_fila:
+            info['mezcla_habitaciones'] = extraida.get('mezcla_habitaciones')
+    if not info['cantidad_habitaciones'] and info['mezcla_habitaciones']:
+        info['cantidad_habitaciones'] = str(info['mezcla_habitaciones'].cantidad_total())
+
+    faltantes = campos_faltantes(info)
+    if faltantes:
+        raise ValueError(f"faltan {', '.join(faltantes)}")
+    check_in = datetime.strptime(info['check_in'], '%Y-%m-%d').date()
+    check_out = datetime.strptime(info['check_out'], '%Y-%m-%d').date()
+    noches = (check_out - check_in).days
+    if noches <= 0:
+        raise ValueError("Fechas invalidas")
+    return info, check_in, noches
+
+
+class _Salida:
+    """Directorio o zip; las escrituras se serializan porque llegan de varios hilos"""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self._lock = threading.Lock()
+        self._nombres = set()
+        if destino.endswith(".zip"):
+            # Los PDF ya vienen comprimidos: se guardan sin recomprimir
+            self._zip = zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_STORED)
+        else:
+            self._zip = None
+            os.makedirs(destino, exist_ok=True)
+
+    def nombre_libre(self, nombre, numero):
+        """`nombre`, o con el numero de fila si otra fila ya lo usa (ids repetidos)"""
+        base, extension = os.path.splitext(nombre)
+        candidato, intento = nombre, 0
+        while candidato in self._nombres:
+            intento += 1
+            candidato = f"{base}_fila{numero}{'' if intento == 1 else f'_{intento}'}{extension}"
+        self._nombres.add(candidato)
+        return candidato
+
+    def escribir(self, nombre, datos):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.writestr(nombre, datos)
+            else:
+                with open(os.path.join(self.destino, nombre), "wb") as f:
+                    f.write(datos)
+
+    def cerrar(self):
+        if self._zip is not None:
+            self._zip.close()
+
+
+def _nombre_archivo(fila, numero):
+    identificador = _PATRON_NOMBRE.sub("_", str(fila.get("id") or numero)).strip("_") or str(numero)
+    return f"cotizacion_{identificador}.pdf"
+
+
+def cotizar_lote(reservas, destino, procesos=None, servicio=None, progreso=None, fecha_actual=None):
+    """
+    Cotiza y renderiza un iterable de reservas en `destino` (directorio o .zip).
+    `progreso(hechas, errores)` se llama cada vez que termina una. Devuelve
+    las estadisticas del lote.
+    """
+    propio = servicio is None
+    if propio:
+        servicio = ServicioPDF(procesos=(os.cpu_count() or 1) if procesos is None else procesos)
+        servicio.iniciar()
+    # Hilos suficientes para mantener ocupados los procesos sin exceder los cupos
+    hilos = max(1, min(servicio.max_pendientes, (servicio.procesos or 1) * 2))
+    salida = _Salida(destino)
+    resumen = []
+    hechas = errores = 0
+    inicio = time.perf_counter()
+
+    def cotizar(numero, fila, nombre):
+        info, check_in, noches = preparar_reserva(fila, fecha_actual)
+        totales = calcular_totales_estadia(
+            info['mezcla_habitaciones'] or info['tipo_habitaciones'], check_in, noches
+        )
+        salida.escribir(nombre, servicio.renderizar(info, totales, noches))
+        return {"fila": numero, "id": fila.get("id"), "archivo": nombre,
+                "noches": noches, "total_bruto": totales['total_bruto']}
+
+    try:
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            # Se envia por tandas para no cargar en memoria un archivo enorme
+            pendientes = {}
+            for numero, fila in enumerate(reservas, start=1):
+                # El nombre se asigna en orden de fila: con ids repetidos el primero conserva el suyo
+                nombre = salida.nombre_libre(_nombre_archivo(fila, numero), numero)
+                pendientes[pool.submit(cotizar, numero, fila, nombre)] = (numero, fila)
+                if len(pendientes) >= hilos * 4:
+                    hechas, errores = _recolectar(pendientes, resumen, hechas, errores, progreso, hilos * 2)
+            hechas, errores = _recolectar(pendientes, resumen, hechas, errores, progreso, 0)
+        resumen.sort(key=lambda r: r["fila"])
+        salida.escribir("resumen.jsonl", "".join(
+            json.dumps(r, ensure_ascii=False) + "\n" for r in resumen
+        ).encode("utf-8"))
+    finally:
+        salida.cerrar()
+        if propio:
+            servicio.detener()
+
+    duracion = time.perf_counter() - inicio
+    return {
+        "reservas": hechas + errores,
+        "generadas": hechas,
+        "errores": errores,
+        "segundos": round(duracion, 2),
+        "pdfs_por_s": round(hechas / duracion, 1) if duracion else 0.0,
+        "destino": destino,
+    }
+
+
+def _recolectar(pendientes, resumen, hechas, errores, progreso, hasta):
+    """Espera resultados hasta que queden `hasta` pendientes"""
+    for futuro in as_completed(list(pendientes)):
+        numero, fila = pendientes.pop(futuro)
+        try:
+            resumen.append(futuro.result())
+            hechas += 1
+        except Exception as e:
+            print(f"Error en la fila {numero}: {e}")
+            resumen.append({"fila": numero, "id": fila.get("id"), "error": str(e)})
+            errores += 1
+        if progreso:
+            progreso(hechas, errores)
+        if len(pendientes) <= hasta:
+            break
+    return hechas, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entrada", help="CSV o JSONL de reservas")
+    parser.add_argument("--salida", required=True, help="directorio o archivo .zip")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos de renderizado (por defecto, CPUs)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+
+    def progreso(hechas, errores):
+        total = hechas + errores
+        if total % 25 == 0:
+            ritmo = hechas / (time.perf_counter() - inicio)
+            print(f"\r{total} procesadas, {errores} con error, {ritmo:.1f} PDFs/s", end="", file=sys.stderr, flush=True)
+
+    estadisticas = cotizar_lote(leer_reservas(args.entrada), args.salida, args.procesos, progreso=progreso)
+    print(file=sys.stderr)
+    print(json.dumps(estadisticas, ensure_ascii=False))
+    if estadisticas["errores"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
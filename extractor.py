@@ -1,37 +1,63 @@
 import re
 from datetime import datetime, timedelta
 
+from habitaciones import ALIAS_TIPOS, ESTANDAR, MezclaHabitaciones
+
+# Todos los patrones se compilan una sola vez al importar el modulo.
+
+_TABLA_ACENTOS = str.maketrans("áéíóú", "aeiou")
+
+_NUMEROS = {
+    "una": "1", "un": "1", "uno": "1", "dos": "2", "tres": "3",
+    "cuatro": "4", "cinco": "5", "seis": "6", "siete": "7",
+    "ocho": "8", "nueve": "9", "diez": "10"
+}
+
+_TERMINOS = {
+    "habitacion": "hab", "habitaciones": "hab",
+    "piezas": "hab", "pieza": "hab", "matrimonial": "doble",
+    "simple": "single", "sencilla": "single", "estandar": "standard"
+}
+
+# Numeros y terminos en una sola alternancia: ningun reemplazo produce otra
+# palabra del diccionario ni cambia los limites de palabra, asi que una
+# pasada equivale a aplicar cada re.sub por separado.
+_REEMPLAZOS = {**_NUMEROS, **_TERMINOS}
+_PATRON_NORMALIZACION = re.compile(
+    r'\b(?:' + '|'.join(sorted(_REEMPLAZOS, key=len, reverse=True)) + r')\b'
+)
+
+# La extraccion, en cambio, sigue con un patron por campo: se solapan entre
+# si ("para 2 personas" lo toman dos patrones de personas, "2 hab doble" los
+# dos de habitaciones) y cada uno tiene su prioridad (primera coincidencia o
+# todas), cosa que una sola alternancia, que consume el texto, no preserva.
+# Sobre mensajes cortos son ~7 busquedas de unos microsegundos en total.
+_PATRON_RANGO = re.compile(r'del\s+(\d+)\s+al\s+(\d+)')
+_PATRON_FECHA = re.compile(r'(\d{1,2})[/-](\d{1,2})')
+_PATRON_HAB = re.compile(r'(\d+)\s*(?:hab|habs|piezas?)?\s*(doble|single|standard|superior)')
+_PATRON_HAB_GENERAL = re.compile(r'(\d+)\s*(?:hab|habitacion|habitaciones|pieza)')
+_PATRONES_PERSONAS = (
+    re.compile(r'(?:somos|para|son)\s+(\d+)\s*(?:personas|adultos|pax)?'),
+    re.compile(r'(\d+)\s+(?:personas|adultos|pax)'),
+    re.compile(r'para\s+(\d+)\b'),
+)
+_PATRON_REENVIO = re.compile(
+    r'\breenvi\w*|\bvuelve\w*\s+a\s+(?:enviar|mandar)|\b(?:envia|manda)\w*\s+(?:de\s+nuevo|otra\s+vez|nuevamente)'
+)
+
+
+def _reemplazar(match):
+    return _REEMPLAZOS[match.group(0)]
+
 def normalizar_texto_mejorado(texto):
-    texto = texto.lower()
-    replacements = (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"))
-    for a, b in replacements:
-        texto = texto.replace(a, b)
-    
-    numeros = {
-        "una": "1", "un": "1", "uno": "1", "dos": "2", "tres": "3", 
-        "cuatro": "4", "cinco": "5", "seis": "6", "siete": "7", 
-        "ocho": "8", "nueve": "9", "diez": "10"
-    }
-    
-    for palabra, digito in numeros.items():
-        texto = re.sub(r'\b' + palabra + r'\b', digito, texto)
-    
-    terminos = {
-        "habitacion": "hab", "habitaciones": "hab", 
-        "piezas": "hab", "pieza": "hab", "matrimonial": "doble",
-        "simple": "single", "sencilla": "single", "estandar": "standard"
-    }
-    
-    for palabra, reemplazo in terminos.items():
-        texto = re.sub(r'\b' + palabra + r'\b', reemplazo, texto)
-        
-    return texto
+    texto = texto.lower().translate(_TABLA_ACENTOS)
+    return _PATRON_NORMALIZACION.sub(_reemplazar, texto)
 
-def extraer_fechas(texto):
+def extraer_fechas(texto, fecha_actual=None):
     """Extrae fechas de check-in y check-out del texto"""
     resultado = {"check_in": None, "check_out": None}
-    fecha_actual = datetime.now()
-    
+    fecha_actual = fecha_actual or datetime.now()
+
     # Fechas relativas comunes
     if "mañana" in texto or "manana" in texto:
         check_in = fecha_actual + timedelta(days=1)
@@ -44,117 +70,112 @@ def extraer_fechas(texto):
         check_in = fecha_actual + timedelta(days=2)
         resultado['check_in'] = check_in.strftime('%Y-%m-%d')
         resultado['check_out'] = (check_in + timedelta(days=1)).strftime('%Y-%m-%d')
-    
+
     # Buscar patrones de fecha: del X al Y
-    rango_match = re.search(r'del\s+(\d+)\s+al\s+(\d+)', texto)
+    rango_match = _PATRON_RANGO.search(texto)
     if rango_match:
         dia_inicio = int(rango_match.group(1))
         dia_fin = int(rango_match.group(2))
-        
+
         mes = fecha_actual.month
         año = fecha_actual.year
-        
+
         if dia_inicio < fecha_actual.day:
             mes += 1
             if mes > 12:
                 mes = 1
                 año += 1
-        
+
         resultado['check_in'] = f"{año}-{mes:02d}-{dia_inicio:02d}"
         resultado['check_out'] = f"{año}-{mes:02d}-{dia_fin:02d}"
-    
+
     # Buscar fechas explícitas dd/mm
-    fecha_match = re.search(r'(\d{1,2})[/-](\d{1,2})', texto)
-    if fecha_match and not resultado['check_in']:
-        dia = int(fecha_match.group(1))
-        mes = int(fecha_match.group(2))
-        
-        año = fecha_actual.year
-        if mes < fecha_actual.month or (mes == fecha_actual.month and dia < fecha_actual.day):
-            año += 1
-        
-        resultado['check_in'] = f"{año}-{mes:02d}-{dia:02d}"
-        resultado['check_out'] = f"{año}-{mes:02d}-{(dia + 1):02d}"
-    
+    if not resultado['check_in']:
+        fecha_match = _PATRON_FECHA.search(texto)
+        if fecha_match:
+            dia = int(fecha_match.group(1))
+            mes = int(fecha_match.group(2))
+
+            año = fecha_actual.year
+            if mes < fecha_actual.month or (mes == fecha_actual.month and dia < fecha_actual.day):
+                año += 1
+
+            resultado['check_in'] = f"{año}-{mes:02d}-{dia:02d}"
+            resultado['check_out'] = f"{año}-{mes:02d}-{(dia + 1):02d}"
+
     return resultado
 
 def extraer_habitaciones(texto):
     """Extrae información de habitaciones del texto"""
-    resultado = {"cantidad_habitaciones": None, "tipo_habitaciones": None}
-    
-    # Patrón mejorado para detectar múltiples tipos de habitaciones
+    resultado = {"cantidad_habitaciones": None, "tipo_habitaciones": None,
+                 "mezcla_habitaciones": None}
+
     # Ej: "1 doble y 2 estandar", "2 standard, 1 superior"
-    patron_hab = r'(\d+)\s*(?:hab|habs|piezas?)?\s*(doble|single|standard|superior)'
-    
-    # Encontrar todas las coincidencias
-    coincidencias = re.findall(patron_hab, texto)
-    
+    coincidencias = _PATRON_HAB.findall(texto)
+
     if coincidencias:
         habitaciones = []
+        items = []
         total = 0
-        
+
         for cant_str, tipo in coincidencias:
             cantidad = int(cant_str)
             total += cantidad
-            
+
             # Normalizar nombres para consistencia
             if tipo == "standard":
                 tipo = "estandar"
-            
+
             habitaciones.append(f"{cantidad} {tipo}")
-        
+            items.append((ALIAS_TIPOS[tipo], cantidad))
+
         resultado['cantidad_habitaciones'] = str(total)
         resultado['tipo_habitaciones'] = ", ".join(habitaciones)
+        resultado['mezcla_habitaciones'] = MezclaHabitaciones(items)
     else:
         # Buscar cantidad general de habitaciones
-        match_gen = re.search(r'(\d+)\s*(?:hab|habitacion|habitaciones|pieza)', texto)
+        match_gen = _PATRON_HAB_GENERAL.search(texto)
         if match_gen:
             cantidad = match_gen.group(1)
             resultado['cantidad_habitaciones'] = cantidad
             resultado['tipo_habitaciones'] = f"{cantidad} estandar"
-    
+            resultado['mezcla_habitaciones'] = MezclaHabitaciones([(ESTANDAR, int(cantidad))])
+
     return resultado
 
 def extraer_personas(texto):
     """Extrae cantidad de personas del texto"""
     resultado = {"cant_personas": None}
-    
-    # Patrones para buscar cantidad de personas
-    patrones = [
-        r'(?:somos|para|son)\s+(\d+)\s*(?:personas|adultos|pax)?',
-        r'(\d+)\s+(?:personas|adultos|pax)',
-        r'para\s+(\d+)\b'
-    ]
-    
-    for patron in patrones:
-        match = re.search(patron, texto)
+
+    for patron in _PATRONES_PERSONAS:
+        match = patron.search(texto)
         if match and match.group(1):
             resultado['cant_personas'] = match.group(1)
             break
-    
+
     return resultado
 
-def extraer_informacion_reserva(mensaje):
+def es_pedido_reenvio(mensaje):
+    """True si el mensaje pide volver a enviar la cotizacion anterior"""
+    return _PATRON_REENVIO.search(normalizar_texto_mejorado(mensaje)) is not None
+
+def extraer_informacion_reserva(mensaje, fecha_actual=None):
     """Extrae información de reserva del mensaje"""
     resultado = {
         "check_in": None, 
         "check_out": None,
         "cant_personas": None, 
         "cantidad_habitaciones": None, 
-        "tipo_habitaciones": None
+        "tipo_habitaciones": None,
+        "mezcla_habitaciones": None
     }
     
     texto = normalizar_texto_mejorado(mensaje)
     
     # Extraer cada componente por separado
-    fechas = extraer_fechas(texto)
-    habitaciones = extraer_habitaciones(texto)
-    personas = extraer_personas(texto)
-    
-    # Combinar resultados
-    resultado.update(fechas)
-    resultado.update(habitaciones)
-    resultado.update(personas)
+    resultado.update(extraer_fechas(texto, fecha_actual))
+    resultado.update(extraer_habitaciones(texto))
+    resultado.update(extraer_personas(texto))
     
     # Lógica de fallback para cantidad de habitaciones
     if resultado['cantidad_habitaciones'] and resultado['cant_personas']:
@@ -165,7 +186,23 @@ def extraer_informacion_reserva(mensaje):
             # Si no hay tipo específico pero sí hay cantidad, asignar "estandar"
             if not resultado['tipo_habitaciones'] and habs > 0:
                 resultado['tipo_habitaciones'] = f"{habs} estandar"
+                resultado['mezcla_habitaciones'] = MezclaHabitaciones([(ESTANDAR, habs)])
         except ValueError:
             pass
     
-    return resultado
\ No newline at end of file
+    return resultado
+
+def extraer_informacion_reserva_batch(mensajes, fecha_actual=None):
+    """
+    Extrae la información de una lista de mensajes (p. ej. un log a re-procesar).
+    Usa una sola fecha de referencia y procesa una vez cada texto repetido.
+    """
+    fecha_actual = fecha_actual or datetime.now()
+    vistos = {}
+    resultados = []
+    for mensaje in mensajes:
+        info = vistos.get(mensaje)
+        if info is None:
+            info = vistos[mensaje] = extraer_informacion_reserva(mensaje, fecha_actual)
+        resultados.append(dict(info))  # MezclaHabitaciones es inmutable
+    return resultados
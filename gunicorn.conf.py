@@ -0,0 +1,26 @@
+# Configuracion de gunicorn para el modo multiproceso (ver wsgi.py)
+import multiprocessing
+import os
+
+# El estado compartido entre workers vive en SQLite; se fija antes de que
+# los workers importen config.py.
+os.environ.setdefault("ALMACEN_BACKEND", "sqlite")
+os.environ.setdefault("ALMACEN_RUTA_SQLITE", "estado_bot.db")
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WORKERS", multiprocessing.cpu_count()))
+# Los workers ya reparten los PDFs entre los nucleos: con un pool de
+# cpu_count procesos en cada uno habria cpu_count**2 renderizadores
+os.environ.setdefault("PDF_PROCESOS", "0")
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", 4))
+timeout = 30
+# El master importa la app una vez (import liviano, ver app.crear_app) y los
+# workers arrancan por fork; cada uno carga los subsistemas pesados despues
+preload_app = os.environ.get("PRELOAD_APP", "1") == "1"
+
+
+def post_worker_init(worker):
+    # ReportLab o el pool de PDF, requests, NumPy y el catalogo, antes de la primera cotizacion
+    from app import precalentar
+    precalentar()
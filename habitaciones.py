@@ -0,0 +1,101 @@
+import re
+
+ESTANDAR = 'Habitación Estándar'
+SINGLE = 'Habitación Single'
+SUPERIOR = 'Habitación Superior'
+DOBLE = 'Habitación Doble 2 Camas'
+
+# Alias (sin acentos, en minusculas) -> tipo canonico del catalogo
+ALIAS_TIPOS = {
+    'single': SINGLE, 'sencilla': SINGLE, 'simple': SINGLE,
+    'estandar': ESTANDAR, 'standard': ESTANDAR,
+    'superior': SUPERIOR, 'premium': SUPERIOR,
+    'doble': DOBLE, 'matrimonial': DOBLE,
+}
+
+# Forma corta usada en el texto "1 doble, 2 estandar"
+NOMBRE_CORTO = {SINGLE: 'single', ESTANDAR: 'estandar', SUPERIOR: 'superior', DOBLE: 'doble'}
+
+_TABLA_ACENTOS = str.maketrans("áéíóú", "aeiou")
+_PATRON_SEPARADOR = re.compile(r'[,;]|\s+y\s+|\s+e\s+')
+_PATRON_ITEM = re.compile(r'(\d+)\s+(doble|single|estandar|standard|superior)')
+_PATRON_CANTIDAD = re.compile(r'(\d+)')
+
+
+def tipo_canonico(tipo_str):
+    """Normaliza un nombre de tipo de habitacion; Estándar si no se reconoce"""
+    if not tipo_str:
+        return ESTANDAR
+    tipo = tipo_str.lower().strip().translate(_TABLA_ACENTOS)
+    canonico = ALIAS_TIPOS.get(tipo)
+    if canonico is not None:
+        return canonico
+    # Nombres compuestos ("habitacion doble 2 camas"): primer alias contenido,
+    # con la misma prioridad que la normalizacion original
+    for alias in ('single', 'sencilla', 'simple', 'estandar', 'standard',
+                  'superior', 'premium', 'doble', 'matrimonial'):
+        if alias in tipo:
+            return ALIAS_TIPOS[alias]
+    return ESTANDAR
+
+
+class MezclaHabitaciones:
+    """
+    Mezcla de habitaciones de una reserva: pares (tipo canonico, cantidad)
+    en el orden en que se mencionaron. La produce el extractor y la consume
+    directamente el calculo de precios.
+    """
+
+    __slots__ = ('items',)
+
+    def __init__(self, items=()):
+        self.items = tuple(items)
+
+    @classmethod
+    def desde_texto(cls, tipo_habitaciones_str):
+        """Parsea "1 doble, 2 estandar" (formato del extractor)"""
+        if not tipo_habitaciones_str:
+            return cls()
+        items = []
+        for parte in _PATRON_SEPARADOR.split(tipo_habitaciones_str.lower()):
+            match = _PATRON_ITEM.search(parte)
+            if match:
+                items.append((ALIAS_TIPOS[match.group(2)], int(match.group(1))))
+        if not items:
+            # Sin tipos reconocibles: la primera cantidad como Estándar
+            match = _PATRON_CANTIDAD.search(tipo_habitaciones_str)
+            if match:
+                items.append((ESTANDAR, int(match.group(1))))
+        return cls(items)
+
+    @classmethod
+    def desde_lista(cls, lista):
+        return cls((tipo, cantidad) for tipo, cantidad in lista)
+
+    def a_lista(self):
+        """Forma serializable (JSON) de la mezcla"""
+        return [[tipo, cantidad] for tipo, cantidad in self.items]
+
+    def a_texto(self):
+        return ", ".join(f"{cantidad} {NOMBRE_CORTO[tipo]}" for tipo, cantidad in self.items)
+
+    def cantidad_total(self):
+        return sum(cantidad for _, cantidad in self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __eq__(self, otra):
+        return isinstance(otra, MezclaHabitaciones) and self.items == otra.items
+
+    def __hash__(self):
+        return hash(self.items)
+
+    def __repr__(self):
+        return f"MezclaHabitaciones({list(self.items)!r})"
@@ -0,0 +1,275 @@
+"""
+Historial de cotizaciones emitidas, en SQLite (modo WAL).
+
+Cada cotizacion se agrega una sola vez con la reserva normalizada, los
+totales, la version de precios y el PDF; el servicio no actualiza ni borra.
+`registrar` solo encola la fila: un hilo escritor las inserta por lotes en
+una transaccion, asi el pipeline nunca espera al disco. Si la cola se llena
+la fila se descarta y se cuenta en `descartadas`.
+
+Indices por numero (reenvio de la ultima cotizacion), por fechas de la
+estadia y por fecha de creacion (reportes).
+
+Tamano: cada cotizacion ocupa unos 4 KB, de los que unos 2.5 KB son el PDF
+(unos 1.5 KB con HISTORIAL_GUARDAR_PDF = False). A 1000 cotizaciones diarias
+son unos 4 MB por dia, 1.5 GB al ano. El archivo no crece solo: hay que
+purgarlo, p. ej. con un cron diario que quite los PDF de mas de 30 dias (el
+reenvio solo usa el de la ultima cotizacion) y las filas de mas de 365. La
+purga no achica el archivo, solo deja paginas libres que se reutilizan;
+--compactar (VACUUM) lo reescribe y bloquea al servicio mientras dura.
+
+    python historial_cotizaciones.py cotizaciones.db [--numero 569...] [--desde 2026-12-01] [--hasta 2026-12-31]
+    python historial_cotizaciones.py cotizaciones.db --pdf 42 --salida cotizacion.pdf
+    python historial_cotizaciones.py cotizaciones.db --purgar-pdf-dias 30 --purgar-dias 365 [--compactar]
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from reservas import CAMPOS_REQUERIDOS
+
+_COLUMNAS = (
+    "creada", "numero", "check_in", "check_out", "noches", "cant_personas",
+    "habitaciones", "reserva", "totales", "total_bruto", "version_precios", "pdf"
+)
+_COLUMNAS_RESUMEN = tuple(c for c in _COLUMNAS if c not in ("reserva", "totales", "pdf"))
+
+_ESQUEMA = (
+    "CREATE TABLE IF NOT EXISTS cotizaciones ("
+    "id INTEGER PRIMARY KEY, creada REAL NOT NULL, numero TEXT NOT NULL, "
+    "check_in TEXT NOT NULL, check_out TEXT NOT NULL, noches INTEGER NOT NULL, "
+    "cant_personas TEXT, habitaciones TEXT, reserva TEXT NOT NULL, totales TEXT NOT NULL, "
+    "total_bruto INTEGER NOT NULL, version_precios TEXT, pdf BLOB)",
+    "CREATE INDEX IF NOT EXISTS idx_cotizaciones_numero ON cotizaciones (numero, creada)",
+    "CREATE INDEX IF NOT EXISTS idx_cotizaciones_fechas ON cotizaciones (check_in, check_out)",
+    "CREATE INDEX IF NOT EXISTS idx_cotizaciones_creada ON cotizaciones (creada)",
+)
+
+
+def _reserva_normalizada(info_reserva):
+    reserva = {campo: info_reserva.get(campo) for campo in CAMPOS_REQUERIDOS}
+    mezcla = info_reserva.get('mezcla_habitaciones')
+    reserva['mezcla_habitaciones'] = mezcla.a_lista() if mezcla else None
+    return reserva
+
+
+class HistorialCotizaciones:
+    def __init__(self, ruta, tam_lote=200, intervalo=0.5, max_pendientes=10000, guardar_pdf=True):
+        self.ruta = ruta
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.guardar_pdf = guardar_pdf
+        self._cola = queue.Queue(max_pendientes)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+
+        self.registradas = 0
+        self.lotes = 0
+        self.descartadas = 0
+        self.errores = 0
+
+    def _conexion(self):
+        # Una conexion por hilo y por proceso, como en AlmacenSQLite
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            for sentencia in _ESQUEMA:
+                con.execute(sentencia)
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def _iniciar(self):
+        # Arranca con la primera fila: tras un fork cada worker tiene su escritor
+        with self._lock:
+            if self._pid != os.getpid():
+                self._hilo = threading.Thread(target=self._escritor, name="historial-cotizaciones", daemon=True)
+                self._hilo.start()
+                self._pid = os.getpid()
+
+    def registrar(self, numero, info_reserva, totales, cantidad_noches, version_precios, pdf_bytes=None):
+        """Encola la cotizacion para guardarla; no bloquea"""
+        if self._pid != os.getpid():
+            self._iniciar()
+        fila = (
+            time.time(), numero, info_reserva['check_in'], info_reserva['check_out'], cantidad_noches,
+            info_reserva.get('cant_personas'), info_reserva.get('tipo_habitaciones'),
+            json.dumps(_reserva_normalizada(info_reserva), ensure_ascii=False),
+            json.dumps(totales, ensure_ascii=False), totales['total_bruto'], version_precios,
+            pdf_bytes if self.guardar_pdf else None,
+        )
+        try:
+            self._cola.put_nowait(fila)
+        except queue.Full:
+            with self._lock:
+                self.descartadas += 1
+
+    def _escritor(self):
+        while True:
+            fila = self._cola.get()
+            if fila is None:
+                return
+            # Junta lo que llegue durante `intervalo` en una sola transaccion
+            lote = [fila]
+            fin = time.monotonic() + self.intervalo
+            while len(lote) < self.tam_lote:
+                restante = fin - time.monotonic()
+                try:
+                    fila = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if fila is None:
+                    self._escribir(lote)
+                    return
+                lote.append(fila)
+            self._escribir(lote)
+
+    def _escribir(self, lote):
+        try:
+            con = self._conexion()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                con.executemany(
+                    f"INSERT INTO cotizaciones ({', '.join(_COLUMNAS)}) VALUES ({', '.join('?' * len(_COLUMNAS))})",
+                    lote,
+                )
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"Error guardando {len(lote)} cotizaciones: {e}")
+            with self._lock:
+                self.errores += len(lote)
+            return
+        with self._lock:
+            self.registradas += len(lote)
+            self.lotes += 1
+
+    def ultima(self, numero):
+        """La ultima cotizacion guardada de `numero` (con el PDF), o None"""
+        con = self._conexion()
+        fila = con.execute(
+            "SELECT id, check_in, check_out, noches, total_bruto, version_precios, creada, pdf "
+            "FROM cotizaciones WHERE numero = ? ORDER BY creada DESC LIMIT 1",
+            (numero,),
+        ).fetchone()
+        if fila is None:
+            return None
+        claves = ("id", "check_in", "check_out", "noches", "total_bruto", "version_precios", "creada", "pdf")
+        return dict(zip(claves, fila))
+
+    def buscar(self, numero=None, check_in_desde=None, check_in_hasta=None,
+               creada_desde=None, creada_hasta=None, limite=1000):
+        """Cotizaciones (sin reserva, totales ni PDF) que cumplen los filtros, las mas recientes primero"""
+        condiciones, parametros = [], []
+        for columna, operador, valor in (
+            ("numero", "=", numero),
+            ("check_in", ">=", check_in_desde),
+            ("check_in", "<=", check_in_hasta),
+            ("creada", ">=", creada_desde),
+            ("creada", "<", creada_hasta),
+        ):
+            if valor is not None:
+                condiciones.append(f"{columna} {operador} ?")
+                parametros.append(valor)
+        donde = f"WHERE {' AND '.join(condiciones)} " if condiciones else ""
+        filas = self._conexion().execute(
+            f"SELECT id, {', '.join(_COLUMNAS_RESUMEN)} FROM cotizaciones {donde}"
+            "ORDER BY creada DESC LIMIT ?",
+            parametros + [limite],
+        ).fetchall()
+        return [dict(zip(("id",) + _COLUMNAS_RESUMEN, fila)) for fila in filas]
+
+    def pdf(self, id_cotizacion):
+        fila = self._conexion().execute("SELECT pdf FROM cotizaciones WHERE id = ?", (id_cotizacion,)).fetchone()
+        return fila[0] if fila else None
+
+    def purgar(self, antes_de, solo_pdf=False):
+        """
+        Borra las cotizaciones emitidas antes de `antes_de` (epoch), o solo
+        su PDF con `solo_pdf`. Devuelve cuantas filas cambiaron.
+        """
+        if solo_pdf:
+            sentencia = "UPDATE cotizaciones SET pdf = NULL WHERE creada < ? AND pdf IS NOT NULL"
+        else:
+            sentencia = "DELETE FROM cotizaciones WHERE creada < ?"
+        return self._conexion().execute(sentencia, (antes_de,)).rowcount
+
+    def compactar(self):
+        """Reescribe el archivo sin las paginas libres; bloquea a los demas mientras dura"""
+        self._conexion().execute("VACUUM")
+
+    def cerrar(self, timeout=5):
+        """Escribe lo pendiente y detiene el escritor"""
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "registradas": self.registradas,
+                "pendientes": self._cola.qsize(),
+                "lotes": self.lotes,
+                "descartadas": self.descartadas,
+                "errores": self.errores,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ruta", help="archivo SQLite del historial")
+    parser.add_argument("--numero")
+    parser.add_argument("--desde", help="check-in desde AAAA-MM-DD")
+    parser.add_argument("--hasta", help="check-in hasta AAAA-MM-DD")
+    parser.add_argument("--creadas-desde", help="emitidas desde AAAA-MM-DD")
+    parser.add_argument("--limite", type=int, default=1000)
+    parser.add_argument("--pdf", type=int, help="id de la cotizacion cuyo PDF se extrae")
+    parser.add_argument("--salida", help="archivo donde escribir el PDF de --pdf")
+    parser.add_argument("--purgar-dias", type=int, help="borra las cotizaciones emitidas hace mas de N dias")
+    parser.add_argument("--purgar-pdf-dias", type=int, help="quita el PDF de las emitidas hace mas de N dias")
+    parser.add_argument("--compactar", action="store_true", help="VACUUM tras purgar, para achicar el archivo")
+    args = parser.parse_args()
+
+    historial = HistorialCotizaciones(args.ruta)
+    if args.purgar_dias is not None or args.purgar_pdf_dias is not None or args.compactar:
+        ahora = time.time()
+        if args.purgar_pdf_dias is not None:
+            cantidad = historial.purgar(ahora - args.purgar_pdf_dias * 86400, solo_pdf=True)
+            print(f"PDF quitados: {cantidad}")
+        if args.purgar_dias is not None:
+            cantidad = historial.purgar(ahora - args.purgar_dias * 86400)
+            print(f"Cotizaciones borradas: {cantidad}")
+        if args.compactar:
+            historial.compactar()
+        return
+
+    if args.pdf is not None:
+        pdf_bytes = historial.pdf(args.pdf)
+        if not pdf_bytes:
+            print(f"Error: la cotizacion {args.pdf} no existe o no tiene PDF guardado")
+            sys.exit(1)
+        with open(args.salida or f"cotizacion_{args.pdf}.pdf", "wb") as f:
+            f.write(pdf_bytes)
+        return
+
+    creadas_desde = None
+    if args.creadas_desde:
+        creadas_desde = datetime.strptime(args.creadas_desde, '%Y-%m-%d').timestamp()
+    for fila in historial.buscar(args.numero, args.desde, args.hasta, creadas_desde, limite=args.limite):
+        print(json.dumps(fila, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import time
+
+
+class LimitadorTokens:
+    """
+    Token bucket por clave (el numero del chat) sobre un `Almacen`, asi que
+    con el backend SQLite el limite es comun a todos los workers.
+
+    Cada clave acumula hasta `capacidad` tokens y recupera `por_segundo`.
+    `reservar` no rechaza apenas se agotan: toma el proximo token y devuelve
+    cuanto falta para que exista, mientras no supere `espera_maxima`. Asi una
+    rafaga corta se difiere y solo un flujo sostenido se rechaza.
+    """
+
+    def __init__(self, almacen, capacidad=10, por_segundo=1 / 6, espera_maxima=30):
+        self.almacen = almacen
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.espera_maxima = espera_maxima
+        # Pasado este tiempo sin mensajes la clave estaria llena: se olvida
+        self.ttl = int(capacidad / por_segundo + espera_maxima) + 1
+
+    def reservar(self, clave, ahora=None):
+        """
+        Segundos que hay que diferir el mensaje (0 si hay token disponible),
+        o None si la espera superaria `espera_maxima`; en ese caso no se consume.
+        """
+        ahora = ahora or time.time()
+
+        def reservar(estado):
+            if estado is None:
+                tokens = self.capacidad
+            else:
+                tokens = min(self.capacidad, estado["tokens"] + (ahora - estado["timestamp"]) * self.por_segundo)
+            tokens -= 1
+            espera = max(0.0, -tokens / self.por_segundo)
+            if espera > self.espera_maxima:
+                return estado, None
+            return {"tokens": tokens, "timestamp": ahora}, espera
+
+        return self.almacen.actualizar(clave, reservar, self.ttl)
@@ -0,0 +1,143 @@
+"""
+Metricas en memoria con exposicion en formato de texto de Prometheus.
+
+Los histogramas usan buckets fijos: observar un valor es una busqueda binaria
+y un incremento bajo un lock, sin asignaciones en el camino caliente. Los
+valores que ya llevan otros componentes (tamano de la cola, de la cache, de
+los almacenes) se leen al momento de exponer mediante funciones.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Segundos: de 1 ms a 30 s
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    pares = ",".join(f'{n}="{str(v)}"' for n, v in zip(nombres, valores))
+    return "{" + pares + "}"
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                # [conteos por bucket..., +Inf] , suma
+                serie = self._series[etiquetas] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    @contextmanager
+    def medir(self, *etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *etiquetas)
+
+    def lineas(self):
+        with self._lock:
+            series = [(k, list(conteos), suma) for k, (conteos, suma) in self._series.items()]
+        for valores, conteos, suma in sorted(series):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ("+Inf",), conteos):
+                acumulado += conteo
+                etiquetas = _etiquetas(self.etiquetas + ("le",), valores + (limite,))
+                yield f"{self.nombre}_bucket{etiquetas} {acumulado}"
+            etiquetas = _etiquetas(self.etiquetas, valores)
+            yield f"{self.nombre}_sum{etiquetas} {suma}"
+            yield f"{self.nombre}_count{etiquetas} {acumulado}"
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *etiquetas, cantidad=1):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + cantidad
+
+    def lineas(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for etiquetas, valor in valores:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, etiquetas)} {valor}"
+
+
+class MetricaFuncion:
+    """Gauge o contador cuyo valor se obtiene llamando a `funcion` al exponer"""
+
+    def __init__(self, nombre, ayuda, funcion, tipo="gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def lineas(self):
+        try:
+            valor = self.funcion()
+        except Exception as e:
+            print(f"Error leyendo metrica {self.nombre}: {e}")
+            return
+        yield f"{self.nombre} {valor}"
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            existente = self._metricas.get(metrica.nombre)
+            if existente is not None:
+                return existente
+            self._metricas[metrica.nombre] = metrica
+            return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def gauge(self, nombre, ayuda, funcion):
+        return self._registrar(MetricaFuncion(nombre, ayuda, funcion, "gauge"))
+
+    def contador_funcion(self, nombre, ayuda, funcion):
+        return self._registrar(MetricaFuncion(nombre, ayuda, funcion, "counter"))
+
+    def texto_prometheus(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.lineas())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
@@ -0,0 +1,395 @@
+"""
+Nucleo del bot compartido por las dos variantes del servicio: `app.py`
+(Flask/WSGI, cola de hilos) y `app_asgi.py` (asyncio).
+
+Contiene el estado (deduplicacion, ventanas de agrupacion, reservas
+parciales, cache y servicio de PDFs, metricas comunes) y los pasos del
+pipeline que no dependen de como se hace la E/S: filtrar el webhook,
+deduplicar, extraer la reserva, generar la cotizacion y encolar las
+respuestas en una `ColaSalida`. Cada variante drena esa cola con sus
+propias llamadas a Evolution API.
+"""
+import atexit
+import functools
+import json
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from config import (
+    WEBHOOK_TOKEN, DURACION_ESCRIBIENDO, PDF_CON_RESUMEN, TIEMPO_MENSAJE_ANTIGUO, TIEMPO_AGRUPACION, TIEMPO_ENFRIAMIENTO,
+    NUMEROS_AUTORIZADOS, CACHE_PDF_MAX_BYTES, CACHE_PDF_DIRECTORIO,
+    CACHE_PDF_MAX_BYTES_DISCO, ALMACEN_BACKEND, ALMACEN_RUTA_SQLITE,
+    TTL_MENSAJES_PROCESADOS, TTL_CONVERSACION,
+    PDF_PROCESOS, PDF_MAX_PENDIENTES, PDF_TIMEOUT,
+    LIMITE_RAFAGA_POR_NUMERO, LIMITE_MENSAJES_POR_MINUTO, LIMITE_ESPERA_MAXIMA,
+    HISTORIAL_RUTA, HISTORIAL_GUARDAR_PDF, HISTORIAL_TAM_LOTE, HISTORIAL_INTERVALO
+)
+from agregador import AgregadorMensajes
+from almacen import crear_almacen
+from cache_pdf import CachePDF, clave_cotizacion
+from extractor import es_pedido_reenvio, extraer_informacion_reserva
+from habitaciones import ESTANDAR
+from historial_cotizaciones import HistorialCotizaciones
+from limitador import LimitadorTokens
+from metricas import registro
+from precios import calcular_totales_estadia, version_precios
+from reservas import ReservasParciales, campos_faltantes, mensaje_campos_faltantes
+from salida import DOCUMENTO, MARCAR_LEIDO, MENSAJE, PRESENCIA, ColaSalida, Envio
+from servicio_pdf import ServicioPDF, firma_renderizador
+
+try:
+    import orjson
+except ImportError:  # Sin orjson se parsea con json de la biblioteca estandar
+    orjson = None
+
+# Prefiltro del webhook: sin esta cadena en el cuerpo el evento no es un
+# mensaje nuevo (presencia, estados, conexion...) y se descarta sin parsear
+_EVENTO_MENSAJE = b'"messages.upsert"'
+
+MENSAJE_ERROR_COTIZACION = "Error generando la cotizacion. Intente nuevamente."
+TEXTO_REENVIO = "Cotizacion del {check_in} al {check_out} ({noches} noches), total ${total_bruto:,} CLP"
+
+mensajes_procesados = crear_almacen(
+    "mensajes_procesados", ALMACEN_BACKEND, ALMACEN_RUTA_SQLITE, TTL_MENSAJES_PROCESADOS
+)
+conversaciones_activas = crear_almacen(
+    "conversaciones_activas", ALMACEN_BACKEND, ALMACEN_RUTA_SQLITE, TTL_CONVERSACION
+)
+reservas_parciales = ReservasParciales(
+    crear_almacen("reservas_parciales", ALMACEN_BACKEND, ALMACEN_RUTA_SQLITE, TTL_CONVERSACION),
+    ttl=TTL_CONVERSACION
+)
+agregador = AgregadorMensajes(
+    conversaciones_activas,
+    ventana=TIEMPO_AGRUPACION,
+    enfriamiento=TIEMPO_ENFRIAMIENTO,
+    ttl=TTL_CONVERSACION
+)
+cache_pdf = CachePDF(
+    max_bytes=CACHE_PDF_MAX_BYTES,
+    directorio=CACHE_PDF_DIRECTORIO,
+    max_bytes_disco=CACHE_PDF_MAX_BYTES_DISCO
+)
+servicio_pdf = ServicioPDF(procesos=PDF_PROCESOS, max_pendientes=PDF_MAX_PENDIENTES, timeout=PDF_TIMEOUT)
+atexit.register(servicio_pdf.detener)
+# Cada variante asigna `salida.al_activar` para lanzar su drenador
+salida = ColaSalida()
+limitador = None
+if LIMITE_MENSAJES_POR_MINUTO:
+    limitador = LimitadorTokens(
+        crear_almacen("limite_numeros", ALMACEN_BACKEND, ALMACEN_RUTA_SQLITE),
+        capacidad=LIMITE_RAFAGA_POR_NUMERO,
+        por_segundo=LIMITE_MENSAJES_POR_MINUTO / 60,
+        espera_maxima=LIMITE_ESPERA_MAXIMA
+    )
+historial = None
+if HISTORIAL_RUTA:
+    historial = HistorialCotizaciones(
+        HISTORIAL_RUTA, tam_lote=HISTORIAL_TAM_LOTE, intervalo=HISTORIAL_INTERVALO,
+        guardar_pdf=HISTORIAL_GUARDAR_PDF
+    )
+    atexit.register(historial.cerrar)
+
+hist_etapas = registro.histograma("bot_etapa_segundos", "Duracion de cada etapa del pipeline", ("etapa",))
+hist_api = registro.histograma(
+    "bot_evolution_api_segundos", "Latencia de las llamadas a Evolution API", ("endpoint",)
+)
+errores_api = registro.contador(
+    "bot_evolution_api_fallos_total", "Llamadas a Evolution API fallidas o reintentadas",
+    ("endpoint", "tipo")
+)
+descartados_webhook = registro.contador(
+    "bot_webhook_descartados_total", "Webhooks descartados antes del pipeline", ("motivo",)
+)
+rechazados_webhook = registro.contador(
+    "bot_webhook_rechazados_total", "Mensajes rechazados por sobrecarga o por el limite por numero", ("motivo",)
+)
+retrasados_webhook = registro.contador(
+    "bot_webhook_retrasados_total", "Mensajes diferidos por el limite por numero"
+)
+registro.gauge("bot_cache_pdf_bytes", "Bytes en la cache de PDFs", lambda: cache_pdf.estadisticas()["bytes"])
+registro.gauge("bot_cache_pdf_entradas", "PDFs en la cache", lambda: cache_pdf.estadisticas()["entradas"])
+registro.contador_funcion("bot_cache_pdf_hits_total", "Aciertos de la cache de PDFs", lambda: cache_pdf.hits + cache_pdf.hits_disco)
+registro.contador_funcion("bot_cache_pdf_misses_total", "Fallos de la cache de PDFs", lambda: cache_pdf.misses)
+registro.contador_funcion("bot_cache_pdf_evictions_total", "Expulsiones de la cache de PDFs", lambda: cache_pdf.evictions)
+registro.gauge("bot_pdf_pendientes", "Renderizados de PDF en curso o esperando", lambda: servicio_pdf.pendientes)
+registro.contador_funcion("bot_pdf_rechazados_total", "Renderizados rechazados por saturacion", lambda: servicio_pdf.rechazados)
+registro.contador_funcion("bot_pdf_timeouts_total", "Renderizados que superaron el tiempo maximo", lambda: servicio_pdf.timeouts)
+registro.gauge("bot_mensajes_procesados", "Ids de mensajes en el almacen de deduplicacion", mensajes_procesados.tamano)
+registro.gauge("bot_conversaciones_activas", "Conversaciones en el almacen", conversaciones_activas.tamano)
+registro.gauge("bot_reservas_parciales", "Reservas parciales en curso", reservas_parciales.almacen.tamano)
+registro.gauge("bot_salida_pendientes", "Envios a Evolution API esperando su turno", salida.pendientes)
+if historial is not None:
+    registro.contador_funcion("bot_historial_registradas_total", "Cotizaciones guardadas en el historial", lambda: historial.registradas)
+    registro.contador_funcion("bot_historial_descartadas_total", "Cotizaciones no guardadas por cola llena", lambda: historial.descartadas)
+    registro.gauge("bot_historial_pendientes", "Cotizaciones esperando al escritor del historial", lambda: historial.estadisticas()["pendientes"])
+
+
+@contextmanager
+def etapa(nombre):
+    """Mide una etapa del pipeline en el histograma comun"""
+    with hist_etapas.medir(nombre):
+        yield
+
+
+def cargar_json(cuerpo):
+    """Parsea el cuerpo del webhook; lanza ValueError si no es JSON valido"""
+    if orjson is not None:
+        return orjson.loads(cuerpo)
+    return json.loads(cuerpo)
+
+def analizar_webhook(token, cuerpo):
+    """
+    Valida y filtra un webhook de Evolution API. Devuelve `(mensaje, None)`
+    si hay un mensaje que procesar, o `(None, (respuesta, status))` con la
+    respuesta inmediata.
+    """
+    if token != WEBHOOK_TOKEN:
+        return None, ({"error": "Token invalido"}, 401)
+    if _EVENTO_MENSAJE not in cuerpo:
+        descartados_webhook.incrementar("evento")
+        return None, ({"status": "ok"}, 200)
+    try:
+        data = cargar_json(cuerpo)
+    except ValueError:
+        return None, ({"error": "JSON invalido"}, 400)
+
+    event = data.get('event')
+    if event != 'messages.upsert':
+        descartados_webhook.incrementar("evento")
+        return None, ({"status": "ok"}, 200)
+
+    mensaje_data = data.get('data', {})
+    key = mensaje_data.get('key', {})
+    if key.get('fromMe'):
+        descartados_webhook.incrementar("propio")
+        return None, ({"status": "ok"}, 200)
+
+    remote_jid = key.get('remoteJid', '')
+    numero = remote_jid.split('@')[0]
+    if numero not in NUMEROS_AUTORIZADOS:
+        descartados_webhook.incrementar("no_autorizado")
+        return None, ({"status": "no_autorizado"}, 200)
+
+    message = mensaje_data.get('message', {})
+    texto = (message.get('conversation') or
+             message.get('extendedTextMessage', {}).get('text') or '')
+    if not texto or not numero:
+        return None, ({"status": "ok"}, 200)
+
+    return {
+        "numero": numero,
+        "remote_jid": remote_jid,
+        "message_id": key.get('id', ''),
+        "texto": texto,
+        "instance": data.get('instance'),
+        "timestamp": mensaje_data.get('messageTimestamp', 0),
+    }, None
+
+def admitir(numero, saturada=False, message_id=None, timestamp_mensaje=None):
+    """
+    Limites antes de aceptar un mensaje; `saturada` es la sobrecarga propia
+    de la variante (cola o tareas). Devuelve `(espera, None)` con los
+    segundos que se difiere el mensaje, o `(None, (respuesta, status))`.
+    Los rechazos no registran el id: un reintento de Evolution API se procesara.
+    Un id ya procesado o un mensaje antiguo responde 200 antes de tomar un
+    token: una instancia que reenvia su historial no agota el cupo del numero.
+    """
+    if message_id is not None and mensajes_procesados.obtener(message_id) is not None:
+        return None, ({"status": "ok"}, 200)
+    if timestamp_mensaje is not None and time.time() - timestamp_mensaje > TIEMPO_MENSAJE_ANTIGUO:
+        return None, ({"status": "ok"}, 200)
+    if saturada:
+        rechazados_webhook.incrementar("cola")
+        return None, ({"status": "ocupado"}, 503)
+    if servicio_pdf.saturado():
+        rechazados_webhook.incrementar("pdf")
+        return None, ({"status": "ocupado"}, 503)
+    if limitador is None:
+        return 0.0, None
+    espera = limitador.reservar(numero)
+    if espera is None:
+        rechazados_webhook.incrementar("numero")
+        return None, ({"status": "limitado"}, 429)
+    if espera > 0:
+        retrasados_webhook.incrementar()
+    return espera, None
+
+def debe_procesar_mensaje(numero, message_id, timestamp_mensaje, texto=""):
+    """
+    Deduplica el mensaje y lo agrega a la ventana de agrupacion de la
+    conversacion. True si se acepto y hay que programar el cierre de la ventana.
+    """
+    ahora = time.time()
+
+    if mensajes_procesados.obtener(message_id) is not None:
+        return False
+
+    diferencia = ahora - timestamp_mensaje
+    if diferencia > TIEMPO_MENSAJE_ANTIGUO:
+        return False
+
+    # El id se registra recien cuando el agregador tiene el texto: si algo
+    # falla antes, el reintento de Evolution API se procesa. El agregador
+    # ignora un id que ya esta en su buffer.
+    if not agregador.agregar(numero, message_id, texto, ahora):
+        return False
+    mensajes_procesados.guardar(message_id, ahora, TTL_MENSAJES_PROCESADOS)
+    return True
+
+def cerrar_conversacion(numero, enfriar=True):
+    """
+    Sin enfriamiento (cuando pedimos datos faltantes) la respuesta del
+    usuario abre de inmediato una nueva ventana de agrupacion.
+    """
+    if enfriar:
+        agregador.cerrar(numero)
+    else:
+        agregador.liberar(numero)
+
+def limpiar_cache():
+    mensajes_procesados.purgar()
+    conversaciones_activas.purgar()
+    if limitador is not None:
+        limitador.almacen.purgar()
+
+def extraer_reserva(numero, texto):
+    """Completa la reserva parcial con el texto; devuelve `(info_reserva, faltantes)`"""
+    info_reserva = reservas_parciales.actualizar(numero, extraer_informacion_reserva(texto))
+    return info_reserva, campos_faltantes(info_reserva)
+
+def cotizacion_a_reenviar(numero, texto):
+    """
+    La ultima cotizacion guardada de `numero` si el texto solo pide
+    reenviarla (sin datos de una reserva nueva); si no, None.
+    """
+    if historial is None or not es_pedido_reenvio(texto):
+        return None
+    if any(extraer_informacion_reserva(texto).values()):
+        return None
+    anterior = historial.ultima(numero)
+    if anterior is None or not anterior["pdf"]:
+        return None
+    return anterior
+
+def generar_cotizacion(numero, info_reserva, medir=etapa):
+    """
+    Precios y PDF de una reserva completa; devuelve `(resumen, pdf_bytes)`.
+    Lanza una excepcion si las fechas son invalidas o el PDF no se pudo generar.
+    """
+    check_in = datetime.strptime(info_reserva['check_in'], '%Y-%m-%d')
+    check_out = datetime.strptime(info_reserva['check_out'], '%Y-%m-%d')
+    cantidad_noches = (check_out - check_in).days
+
+    if cantidad_noches <= 0:
+        raise ValueError("Fechas invalidas")
+
+    with medir("precios"):
+        # La mezcla estructurada evita re-parsear el texto de tipos
+        totales = calcular_totales_estadia(
+            info_reserva['mezcla_habitaciones'] or info_reserva['tipo_habitaciones'],
+            check_in.date(),
+            cantidad_noches
+        )
+
+    with medir("pdf"):
+        version = version_precios()
+        clave = clave_cotizacion(
+            info_reserva, totales, cantidad_noches,
+            version, datetime.now().strftime('%Y-%m-%d'), firma_renderizador()
+        )
+        pdf_bytes = cache_pdf.obtener_o_generar(
+            clave,
+            lambda: servicio_pdf.renderizar(info_reserva, totales, cantidad_noches)
+        )
+
+    # Recien con el PDF listo: si el renderizado falla, el "intente
+    # nuevamente" del huesped conserva los datos ya reunidos
+    reservas_parciales.descartar(numero)
+
+    if historial is not None:
+        historial.registrar(numero, info_reserva, totales, cantidad_noches, version, pdf_bytes)
+
+    # Construir mensaje de resumen
+    habitaciones_lista = []
+    for hab in totales['habitaciones']:
+        habitaciones_lista.append(f"{hab['cantidad']} {hab['tipo'].replace('Habitación ', '')}")
+
+    resumen = (
+        f"Cotizacion generada:\n"
+        f"Check-in: {info_reserva['check_in']}\n"
+        f"Check-out: {info_reserva['check_out']}\n"
+        f"Noches: {cantidad_noches}\n"
+        f"Habitaciones: {', '.join(habitaciones_lista)}\n"
+        f"Total: ${totales['total_bruto']:,} CLP"
+    )
+    return resumen, pdf_bytes
+
+def procesar_mensaje(numero, remote_jid, message_id, texto, instance_name, medir=etapa):
+    """
+    Extrae y cotiza el texto agrupado y encola las respuestas en `salida`.
+    Lo que sigue a "escribiendo..." sale DURACION_ESCRIBIENDO despues de
+    encolar la presencia: la cotizacion se genera mientras tanto.
+    """
+    salida.agregar(numero, Envio(MARCAR_LEIDO, instance_name, (remote_jid, message_id)))
+
+    with medir("extraccion"):
+        anterior = cotizacion_a_reenviar(numero, texto)
+        if anterior is None:
+            # Completa la reserva parcial de la conversacion con lo que trae el mensaje
+            info_reserva, faltantes = extraer_reserva(numero, texto)
+
+    salida.agregar(numero, Envio(PRESENCIA, instance_name, (numero, DURACION_ESCRIBIENDO)))
+    escribiendo = time.time()
+    listo = escribiendo + DURACION_ESCRIBIENDO
+
+    if anterior is not None:
+        # El PDF guardado sale tal cual, sin recalcular precios ni renderizar
+        salida.agregar(numero, Envio(
+            DOCUMENTO, instance_name, (numero, anterior["pdf"], TEXTO_REENVIO.format(**anterior)), listo,
+            functools.partial(cerrar_conversacion, numero), escribiendo
+        ))
+        return
+
+    if faltantes:
+        salida.agregar(numero, Envio(
+            MENSAJE, instance_name, (numero, mensaje_campos_faltantes(faltantes)), listo,
+            functools.partial(cerrar_conversacion, numero, False), escribiendo
+        ))
+        return
+
+    cerrar = functools.partial(cerrar_conversacion, numero)
+    try:
+        resumen, pdf_bytes = generar_cotizacion(numero, info_reserva, medir)
+    except Exception as e:
+        print(f"Error generando cotizacion: {e}")
+        salida.agregar(numero, Envio(MENSAJE, instance_name, (numero, MENSAJE_ERROR_COTIZACION), listo, cerrar, escribiendo))
+        return
+
+    if PDF_CON_RESUMEN:
+        # Una sola llamada: el resumen va como texto del documento
+        salida.agregar(numero, Envio(DOCUMENTO, instance_name, (numero, pdf_bytes, resumen), listo, cerrar, escribiendo))
+    else:
+        salida.agregar(numero, Envio(MENSAJE, instance_name, (numero, resumen + "\nEnviando PDF..."), listo,
+                                     escribiendo_desde=escribiendo))
+        salida.agregar(numero, Envio(DOCUMENTO, instance_name, (numero, pdf_bytes, None), al_terminar=cerrar))
+
+def precalentar():
+    """Carga ReportLab (o el pool de PDF), NumPy, el catalogo y el extractor"""
+    servicio_pdf.iniciar()
+    version_precios()
+    calcular_totales_estadia(ESTANDAR, date.today(), 1)
+    extraer_informacion_reserva("del 1 al 2, 1 doble, somos 2")
+
+def estadisticas():
+    """Estado comun para /health"""
+    return {
+        "cache_pdf": cache_pdf.estadisticas(),
+        "servicio_pdf": servicio_pdf.estadisticas(),
+        "mensajes_procesados": mensajes_procesados.tamano(),
+        "conversaciones_activas": conversaciones_activas.tamano(),
+        "reservas_parciales": reservas_parciales.almacen.tamano(),
+        "salida": salida.estadisticas(),
+        "historial": historial.estadisticas() if historial is not None else {},
+    }
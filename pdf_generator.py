@@ -8,135 +8,248 @@ from datetime import datetime, timedelta
 import io
 import base64
 import os
-from config import HOTEL_INFO
+import threading
+from reportlab import rl_config
+from config import HOTEL_INFO, PDF_COMPACTO, PDF_LOGO, PDF_LOGO_DPI, PDF_LOGO_CALIDAD
+
+LADO_LOGO = 1.2  # Pulgadas
+
+# rl_config es global en ReportLab: lo comparten todos los renderizadores
+_lock_rl_config = threading.Lock()
 
 def formatear_precio(precio):
     return f"${precio:,.0f}".replace(",", ".")
 
-def generar_cotizacion_pdf(info_reserva, totales, cantidad_noches):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=50,
-        leftMargin=50,
-        topMargin=40,
-        bottomMargin=30,
-    )
-    
-    elementos = []
-    styles = getSampleStyleSheet()
-    
-    estilo_titulo_doc = ParagraphStyle('DocTitle', parent=styles['Heading1'], fontSize=20, alignment=TA_RIGHT, textColor=colors.black)
-    estilo_hotel_nombre = ParagraphStyle('HotelName', parent=styles['Heading1'], fontSize=18, textColor=colors.black)
-    estilo_label = ParagraphStyle('Label', parent=styles['Normal'], fontSize=9, fontName='Helvetica-Bold')
-    estilo_valor = ParagraphStyle('Value', parent=styles['Normal'], fontSize=9)
-    estilo_tabla_hdr = ParagraphStyle('TblHdr', parent=styles['Normal'], fontSize=10, fontName='Helvetica-Bold', textColor=colors.white, alignment=TA_CENTER)
-
-    # Encabezado con logo
-    logo_path = "logo.png" 
-    
-    col_izq = []
-    if os.path.exists(logo_path):
-        img = Image(logo_path, width=1.2*inch, height=1.2*inch)
-        img.hAlign = 'LEFT'
-        col_izq.append(img)
-    else:
-        col_izq.append(Paragraph(HOTEL_INFO['nombre'], estilo_hotel_nombre))
-
-    header_data = [
-        [col_izq, Paragraph("COTIZACIÓN", estilo_titulo_doc)]
-    ]
-    header_tab = Table(header_data, colWidths=[3.5*inch, 3*inch])
-    header_tab.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'MIDDLE')]))
-    elementos.append(header_tab)
-    elementos.append(Spacer(1, 0.2*inch))
-    
-    # Info de control
-    fecha_emision = datetime.now().strftime('%d.%m.%Y')
-    fecha_validez = (datetime.now() + timedelta(days=2)).strftime('%d.%m.%Y')
-    
-    control_data = [
-        [Paragraph("FECHA EMISIÓN", estilo_label), Paragraph(fecha_emision, estilo_valor)],
-        [Paragraph("FECHA VALIDEZ", estilo_label), Paragraph(fecha_validez, estilo_valor)]
-    ]
-    control_tab = Table(control_data, colWidths=[1.5*inch, 1.2*inch], hAlign='RIGHT')
-    control_tab.setStyle(TableStyle([
-        ('GRID', (0,0), (-1,-1), 0.5, colors.black),
-        ('BACKGROUND', (0,0), (0,-1), colors.lightgrey)
-    ]))
-    elementos.append(control_tab)
-    elementos.append(Spacer(1, 0.3*inch))
-
-    # Datos de estadía
-    estadia_data = [
-        [Paragraph("CHECK IN", estilo_label), info_reserva['check_in'], Paragraph("NOCHES", estilo_label), str(cantidad_noches)],
-        [Paragraph("CHECK OUT", estilo_label), info_reserva['check_out'], Paragraph("HUÉSPEDES", estilo_label), str(info_reserva['cant_personas'])]
-    ]
-    estadia_tab = Table(estadia_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-    estadia_tab.setStyle(TableStyle([
-        ('BOX', (0,0), (-1,-1), 1, colors.black),
-        ('INNERGRID', (0,0), (-1,-1), 0.5, colors.black),
-        ('BACKGROUND', (0,0), (0,-1), colors.whitesmoke),
-        ('BACKGROUND', (2,0), (2,-1), colors.whitesmoke),
-    ]))
-    elementos.append(estadia_tab)
-    elementos.append(Spacer(1, 0.3*inch))
-
-    # Tabla de cargos - AHORA LISTA TODAS LAS HABITACIONES
-    tabla_header = [
-        Paragraph("DESCRIPCIÓN", estilo_tabla_hdr), 
-        Paragraph("CANT", estilo_tabla_hdr), 
-        Paragraph("UNITARIO", estilo_tabla_hdr), 
-        Paragraph("TOTAL", estilo_tabla_hdr)
-    ]
-    datos_items = [tabla_header]
-    
-    for hab in totales['habitaciones']:
-        datos_items.append([
-            hab['tipo'],
-            str(hab['cantidad']),
-            formatear_precio(hab['precio_noche']),
-            formatear_precio(hab['total'])
-        ])
+def reducir_logo(ruta, lado_px, calidad=85):
+    """
+    El logo como JPEG de a lo sumo `lado_px` por lado, con la transparencia
+    sobre fondo blanco. ReportLab incrusta un JPEG tal cual; cualquier otro
+    formato lo decodifica y comprime de nuevo en cada documento.
+    """
+    from PIL import Image as ImagenPIL
+
+    with ImagenPIL.open(ruta) as original:
+        imagen = original.convert("RGBA")
+    imagen.thumbnail((lado_px, lado_px), ImagenPIL.LANCZOS)
+    fondo = ImagenPIL.new("RGB", imagen.size, (255, 255, 255))
+    fondo.paste(imagen, mask=imagen.getchannel("A"))
+    salida = io.BytesIO()
+    fondo.save(salida, format="JPEG", quality=calidad, optimize=True)
+    return salida.getvalue()
+
+class RenderizadorCotizacion:
+    """
+    Renderizador de cotizaciones que prepara una sola vez los estilos, el logo
+    y los bloques estaticos (encabezado y pie con datos de pago). Se invalidan
+    cuando cambia HOTEL_INFO o el archivo del logo; por cotizacion solo se
+    construyen las fechas, los items y los totales.
 
-    items_tab = Table(datos_items, colWidths=[3.2*inch, 0.8*inch, 1.2*inch, 1.3*inch])
-    items_tab.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.black),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.black),
-        ('ALIGN', (1,1), (-1,-1), 'CENTER'),
-    ]))
-    elementos.append(items_tab)
-
-    # Totales
-    totales_data = [
-        ["", "NETO", formatear_precio(totales['total_neto'])],
-        ["", "IVA (19%)", formatear_precio(totales['iva'])],
-        ["", "TOTAL FINAL", formatear_precio(totales['total_bruto'])]
-    ]
-    totales_tab = Table(totales_data, colWidths=[3.7*inch, 1.5*inch, 1.3*inch])
-    totales_tab.setStyle(TableStyle([
-        ('FONTNAME', (1,0), (1,-1), 'Helvetica-Bold'),
-        ('ALIGN', (1,0), (-1,-1), 'RIGHT'),
-        ('GRID', (1,0), (-1,-1), 0.5, colors.black),
-        ('BACKGROUND', (1,2), (2,2), colors.lightgrey),
-    ]))
-    elementos.append(totales_tab)
-    
-    # Pie de página
-    elementos.append(Spacer(1, 0.5*inch))
-    
-    linea = Table([[""]], colWidths=[6.5*inch])
-    linea.setStyle(TableStyle([('LINEABOVE', (0,0), (-1,0), 1, colors.black)]))
-    elementos.append(linea)
-    
-    banco_y_terminos = f"""
-    <b>DATOS DE PAGO:</b> {HOTEL_INFO['nombre']} | RUT: {HOTEL_INFO['rut']} | Banco de Chile | Cta: 2501678302<br/>
-    <b>TÉRMINOS:</b> Cotización válida por 48 horas. Reserva requiere 100% de pago anticipado.
+    Con `compacto` el logo se reduce una vez a su tamaño impreso y los
+    flujos del PDF van comprimidos y sin codificar en ASCII85.
     """
-    elementos.append(Paragraph(banco_y_terminos, estilo_valor))
 
-    doc.build(elementos)
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
-    return base64.b64encode(pdf_bytes).decode('utf-8')
\ No newline at end of file
+    def __init__(self, logo_path=None, hotel_info=None, compacto=None):
+        self.logo_path = logo_path if logo_path is not None else PDF_LOGO
+        self.hotel_info = hotel_info if hotel_info is not None else HOTEL_INFO
+        self.compacto = PDF_COMPACTO if compacto is None else compacto
+        self._firma = None
+        # Los flowables estaticos se comparten entre documentos
+        self._lock = threading.Lock()
+
+    def _firma_actual(self):
+        try:
+            logo_mtime = os.stat(self.logo_path).st_mtime_ns
+        except OSError:
+            logo_mtime = None
+        return (tuple(sorted(self.hotel_info.items())), logo_mtime)
+
+    def _preparar(self, firma):
+        styles = getSampleStyleSheet()
+        
+        estilo_titulo_doc = ParagraphStyle('DocTitle', parent=styles['Heading1'], fontSize=20, alignment=TA_RIGHT, textColor=colors.black)
+        estilo_hotel_nombre = ParagraphStyle('HotelName', parent=styles['Heading1'], fontSize=18, textColor=colors.black)
+        self.estilo_label = ParagraphStyle('Label', parent=styles['Normal'], fontSize=9, fontName='Helvetica-Bold')
+        self.estilo_valor = ParagraphStyle('Value', parent=styles['Normal'], fontSize=9)
+        estilo_tabla_hdr = ParagraphStyle('TblHdr', parent=styles['Normal'], fontSize=10, fontName='Helvetica-Bold', textColor=colors.white, alignment=TA_CENTER)
+
+        # Encabezado con logo
+        col_izq = []
+        if firma[1] is not None:
+            logo = self.logo_path
+            if self.compacto:
+                try:
+                    logo = io.BytesIO(reducir_logo(self.logo_path, round(LADO_LOGO * PDF_LOGO_DPI), PDF_LOGO_CALIDAD))
+                except Exception as e:
+                    print(f"Error reduciendo el logo {self.logo_path}: {e}")
+            img = Image(logo, width=LADO_LOGO*inch, height=LADO_LOGO*inch)
+            img.hAlign = 'LEFT'
+            col_izq.append(img)
+        else:
+            col_izq.append(Paragraph(self.hotel_info['nombre'], estilo_hotel_nombre))
+
+        header_data = [
+            [col_izq, Paragraph("COTIZACIÓN", estilo_titulo_doc)]
+        ]
+        header_tab = Table(header_data, colWidths=[3.5*inch, 3*inch])
+        header_tab.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'MIDDLE')]))
+        self.encabezado = [header_tab, Spacer(1, 0.2*inch)]
+
+        self.label_emision = Paragraph("FECHA EMISIÓN", self.estilo_label)
+        self.label_validez = Paragraph("FECHA VALIDEZ", self.estilo_label)
+        self.label_check_in = Paragraph("CHECK IN", self.estilo_label)
+        self.label_check_out = Paragraph("CHECK OUT", self.estilo_label)
+        self.label_noches = Paragraph("NOCHES", self.estilo_label)
+        self.label_huespedes = Paragraph("HUÉSPEDES", self.estilo_label)
+        self.tabla_header = [
+            Paragraph("DESCRIPCIÓN", estilo_tabla_hdr), 
+            Paragraph("CANT", estilo_tabla_hdr), 
+            Paragraph("UNITARIO", estilo_tabla_hdr), 
+            Paragraph("TOTAL", estilo_tabla_hdr)
+        ]
+
+        self.estilo_control = TableStyle([
+            ('GRID', (0,0), (-1,-1), 0.5, colors.black),
+            ('BACKGROUND', (0,0), (0,-1), colors.lightgrey)
+        ])
+        self.estilo_estadia = TableStyle([
+            ('BOX', (0,0), (-1,-1), 1, colors.black),
+            ('INNERGRID', (0,0), (-1,-1), 0.5, colors.black),
+            ('BACKGROUND', (0,0), (0,-1), colors.whitesmoke),
+            ('BACKGROUND', (2,0), (2,-1), colors.whitesmoke),
+        ])
+        self.estilo_items = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.black),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.black),
+            ('ALIGN', (1,1), (-1,-1), 'CENTER'),
+        ])
+        self.estilo_totales = TableStyle([
+            ('FONTNAME', (1,0), (1,-1), 'Helvetica-Bold'),
+            ('ALIGN', (1,0), (-1,-1), 'RIGHT'),
+            ('GRID', (1,0), (-1,-1), 0.5, colors.black),
+            ('BACKGROUND', (1,2), (2,2), colors.lightgrey),
+        ])
+
+        # Pie de página
+        linea = Table([[""]], colWidths=[6.5*inch])
+        linea.setStyle(TableStyle([('LINEABOVE', (0,0), (-1,0), 1, colors.black)]))
+        banco_y_terminos = f"""
+        <b>DATOS DE PAGO:</b> {self.hotel_info['nombre']} | RUT: {self.hotel_info['rut']} | Banco de Chile | Cta: 2501678302<br/>
+        <b>TÉRMINOS:</b> Cotización válida por 48 horas. Reserva requiere 100% de pago anticipado.
+        """
+        self.pie = [Spacer(1, 0.5*inch), linea, Paragraph(banco_y_terminos, self.estilo_valor)]
+
+        self._fecha_emision = None
+        self._firma = firma
+
+    def _bloque_control(self):
+        """La tabla de fechas de emision/validez cambia solo una vez al dia"""
+        hoy = datetime.now().date()
+        if self._fecha_emision != hoy:
+            fecha_emision = hoy.strftime('%d.%m.%Y')
+            fecha_validez = (hoy + timedelta(days=2)).strftime('%d.%m.%Y')
+            control_data = [
+                [self.label_emision, Paragraph(fecha_emision, self.estilo_valor)],
+                [self.label_validez, Paragraph(fecha_validez, self.estilo_valor)]
+            ]
+            control_tab = Table(control_data, colWidths=[1.5*inch, 1.2*inch], hAlign='RIGHT')
+            control_tab.setStyle(self.estilo_control)
+            self._control = [control_tab, Spacer(1, 0.3*inch)]
+            self._fecha_emision = hoy
+        return self._control
+
+    def _elementos(self, info_reserva, totales, cantidad_noches):
+        elementos = list(self.encabezado)
+        elementos.extend(self._bloque_control())
+
+        # Datos de estadía
+        estadia_data = [
+            [self.label_check_in, info_reserva['check_in'], self.label_noches, str(cantidad_noches)],
+            [self.label_check_out, info_reserva['check_out'], self.label_huespedes, str(info_reserva['cant_personas'])]
+        ]
+        estadia_tab = Table(estadia_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
+        estadia_tab.setStyle(self.estilo_estadia)
+        elementos.append(estadia_tab)
+        elementos.append(Spacer(1, 0.3*inch))
+
+        # Tabla de cargos - lista todas las habitaciones; si la tarifa cambia
+        # durante la estadia, una fila por tramo para que CANT x UNITARIO x
+        # noches del tramo de el TOTAL
+        datos_items = [self.tabla_header]
+        for hab in totales['habitaciones']:
+            tramos = hab.get('tramos') or ()
+            if len(tramos) <= 1:
+                datos_items.append([
+                    hab['tipo'],
+                    str(hab['cantidad']),
+                    formatear_precio(hab['precio_noche']),
+                    formatear_precio(hab['total'])
+                ])
+                continue
+            for tramo in tramos:
+                desde = datetime.strptime(tramo['desde'], '%Y-%m-%d').strftime('%d.%m')
+                noches = f"{tramo['noches']} noche{'s' if tramo['noches'] > 1 else ''} desde {desde}"
+                datos_items.append([
+                    Paragraph(f"{hab['tipo']}<br/>{noches}", self.estilo_valor),
+                    str(hab['cantidad']),
+                    formatear_precio(tramo['precio_noche']),
+                    formatear_precio(hab['cantidad'] * tramo['precio_noche'] * tramo['noches'])
+                ])
+
+        items_tab = Table(datos_items, colWidths=[3.2*inch, 0.8*inch, 1.2*inch, 1.3*inch])
+        items_tab.setStyle(self.estilo_items)
+        elementos.append(items_tab)
+
+        # Totales
+        totales_data = [
+            ["", "NETO", formatear_precio(totales['total_neto'])],
+            ["", "IVA (19%)", formatear_precio(totales['iva'])],
+            ["", "TOTAL FINAL", formatear_precio(totales['total_bruto'])]
+        ]
+        totales_tab = Table(totales_data, colWidths=[3.7*inch, 1.5*inch, 1.3*inch])
+        totales_tab.setStyle(self.estilo_totales)
+        elementos.append(totales_tab)
+
+        elementos.extend(self.pie)
+        return elementos
+
+    def renderizar(self, info_reserva, totales, cantidad_noches):
+        """Genera el PDF y devuelve los bytes"""
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=letter,
+            rightMargin=50,
+            leftMargin=50,
+            topMargin=40,
+            bottomMargin=30,
+            pageCompression=1 if self.compacto else None,
+        )
+        with self._lock:
+            firma = self._firma_actual()
+            if firma != self._firma:
+                self._preparar(firma)
+            # ASCII85 solo hace falta para PDFs de 7 bits y agrega un 25% a
+            # cada flujo; es global en ReportLab, asi que otro renderizador no
+            # construye mientras esta cambiado y se restaura tras el documento
+            with _lock_rl_config:
+                use_a85 = rl_config.useA85
+                if self.compacto:
+                    rl_config.useA85 = 0
+                try:
+                    doc.build(self._elementos(info_reserva, totales, cantidad_noches))
+                finally:
+                    rl_config.useA85 = use_a85
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        return pdf_bytes
+
+
+_renderizador = RenderizadorCotizacion()
+
+def generar_cotizacion_pdf_bytes(info_reserva, totales, cantidad_noches):
+    return _renderizador.renderizar(info_reserva, totales, cantidad_noches)
+
+def generar_cotizacion_pdf(info_reserva, totales, cantidad_noches):
+    """Compatibilidad: devuelve el PDF como string base64"""
+    pdf_bytes = generar_cotizacion_pdf_bytes(info_reserva, totales, cantidad_noches)
+    return base64.b64encode(pdf_bytes).decode('utf-8')
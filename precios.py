@@ -1,71 +1,48 @@
-from config import PRECIOS_HABITACIONES
+from array import array
+from datetime import date
+from itertools import accumulate
+from catalogo_precios import CatalogoPrecios
+from config import ARCHIVO_PRECIOS, INTERVALO_REVISION_PRECIOS
+from habitaciones import ESTANDAR, MezclaHabitaciones, tipo_canonico
+
+_np = None  # NumPy se importa con el primer calculo (cuesta ~60 ms al arrancar)
+
+def _numpy():
+    """Modulo numpy, o None si no esta instalado"""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:  # Sin NumPy se usa el motor basado en `array`
+            _np = False
+    return _np or None
+
+def _mezcla(tipo_habitaciones):
+    """Acepta la mezcla estructurada del extractor o el texto "1 doble, 2 estandar" """
+    if isinstance(tipo_habitaciones, MezclaHabitaciones):
+        mezcla = tipo_habitaciones
+    else:
+        mezcla = MezclaHabitaciones.desde_texto(tipo_habitaciones)
+    return list(mezcla) or [(ESTANDAR, 1)]
 
 def parsear_tipos_habitaciones_corregido(tipo_habitaciones_str):
     """
-    Parsea string de tipos de habitaciones, corrigiendo el problema de suma incorrecta.
+    Parsea string de tipos de habitaciones.
     Ej: "1 doble, 2 estandar" -> [("Habitación Doble 2 Camas", 1), ("Habitación Estándar", 2)]
     """
-    if not tipo_habitaciones_str:
-        return []
-    
-    resultado = []
-    
-    # Dividir por comas, "y", "e"
-    import re
-    partes = re.split(r'[,;]|\s+y\s+|\s+e\s+', tipo_habitaciones_str.lower())
-    
-    for parte in partes:
-        parte = parte.strip()
-        if not parte:
-            continue
-        
-        # Buscar patron "cantidad tipo"
-        match = re.search(r'(\d+)\s+(doble|single|estandar|standard|superior)', parte)
-        if match:
-            cantidad = int(match.group(1))
-            tipo_raw = match.group(2)
-            
-            # Normalizar tipo
-            tipo_normalizado = normalizar_tipo_habitacion(tipo_raw)
-            resultado.append((tipo_normalizado, cantidad))
-    
-    # Si no se encontraron, usar fallback
-    if not resultado:
-        # Intentar extraer solo cantidad
-        match_cant = re.search(r'(\d+)', tipo_habitaciones_str)
-        if match_cant:
-            cantidad = int(match_cant.group(1))
-            resultado.append(("Habitación Estándar", cantidad))
-    
-    return resultado
+    return list(MezclaHabitaciones.desde_texto(tipo_habitaciones_str))
 
 def normalizar_tipo_habitacion(tipo_str):
     """Normaliza nombres de tipos de habitación"""
-    if not tipo_str:
-        return 'Habitación Estándar'
-    
-    tipo_lower = tipo_str.lower().strip()
-    tipo_lower = tipo_lower.replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
-    
-    if 'single' in tipo_lower or 'sencilla' in tipo_lower or 'simple' in tipo_lower:
-        return 'Habitación Single'
-    elif 'estandar' in tipo_lower or 'standard' in tipo_lower:
-        return 'Habitación Estándar'
-    elif 'superior' in tipo_lower or 'premium' in tipo_lower:
-        return 'Habitación Superior'
-    elif 'doble' in tipo_lower or 'matrimonial' in tipo_lower:
-        return 'Habitación Doble 2 Camas'
-    else:
-        return 'Habitación Estándar'
+    return tipo_canonico(tipo_str)
 
-def calcular_totales_corregido(tipo_habitaciones_str, cantidad_noches, precios):
+def calcular_totales_corregido(tipo_habitaciones, cantidad_noches, precios):
     """
     Versión corregida que procesa correctamente múltiples tipos de habitaciones.
+    `tipo_habitaciones` puede ser una MezclaHabitaciones o su forma de texto.
     """
-    habitaciones_parseadas = parsear_tipos_habitaciones_corregido(tipo_habitaciones_str)
-    
-    if not habitaciones_parseadas:
-        habitaciones_parseadas = [('Habitación Estándar', 1)]
+    habitaciones_parseadas = _mezcla(tipo_habitaciones)
     
     habitaciones_detalle = []
     total_neto = 0
@@ -93,6 +70,134 @@ def calcular_totales_corregido(tipo_habitaciones_str, cantidad_noches, precios):
         "total_bruto": total_bruto
     }
 
+catalogo = CatalogoPrecios(ARCHIVO_PRECIOS, intervalo_revision=INTERVALO_REVISION_PRECIOS)
+
+def obtener_precios_habitaciones():
+    """Tabla de precios base vigente por tipo de habitacion"""
+    return catalogo.precios_base()
+
+def version_precios():
+    """Version del catalogo vigente, para invalidar caches de cotizaciones"""
+    return catalogo.version
+
+def _matriz_tarifas(habitaciones, check_in, cantidad_noches, tabla):
+    """Una fila de tarifas por noche para cada tipo de la mezcla"""
+    return [tabla.tarifas(tipo, check_in, cantidad_noches) for tipo, _ in habitaciones]
+
+def _totales_por_noche(cantidades, filas, cantidad_noches):
+    """Producto cantidades x matriz de tarifas: total de cada noche y de cada tipo"""
+    np = _numpy()
+    if np is not None and filas:
+        matriz = np.asarray(filas, dtype=np.int64)
+        vector = np.asarray(cantidades, dtype=np.int64)
+        por_noche = (vector @ matriz).tolist()
+        por_tipo = (vector * matriz.sum(axis=1)).tolist()
+        return por_noche, por_tipo
+    por_noche = array('q', bytes(8 * cantidad_noches))
+    por_tipo = []
+    for cantidad, fila in zip(cantidades, filas):
+        por_tipo.append(cantidad * sum(fila))
+        for i, precio in enumerate(fila):
+            por_noche[i] += cantidad * precio
+    return por_noche.tolist(), por_tipo
+
+def _tramos_tarifa(fila, check_in):
+    """Noches consecutivas con la misma tarifa: [{"desde", "noches", "precio_noche"}, ...]"""
+    tramos = []
+    for i, precio in enumerate(fila):
+        if tramos and tramos[-1]["precio_noche"] == precio:
+            tramos[-1]["noches"] += 1
+        else:
+            desde = date.fromordinal(check_in.toordinal() + i).isoformat()
+            tramos.append({"desde": desde, "noches": 1, "precio_noche": precio})
+    return tramos
+
+def calcular_totales_estadia(tipo_habitaciones, check_in, cantidad_noches, catalogo_precios=None):
+    """
+    Totales con tarifa por noche (temporadas y fines de semana del catalogo).
+    Devuelve la misma estructura que `calcular_totales` mas `noches`: el
+    total de cada noche de la estadia. Cada habitacion trae ademas `tramos`,
+    las noches agrupadas por tarifa, que el PDF detalla cuando hay mas de uno.
+    """
+    tabla = (catalogo_precios or catalogo).tabla()
+    habitaciones = _mezcla(tipo_habitaciones)
+    cantidades = [cantidad for _, cantidad in habitaciones]
+    filas = _matriz_tarifas(habitaciones, check_in, cantidad_noches, tabla)
+    por_noche, por_tipo = _totales_por_noche(cantidades, filas, cantidad_noches)
+
+    habitaciones_detalle = []
+    for (tipo, cantidad), fila, total_tipo in zip(habitaciones, filas, por_tipo):
+        habitaciones_detalle.append({
+            "tipo": tipo,
+            "cantidad": cantidad,
+            # Con tarifa uniforme es el precio de la noche; si varia, el promedio
+            "precio_noche": round(sum(fila) / cantidad_noches) if cantidad_noches else 0,
+            "total": total_tipo,
+            "tramos": _tramos_tarifa(fila, check_in),
+        })
+
+    total_neto = sum(por_tipo)
+    iva = int(total_neto * 0.19)
+    return {
+        "habitaciones": habitaciones_detalle,
+        "total_neto": total_neto,
+        "iva": iva,
+        "total_bruto": total_neto + iva,
+        "noches": [
+            {"fecha": date.fromordinal(check_in.toordinal() + i).isoformat(), "total": total}
+            for i, total in enumerate(por_noche)
+        ]
+    }
+
+def cotizar_estadias(estadias, catalogo_precios=None):
+    """
+    Cotiza en lote una lista de `(tipo_habitaciones, check_in, cantidad_noches)`
+    sobre un mismo snapshot del catalogo.
+    """
+    tabla = (catalogo_precios or catalogo).tabla()
+    fijo = _CatalogoFijo(tabla)
+    return [
+        calcular_totales_estadia(tipo_habitaciones, check_in, cantidad_noches, fijo)
+        for tipo_habitaciones, check_in, cantidad_noches in estadias
+    ]
+
+def fechas_mas_economicas(tipo_habitaciones, desde, hasta, cantidad_noches, cantidad=3, catalogo_precios=None):
+    """
+    Fechas de entrada entre `desde` y `hasta` (inclusive) con menor total neto
+    para una estadia de `cantidad_noches`. Calcula las tarifas del periodo una
+    sola vez y suma cada ventana con sumas acumuladas.
+    Devuelve [(check_in, total_neto), ...] ordenado de menor a mayor.
+    """
+    tabla = (catalogo_precios or catalogo).tabla()
+    habitaciones = _mezcla(tipo_habitaciones)
+    cantidades = [c for _, c in habitaciones]
+    inicios = (hasta - desde).days + 1
+    if inicios <= 0 or cantidad_noches <= 0:
+        return []
+    largo = inicios + cantidad_noches - 1
+    por_noche, _ = _totales_por_noche(cantidades, _matriz_tarifas(habitaciones, desde, largo, tabla), largo)
+
+    np = _numpy()
+    if np is not None:
+        acumulado = np.concatenate(([0], np.cumsum(por_noche, dtype=np.int64)))
+        totales = (acumulado[cantidad_noches:] - acumulado[:inicios]).tolist()
+    else:
+        acumulado = [0, *accumulate(por_noche)]
+        totales = [acumulado[i + cantidad_noches] - acumulado[i] for i in range(inicios)]
+
+    base = desde.toordinal()
+    mejores = sorted(range(inicios), key=lambda i: (totales[i], i))[:cantidad]
+    return [(date.fromordinal(base + i), totales[i]) for i in mejores]
+
+class _CatalogoFijo:
+    """Adaptador que fija un snapshot para cotizar un lote con precios consistentes"""
+
+    def __init__(self, tabla):
+        self._tabla = tabla
+
+    def tabla(self):
+        return self._tabla
+
 def formatear_precio(precio):
     return f"${precio:,.0f}".replace(",", ".")
 
@@ -100,5 +205,5 @@ def formatear_precio(precio):
 def parsear_tipos_habitaciones(tipo_habitaciones_str):
     return parsear_tipos_habitaciones_corregido(tipo_habitaciones_str)
 
-def calcular_totales(tipo_habitaciones_str, cantidad_noches, precios):
-    return calcular_totales_corregido(tipo_habitaciones_str, cantidad_noches, precios)
\ No newline at end of file
+def calcular_totales(tipo_habitaciones, cantidad_noches, precios):
+    return calcular_totales_corregido(tipo_habitaciones, cantidad_noches, precios)
\ No newline at end of file
@@ -0,0 +1,63 @@
+from habitaciones import MezclaHabitaciones
+
+CAMPOS_REQUERIDOS = ['check_in', 'check_out', 'cant_personas',
+                     'cantidad_habitaciones', 'tipo_habitaciones']
+
+DESCRIPCION_CAMPOS = {
+    'check_in': "fecha de entrada",
+    'check_out': "fecha de salida",
+    'cant_personas': "cantidad de personas",
+    'cantidad_habitaciones': "cantidad de habitaciones",
+    'tipo_habitaciones': "tipo de habitaciones",
+}
+
+
+def campos_faltantes(info_reserva):
+    return [campo for campo in CAMPOS_REQUERIDOS if not info_reserva.get(campo)]
+
+def mensaje_campos_faltantes(faltantes):
+    """Pide solo los datos que aun no tenemos"""
+    if len(faltantes) == len(CAMPOS_REQUERIDOS):
+        return (
+            "Necesito mas informacion para la cotizacion. Por favor indica: "
+            "Fecha de entrada, fecha de salida, cantidad de personas, "
+            "cantidad de habitaciones y tipo de habitaciones."
+        )
+    descripciones = [DESCRIPCION_CAMPOS[campo] for campo in faltantes]
+    if len(descripciones) > 1:
+        lista = ", ".join(descripciones[:-1]) + " y " + descripciones[-1]
+    else:
+        lista = descripciones[0]
+    return f"Para completar la cotizacion solo me falta: {lista}."
+
+
+class ReservasParciales:
+    """
+    Reserva parcial por conversacion. Cada mensaje completa los campos que
+    trae y conserva los ya conocidos; expira junto con la conversacion.
+    Solo se guardan los campos con valor.
+    """
+
+    def __init__(self, almacen, ttl=3600):
+        self.almacen = almacen
+        self.ttl = ttl
+
+    def actualizar(self, numero, info_reserva):
+        """Fusiona los campos extraidos con los conocidos y devuelve la reserva completa"""
+        nuevos = {campo: info_reserva[campo] for campo in CAMPOS_REQUERIDOS if info_reserva.get(campo)}
+        if info_reserva.get('mezcla_habitaciones'):
+            nuevos['mezcla_habitaciones'] = info_reserva['mezcla_habitaciones'].a_lista()
+
+        def fusionar(parcial):
+            parcial = dict(parcial or {})
+            parcial.update(nuevos)
+            return parcial, parcial
+
+        parcial = self.almacen.actualizar(numero, fusionar, self.ttl)
+        reserva = {campo: parcial.get(campo) for campo in CAMPOS_REQUERIDOS}
+        mezcla = parcial.get('mezcla_habitaciones')
+        reserva['mezcla_habitaciones'] = MezclaHabitaciones.desde_lista(mezcla) if mezcla else None
+        return reserva
+
+    def descartar(self, numero):
+        self.almacen.eliminar(numero)
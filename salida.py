@@ -0,0 +1,103 @@
+"""
+Cola de envios a Evolution API por destinatario.
+
+El pipeline no llama a Evolution API ni espera: encola los envios de cada
+numero (leido, presencia, texto, documento) y un unico drenador por numero
+los manda en orden, cada uno despues de que el anterior respondio. Un envio
+puede tener un instante `no_antes` (la respuesta tras "escribiendo...") y
+una accion `al_terminar` (cerrar la conversacion tras el ultimo envio).
+
+No se combinan leidos ni presencias: el agregador ya junta los fragmentos
+de la conversacion y no abre la siguiente ejecucion hasta que `al_terminar`
+la cierra, asi que cada ejecucion encola un solo leido y una sola presencia,
+siempre seguidos de su respuesta.
+"""
+import threading
+import time
+
+# Tipos de envio; coinciden con los nombres de las etapas medidas
+MARCAR_LEIDO = "marcar_leido"
+PRESENCIA = "presencia"
+MENSAJE = "enviar_mensaje"
+DOCUMENTO = "enviar_pdf"
+
+
+class Envio:
+    """
+    `escribiendo_desde`, en la respuesta que sigue a "escribiendo...", es
+    cuando se encolo la presencia: el drenador mide la espera real como la
+    etapa "escribiendo".
+    """
+    __slots__ = ("tipo", "instance", "args", "no_antes", "al_terminar", "escribiendo_desde")
+
+    def __init__(self, tipo, instance, args, no_antes=0.0, al_terminar=None, escribiendo_desde=None):
+        self.tipo = tipo
+        self.instance = instance
+        self.args = args
+        self.no_antes = no_antes
+        self.al_terminar = al_terminar
+        self.escribiendo_desde = escribiendo_desde
+
+
+class ColaSalida:
+    """
+    Envios pendientes por numero. `al_activar(numero)` se llama cuando un
+    numero sin drenador recibe un envio: quien usa la cola debe entonces
+    llamar a `siguiente(numero)` hasta que devuelva None, o a `liberar(numero)`
+    si no puede seguir.
+    """
+
+    def __init__(self, al_activar=None):
+        self.al_activar = al_activar
+        self._pendientes = {}
+        self._activos = set()
+        self._lock = threading.Lock()
+
+        self.encolados = 0
+
+    def agregar(self, numero, envio):
+        with self._lock:
+            cola = self._pendientes.setdefault(numero, [])
+            self.encolados += 1
+            cola.append(envio)
+            activar = numero not in self._activos
+            self._activos.add(numero)
+        if activar and self.al_activar is not None:
+            self.al_activar(numero)
+
+    def siguiente(self, numero, ahora=None):
+        """
+        El proximo envio de `numero`, los segundos que faltan si aun no
+        corresponde, o None si no quedan (el numero se libera).
+        """
+        ahora = ahora or time.time()
+        with self._lock:
+            cola = self._pendientes.get(numero)
+            if not cola:
+                self._pendientes.pop(numero, None)
+                self._activos.discard(numero)
+                return None
+            restante = cola[0].no_antes - ahora
+            if restante > 0:
+                return restante
+            return cola.pop(0)
+
+    def liberar(self, numero):
+        """
+        Para el drenador que termina por un error: el numero queda libre y lo
+        pendiente sale con el drenador que active el proximo envio.
+        """
+        with self._lock:
+            self._activos.discard(numero)
+
+    def pendientes(self):
+        with self._lock:
+            return sum(len(cola) for cola in self._pendientes.values())
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "destinatarios": len(self._activos),
+                "pendientes": sum(len(cola) for cola in self._pendientes.values()),
+                "encolados": self.encolados,
+            }
@@ -0,0 +1,192 @@
+"""
+Servicio de renderizado de cotizaciones en un pool de procesos.
+
+El layout de ReportLab es CPU en Python puro y retiene el GIL: con hilos
+solo se renderiza un PDF a la vez por proceso. El servicio reparte los
+renderizados en `procesos` procesos que importan ReportLab y preparan los
+estilos una sola vez al arrancar.
+
+- Los envios estan acotados a `max_pendientes`; si no hay lugar en
+  `espera_envio` segundos se lanza ServicioPDFSaturado.
+- Un renderizado que supera `timeout` lanza TiempoAgotadoPDF. Como no se
+  puede matar una tarea suelta, el pool se retira: deja de recibir trabajo,
+  los demas renderizados terminan y tras otro `timeout` sus procesos se
+  terminan. El siguiente envio arranca un pool nuevo.
+- Con `procesos=0` se renderiza en el proceso actual (comportamiento anterior).
+
+Los procesos se crean con forkserver (o spawn) y no con fork: el proceso
+de la app ya tiene hilos y forkearlo no es seguro. Como con spawn, los
+procesos importan el modulo principal: los scripts que usen el servicio
+deben arrancar dentro de `if __name__ == '__main__':`.
+"""
+import multiprocessing
+import os
+import threading
+
+from config import HOTEL_INFO, PDF_COMPACTO, PDF_LOGO, PDF_LOGO_DPI, PDF_LOGO_CALIDAD
+
+
+class ServicioPDFSaturado(Exception):
+    """No hay lugar para otro renderizado pendiente"""
+
+
+class TiempoAgotadoPDF(Exception):
+    """El renderizado supero el tiempo maximo"""
+
+
+_INFO_CALENTAMIENTO = {"check_in": "2026-01-01", "check_out": "2026-01-02", "cant_personas": "1"}
+_TOTALES_CALENTAMIENTO = {
+    "habitaciones": [{"tipo": "Habitación Estándar", "cantidad": 1, "precio_noche": 1, "total": 1}],
+    "total_neto": 1,
+    "iva": 0,
+    "total_bruto": 1,
+}
+
+
+def firma_renderizador():
+    """
+    Lo que, ademas de la cotizacion, determina los bytes del PDF (perfil,
+    logo y HOTEL_INFO), para la clave de la cache: tras cambiar la
+    configuracion o el logo no se sirven PDFs anteriores. Sin ReportLab.
+    """
+    try:
+        logo_mtime = os.stat(PDF_LOGO).st_mtime_ns
+    except OSError:
+        logo_mtime = None
+    return [PDF_COMPACTO, PDF_LOGO_DPI, PDF_LOGO_CALIDAD, HOTEL_INFO, PDF_LOGO, logo_mtime]
+
+
+def _inicializar_proceso():
+    """Prepara estilos y bloques estaticos antes de recibir trabajo"""
+    _renderizar(_INFO_CALENTAMIENTO, _TOTALES_CALENTAMIENTO, 1)
+
+
+def _renderizar(info_reserva, totales, cantidad_noches):
+    # ReportLab se importa con el primer PDF, no al importar el servicio
+    from pdf_generator import generar_cotizacion_pdf_bytes
+    return generar_cotizacion_pdf_bytes(info_reserva, totales, cantidad_noches)
+
+
+def _contexto():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # El servidor de fork importa ReportLab una vez; los procesos lo heredan
+        ctx.set_forkserver_preload(["pdf_generator"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class ServicioPDF:
+    def __init__(self, procesos=2, max_pendientes=32, timeout=20, espera_envio=5):
+        self.procesos = procesos
+        self.max_pendientes = max_pendientes
+        self.timeout = timeout
+        self.espera_envio = espera_envio
+        self._pool = None
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+        self._detenido = False
+
+        self.pendientes = 0
+        self.completados = 0
+        self.rechazados = 0
+        self.timeouts = 0
+        self.errores = 0
+        self.reciclados = 0
+
+    def iniciar(self):
+        """
+        Arranca y calienta el pool (o el renderizador local con `procesos=0`);
+        si no se llama, arranca con el primer envio
+        """
+        if self.procesos > 0:
+            self._obtener_pool()
+        else:
+            _inicializar_proceso()
+
+    def _obtener_pool(self):
+        with self._lock:
+            if self._detenido:
+                raise RuntimeError("Servicio PDF detenido")
+            if self._pool is None:
+                self._pool = _contexto().Pool(self.procesos, initializer=_inicializar_proceso)
+            return self._pool
+
+    def renderizar(self, info_reserva, totales, cantidad_noches):
+        """Bytes del PDF de la cotizacion"""
+        if self.procesos <= 0:
+            return _renderizar(info_reserva, totales, cantidad_noches)
+
+        if not self._cupos.acquire(timeout=self.espera_envio):
+            with self._lock:
+                self.rechazados += 1
+            raise ServicioPDFSaturado(f"{self.max_pendientes} renderizados pendientes")
+        with self._lock:
+            self.pendientes += 1
+        try:
+            pool = self._obtener_pool()
+            resultado = pool.apply_async(_renderizar, (info_reserva, totales, cantidad_noches))
+            try:
+                pdf_bytes = resultado.get(self.timeout)
+            except multiprocessing.TimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                self._retirar(pool)
+                raise TiempoAgotadoPDF(f"Renderizado de PDF supero {self.timeout}s")
+            except Exception:
+                with self._lock:
+                    self.errores += 1
+                raise
+            with self._lock:
+                self.completados += 1
+            return pdf_bytes
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+            self._cupos.release()
+
+    def saturado(self):
+        """Sin cupos libres: un envio nuevo esperaria `espera_envio` y podria rechazarse"""
+        return self.procesos > 0 and self.pendientes >= self.max_pendientes
+
+    def _retirar(self, pool):
+        with self._lock:
+            if self._pool is not pool:
+                return  # Otro hilo ya lo retiro
+            self._pool = None
+            self.reciclados += 1
+        pool.close()
+        threading.Thread(
+            target=self._cerrar_pool, args=(pool, self.timeout), name="retiro-pool-pdf", daemon=True
+        ).start()
+
+    @staticmethod
+    def _cerrar_pool(pool, timeout):
+        """Espera hasta `timeout` a que el pool (ya cerrado) termine; si no, lo termina"""
+        hilo = threading.Thread(target=pool.join, daemon=True)
+        hilo.start()
+        hilo.join(timeout)
+        if hilo.is_alive():
+            pool.terminate()
+            pool.join()
+
+    def detener(self, timeout=10):
+        """Deja de aceptar envios y espera los renderizados en curso"""
+        with self._lock:
+            self._detenido = True
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            self._cerrar_pool(pool, timeout)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "procesos": self.procesos if self._pool is not None else 0,
+                "pendientes": self.pendientes,
+                "completados": self.completados,
+                "rechazados": self.rechazados,
+                "timeouts": self.timeouts,
+                "errores": self.errores,
+                "reciclados": self.reciclados,
+            }
@@ -0,0 +1,128 @@
+"""
+Servidor HTTP local que imita Evolution API para pruebas y benchmarks.
+Registra cada llamada recibida y permite simular latencia y errores 5xx.
+
+    with ServidorStubEvolution() as stub:
+        cliente = ClienteEvolution(stub.url, "apikey")
+        ...
+        stub.llamadas  # [(ruta, payload), ...]
+
+`al_recibir(funcion)` registra un oyente que recibe cada llamada al llegar
+(p. ej. para medir latencias de punta a punta).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo en un solo write; evita la espera de Nagle/ACK diferido
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        stub = self.server.stub
+        largo = int(self.headers.get("Content-Length") or 0)
+        if largo:
+            cuerpo = self.rfile.read(largo)
+        elif self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            cuerpo = self._leer_chunked()
+        else:
+            cuerpo = b""
+        status = stub._registrar(self.path, self.headers, cuerpo)
+        if stub.latencia:
+            time.sleep(stub.latencia)
+        respuesta = json.dumps({"status": "ok" if status < 400 else "error"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(respuesta)))
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    def _leer_chunked(self):
+        partes = []
+        while True:
+            tamano = int(self.rfile.readline().strip().split(b";")[0], 16)
+            if tamano == 0:
+                self.rfile.readline()
+                break
+            partes.append(self.rfile.read(tamano))
+            self.rfile.readline()
+        return b"".join(partes)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Servidor(ThreadingHTTPServer):
+    # La variante asyncio abre cientos de conexiones a la vez; con la cola
+    # de 5 por defecto se pierden SYN y el cliente espera un reintento TCP
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class ServidorStubEvolution:
+    def __init__(self, host="127.0.0.1", puerto=0, latencia=0.0):
+        self.latencia = latencia
+        self.llamadas = []
+        self._fallos_pendientes = []
+        self._oyentes = []
+        self._lock = threading.Lock()
+        self._servidor = _Servidor((host, puerto), _Manejador)
+        self._servidor.stub = self
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def fallar_proximas(self, cantidad, status=500):
+        """Las proximas `cantidad` llamadas responden con `status`"""
+        with self._lock:
+            self._fallos_pendientes.extend([status] * cantidad)
+
+    def al_recibir(self, funcion):
+        """Llama a `funcion(ruta, payload)` con cada llamada recibida"""
+        self._oyentes.append(funcion)
+
+    def llamadas_a(self, endpoint):
+        return [payload for ruta, payload in self.llamadas if ruta.startswith(f"/{endpoint}/")]
+
+    def limpiar(self):
+        with self._lock:
+            self.llamadas = []
+            self._fallos_pendientes = []
+
+    def _registrar(self, ruta, headers, cuerpo):
+        tipo = headers.get("Content-Type", "")
+        if tipo.startswith("application/json"):
+            try:
+                payload = json.loads(cuerpo or b"{}")
+            except ValueError:
+                payload = cuerpo
+        else:
+            payload = cuerpo
+        with self._lock:
+            self.llamadas.append((ruta, payload))
+            status = self._fallos_pendientes.pop(0) if self._fallos_pendientes else 200
+        for oyente in self._oyentes:
+            oyente(ruta, payload)
+        return status
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
@@ -0,0 +1,74 @@
+"""
+Temporadas anidadas y solapadas: `tarifas` (por tramos) debe dar, noche a
+noche, lo mismo que `tarifa` (dia por dia).
+"""
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from catalogo_precios import _Tabla
+
+SINGLE = "Habitación Single"
+DOBLE = "Habitación Doble 2 Camas"
+
+TABLA = _Tabla({
+    "base": {SINGLE: 100, DOBLE: 150},
+    "fin_de_semana": {SINGLE: 110},
+    "temporadas": [
+        {"desde": "2026-12-01", "hasta": "2027-02-28", "precios": {SINGLE: 200, DOBLE: 250},
+         "fin_de_semana": {SINGLE: 220}},
+        {"desde": "2026-12-24", "hasta": "2026-12-26", "precios": {SINGLE: 300}},
+        # Solapada con el final de la anterior y anidada en la primera; solo fija el fin de semana
+        {"desde": "2026-12-26", "hasta": "2027-01-03", "fin_de_semana": {SINGLE: 400, DOBLE: 450}},
+        {"desde": "2027-02-20", "hasta": "2027-03-10", "precios": {DOBLE: 500}},
+    ],
+})
+
+
+def test_temporada_anidada():
+    assert TABLA.tarifa(SINGLE, date(2026, 12, 25)) == 300
+    # Terminada la anidada vuelve a regir la que la contiene
+    assert TABLA.tarifa(SINGLE, date(2026, 12, 28)) == 200
+    assert list(TABLA.tarifas(SINGLE, date(2027, 1, 10), 2)) == [200, 200]
+    assert list(TABLA.tarifas(SINGLE, date(2027, 1, 8), 3)) == [220, 220, 200]
+    assert list(TABLA.tarifas(SINGLE, date(2026, 12, 22), 8)) == [
+        200, 200, 300, 300, 400, 200, 200, 200
+    ]
+
+
+@pytest.mark.parametrize("tipo", [SINGLE, DOBLE, "Habitación Superior"])
+@pytest.mark.parametrize("check_in", [date(2026, 11, 20), date(2026, 12, 23), date(2027, 1, 2), date(2027, 2, 25)])
+def test_tarifas_igual_que_tarifa(tipo, check_in):
+    noches = 60
+    esperado = [TABLA.tarifa(tipo, check_in + timedelta(days=n)) for n in range(noches)]
+    assert list(TABLA.tarifas(tipo, check_in, noches)) == esperado
+
+
+def test_totales_estadia_por_tramos(tmp_path):
+    from catalogo_precios import CatalogoPrecios
+    from pdf_generator import generar_cotizacion_pdf_bytes
+    from precios import calcular_totales_estadia
+
+    ruta = tmp_path / "precios.json"
+    ruta.write_text(json.dumps({
+        "base": {DOBLE: 100},
+        "temporadas": [
+            {"desde": "2026-12-01", "hasta": "2027-02-28", "precios": {DOBLE: 200}},
+            {"desde": "2026-12-24", "hasta": "2026-12-26", "precios": {DOBLE: 300}},
+        ],
+    }), encoding="utf-8")
+    totales = calcular_totales_estadia("2 doble", date(2026, 12, 22), 6, CatalogoPrecios(str(ruta)))
+
+    habitacion = totales["habitaciones"][0]
+    assert habitacion["tramos"] == [
+        {"desde": "2026-12-22", "noches": 2, "precio_noche": 200},
+        {"desde": "2026-12-24", "noches": 3, "precio_noche": 300},
+        {"desde": "2026-12-27", "noches": 1, "precio_noche": 200},
+    ]
+    # Cada fila del PDF cumple CANT x UNITARIO x noches = TOTAL
+    assert habitacion["total"] == sum(2 * t["precio_noche"] * t["noches"] for t in habitacion["tramos"])
+    assert [n["total"] for n in totales["noches"]] == [400, 400, 600, 600, 600, 400]
+
+    info_reserva = {"check_in": "2026-12-22", "check_out": "2026-12-28", "cant_personas": "4"}
+    assert generar_cotizacion_pdf_bytes(info_reserva, totales, 6).startswith(b"%PDF")
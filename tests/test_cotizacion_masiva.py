@@ -0,0 +1,27 @@
+"""
+`preparar_reserva`: el mensaje libre solo completa lo que la fila no trae.
+"""
+from datetime import date, datetime
+
+from cotizacion_masiva import preparar_reserva
+
+FECHA = datetime(2026, 10, 1)
+
+
+def test_columna_tipo_manda_sobre_el_mensaje():
+    fila = {"check_in": "2026-12-10", "check_out": "2026-12-12", "cant_personas": "4",
+            "tipo_habitaciones": "2 doble", "mensaje": "1 single para 2"}
+    info, _, noches = preparar_reserva(fila, FECHA)
+    assert list(info["mezcla_habitaciones"]) == [("Habitación Doble 2 Camas", 2)]
+    assert info["cantidad_habitaciones"] == "2"
+    assert info["cant_personas"] == "4"
+    assert noches == 2
+
+
+def test_mensaje_completa_lo_que_falta():
+    fila = {"cant_personas": "2", "mensaje": "del 10 al 12, 1 single"}
+    info, check_in, noches = preparar_reserva(fila, FECHA)
+    assert list(info["mezcla_habitaciones"]) == [("Habitación Single", 1)]
+    assert info["cantidad_habitaciones"] == "1"
+    assert info["cant_personas"] == "2"
+    assert (check_in, noches) == (date(2026, 10, 10), 2)
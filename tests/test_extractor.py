@@ -0,0 +1,30 @@
+"""
+Corpus dorado del extractor: cada linea de corpus_extractor.jsonl tiene un
+texto y la salida del extractor original (antes de precompilar los patrones
+y normalizar en una pasada) con la fecha de referencia del corpus.
+"""
+import json
+import os
+
+import pytest
+
+from benchmarks.corpus import FECHA_REFERENCIA
+from extractor import extraer_informacion_reserva, extraer_informacion_reserva_batch
+
+RUTA_CORPUS = os.path.join(os.path.dirname(__file__), "corpus_extractor.jsonl")
+
+with open(RUTA_CORPUS, encoding="utf-8") as f:
+    CASOS = [json.loads(linea) for linea in f if linea.strip()]
+
+
+@pytest.mark.parametrize("caso", CASOS, ids=lambda caso: caso["texto"][:40])
+def test_igual_al_extractor_original(caso):
+    resultado = extraer_informacion_reserva(caso["texto"], FECHA_REFERENCIA)
+    assert {campo: resultado[campo] for campo in caso["esperado"]} == caso["esperado"]
+
+
+def test_batch_igual_que_uno_a_uno():
+    textos = [caso["texto"] for caso in CASOS] * 2
+    resultados = extraer_informacion_reserva_batch(textos, FECHA_REFERENCIA)
+    for texto, resultado in zip(textos, resultados):
+        assert resultado == extraer_informacion_reserva(texto, FECHA_REFERENCIA)
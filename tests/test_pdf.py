@@ -0,0 +1,57 @@
+"""
+Cache de PDFs: la clave cambia con el renderizador; y renderizadores con
+perfiles distintos en hilos paralelos no se pisan la configuracion global
+de ReportLab.
+"""
+import os
+import threading
+
+import servicio_pdf
+from cache_pdf import clave_cotizacion
+from pdf_generator import RenderizadorCotizacion
+
+INFO_RESERVA = {"check_in": "2026-12-10", "check_out": "2026-12-12", "cant_personas": "2"}
+TOTALES = {
+    "habitaciones": [{"tipo": "Habitación Single", "cantidad": 1, "precio_noche": 79980, "total": 159960}],
+    "total_neto": 159960,
+    "iva": 30392,
+    "total_bruto": 190352,
+}
+
+
+def _clave():
+    return clave_cotizacion(INFO_RESERVA, TOTALES, 2, "v1", "2026-10-18", servicio_pdf.firma_renderizador())
+
+
+def test_clave_cambia_con_el_renderizador(tmp_path, monkeypatch):
+    logo = tmp_path / "logo.png"
+    monkeypatch.setattr(servicio_pdf, "PDF_LOGO", str(logo))
+    sin_logo = _clave()
+    logo.write_bytes(b"logo")
+    con_logo = _clave()
+    os.utime(logo, ns=(0, 0))
+    logo_nuevo = _clave()
+    monkeypatch.setattr(servicio_pdf, "PDF_COMPACTO", not servicio_pdf.PDF_COMPACTO)
+    otro_perfil = _clave()
+    monkeypatch.setattr(servicio_pdf, "HOTEL_INFO", {**servicio_pdf.HOTEL_INFO, "nombre": "Otro"})
+    otro_hotel = _clave()
+    assert len({sin_logo, con_logo, logo_nuevo, otro_perfil, otro_hotel}) == 5
+    assert _clave() == otro_hotel
+
+
+def test_perfiles_en_paralelo_no_se_pisan():
+    compacto = RenderizadorCotizacion(compacto=True)
+    normal = RenderizadorCotizacion(compacto=False)
+    resultados = {True: [], False: []}
+
+    def renderizar(renderizador):
+        for _ in range(15):
+            resultados[renderizador.compacto].append(renderizador.renderizar(INFO_RESERVA, TOTALES, 2))
+
+    hilos = [threading.Thread(target=renderizar, args=(r,)) for r in (compacto, normal, compacto, normal)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert not any(b"ASCII85Decode" in pdf for pdf in resultados[True])
+    assert all(b"ASCII85Decode" in pdf for pdf in resultados[False])
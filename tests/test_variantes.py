@@ -0,0 +1,340 @@
+"""
+Los mismos escenarios de webhook contra las dos variantes del servicio:
+`app.py` (Flask, con `test_client`) y `app_asgi.py` (con el transporte ASGI
+de httpx, en un loop propio), ambas enviando al stub de Evolution API.
+
+Las dos variantes comparten el estado de `nucleo`; cada prueba usa numeros
+propios y antes de cada una se conecta `salida.al_activar` a la variante.
+"""
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+import config
+from salida import MARCAR_LEIDO
+from stub_evolution import ServidorStubEvolution
+
+TOKEN = "token-pruebas"
+NUMEROS = [f"5691{i:07d}" for i in range(200)]
+_numeros = iter(NUMEROS)
+_ids = itertools.count()
+
+
+class _VarianteFlask:
+    nombre = "flask"
+
+    def __init__(self, modulo):
+        self.modulo = modulo
+        self.cliente = modulo.crear_app().test_client()
+
+    def post(self, ruta, cuerpo):
+        respuesta = self.cliente.post(ruta, data=cuerpo, content_type="application/json")
+        return respuesta.status_code, respuesta.get_json()
+
+    def get(self, ruta):
+        respuesta = self.cliente.get(ruta)
+        return respuesta.status_code, respuesta.get_data(as_text=True)
+
+    def cerrar(self):
+        pass
+
+
+class _VarianteASGI:
+    nombre = "asgi"
+
+    def __init__(self, modulo):
+        import httpx
+
+        self.modulo = modulo
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=modulo.app), base_url="http://asgi")
+
+    def _ejecutar(self, corrutina):
+        return asyncio.run_coroutine_threadsafe(corrutina, self.loop).result()
+
+    def post(self, ruta, cuerpo):
+        respuesta = self._ejecutar(self.cliente.post(ruta, content=cuerpo))
+        return respuesta.status_code, respuesta.json()
+
+    def get(self, ruta):
+        respuesta = self._ejecutar(self.cliente.get(ruta))
+        return respuesta.status_code, respuesta.text
+
+    def cerrar(self):
+        self._ejecutar(self.cliente.aclose())
+        self._ejecutar(self.modulo.detener())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@pytest.fixture(scope="module")
+def entorno():
+    """Stub y configuracion antes de importar las apps; devuelve las dos variantes"""
+    with ServidorStubEvolution() as stub:
+        config.EVOLUTION_API_BASE = stub.url
+        config.WEBHOOK_TOKEN = TOKEN
+        config.NUMEROS_AUTORIZADOS = frozenset(NUMEROS)
+        config.DURACION_ESCRIBIENDO = 0
+        config.TIEMPO_AGRUPACION = 0.2
+        config.TIEMPO_ENFRIAMIENTO = 0.3
+        config.LIMITE_MENSAJES_POR_MINUTO = 0
+        config.PDF_PROCESOS = 0
+        config.HISTORIAL_RUTA = os.path.join(tempfile.mkdtemp(), "cotizaciones.db")
+        config.HISTORIAL_INTERVALO = 0.05
+
+        # Cada variante conecta `salida.al_activar` a su drenador al importarse
+        import nucleo
+        import app
+        activar_flask = nucleo.salida.al_activar
+        import app_asgi
+        activar_asgi = nucleo.salida.al_activar
+
+        variantes = {
+            "flask": (_VarianteFlask(app), activar_flask),
+            "asgi": (_VarianteASGI(app_asgi), activar_asgi),
+        }
+        yield stub, nucleo, variantes
+        for variante, _ in variantes.values():
+            variante.cerrar()
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def servicio(request, entorno):
+    stub, nucleo, variantes = entorno
+    variante, activar = variantes[request.param]
+    nucleo.salida.al_activar = activar
+    return variante, stub
+
+
+def _payload(numero, texto, evento="messages.upsert", message_id=None):
+    return json.dumps({
+        "event": evento,
+        "instance": "pruebas",
+        "data": {
+            "key": {"remoteJid": f"{numero}@s.whatsapp.net", "id": message_id or f"m{next(_ids)}", "fromMe": False},
+            "messageTimestamp": int(time.time()),
+            "message": {"conversation": texto},
+        },
+    }).encode("utf-8")
+
+
+def _webhook(variante, cuerpo, token=TOKEN):
+    return variante.post(f"/webhook?token={token}", cuerpo)
+
+
+def _salientes(stub, numero):
+    """(endpoint, payload) de las llamadas a Evolution API dirigidas a `numero`"""
+    llamadas = []
+    for ruta, payload in list(stub.llamadas):
+        destino = payload.get("number") or payload.get("remoteJid", "").split("@")[0]
+        if destino == numero:
+            llamadas.append(("/".join(ruta.split("/")[1:3]), payload))
+    return llamadas
+
+
+def _esperar(stub, numero, condicion, limite=10, reposo=0.3):
+    """Espera a que las llamadas de `numero` cumplan `condicion` y que no lleguen mas"""
+    fin = time.time() + limite
+    while time.time() < fin:
+        if condicion(_salientes(stub, numero)):
+            time.sleep(reposo)
+            return _salientes(stub, numero)
+        time.sleep(0.05)
+    pytest.fail(f"Sin las llamadas esperadas para {numero}: {_salientes(stub, numero)}")
+
+
+def _endpoints(llamadas, endpoint):
+    return [payload for nombre, payload in llamadas if nombre == endpoint]
+
+
+def _con_pdf(llamadas):
+    return bool(_endpoints(llamadas, "message/sendMedia"))
+
+
+def test_cotizacion_completa(servicio):
+    variante, stub = servicio
+    numero = next(_numeros)
+    assert _webhook(variante, _payload(numero, "del 10 al 12, 2 doble, somos 4")) == (202, {"status": "encolado"})
+
+    llamadas = _esperar(stub, numero, _con_pdf)
+    assert [nombre for nombre, _ in llamadas] == [
+        "chat/markMessageAsRead", "chat/sendPresence", "message/sendText", "message/sendMedia"
+    ]
+    assert _endpoints(llamadas, "message/sendText")[0]["text"].startswith("Cotizacion generada:")
+    assert _endpoints(llamadas, "message/sendMedia")[0]["fileName"] == "cotizacion.pdf"
+
+
+def test_fragmentos_se_agrupan(servicio):
+    variante, stub = servicio
+    numero = next(_numeros)
+    assert _webhook(variante, _payload(numero, "hola, del 20 al 22"))[0] == 202
+    assert _webhook(variante, _payload(numero, "2 doble, somos 4"))[0] == 202
+
+    llamadas = _esperar(stub, numero, _con_pdf)
+    assert len(_endpoints(llamadas, "message/sendText")) == 1
+    assert len(_endpoints(llamadas, "message/sendMedia")) == 1
+
+
+def test_completar_datos_faltantes(servicio):
+    variante, stub = servicio
+    numero = next(_numeros)
+    assert _webhook(variante, _payload(numero, "hola, del 20 al 22"))[0] == 202
+    # La reserva parcial se completa con la respuesta al pedido de datos
+    _esperar(stub, numero, lambda llamadas: _endpoints(llamadas, "message/sendText"), reposo=0)
+    assert _webhook(variante, _payload(numero, "2 doble, somos 4"))[0] == 202
+
+    llamadas = _esperar(stub, numero, _con_pdf)
+    textos = [payload["text"] for payload in _endpoints(llamadas, "message/sendText")]
+    assert "me falta" in textos[0]
+    assert textos[1].startswith("Cotizacion generada:")
+
+
+def test_datos_faltantes(servicio):
+    variante, stub = servicio
+    numero = next(_numeros)
+    assert _webhook(variante, _payload(numero, "hola, quiero cotizar"))[0] == 202
+
+    llamadas = _esperar(stub, numero, lambda llamadas: _endpoints(llamadas, "message/sendText"))
+    assert _endpoints(llamadas, "message/sendText")[0]["text"].startswith("Necesito mas informacion")
+    assert not _con_pdf(llamadas)
+
+
+def test_error_de_pdf_conserva_la_reserva_parcial(servicio, entorno, monkeypatch):
+    variante, stub = servicio
+    nucleo = entorno[1]
+    numero = next(_numeros)
+    renderizar = nucleo.servicio_pdf.renderizar
+    fallas = []
+
+    def falla_una_vez(*args):
+        if not fallas:
+            fallas.append(True)
+            raise RuntimeError("renderizado caido")
+        return renderizar(*args)
+
+    monkeypatch.setattr(nucleo.servicio_pdf, "renderizar", falla_una_vez)
+    # Fechas que ninguna otra prueba (ni la otra variante) cotiza: la cache de
+    # PDFs no evita el renderizado
+    dias = "del 17 al 19" if variante.nombre == "flask" else "del 25 al 27"
+    assert _webhook(variante, _payload(numero, f"{dias}, 3 superior, somos 6"))[0] == 202
+    llamadas = _esperar(stub, numero, lambda llamadas: _endpoints(llamadas, "message/sendText"), reposo=0.5)
+    assert "Intente nuevamente" in _endpoints(llamadas, "message/sendText")[0]["text"]
+
+    # El reintento sin datos usa lo que ya se habia reunido
+    assert _webhook(variante, _payload(numero, "intento de nuevo"))[0] == 202
+    llamadas = _esperar(stub, numero, _con_pdf)
+    assert _endpoints(llamadas, "message/sendText")[1]["text"].startswith("Cotizacion generada:")
+
+
+def test_mensaje_duplicado(servicio):
+    variante, stub = servicio
+    numero = next(_numeros)
+    cuerpo = _payload(numero, "del 3 al 5, 1 single, somos 1")
+    assert _webhook(variante, cuerpo)[0] == 202
+    assert _webhook(variante, cuerpo) == (200, {"status": "ok"})
+
+    llamadas = _esperar(stub, numero, _con_pdf)
+    assert len(_endpoints(llamadas, "message/sendMedia")) == 1
+
+
+def test_reenvios_de_evolution_no_gastan_el_cupo(servicio, entorno, monkeypatch):
+    from almacen import AlmacenMemoria
+    from limitador import LimitadorTokens
+
+    variante, stub = servicio
+    nucleo = entorno[1]
+    monkeypatch.setattr(nucleo, "limitador", LimitadorTokens(AlmacenMemoria(), capacidad=2, por_segundo=1e-6, espera_maxima=0))
+    numero = next(_numeros)
+    cuerpo = _payload(numero, "hola, del 20 al 22")
+    assert _webhook(variante, cuerpo)[0] == 202
+    for _ in range(5):
+        assert _webhook(variante, cuerpo) == (200, {"status": "ok"})
+    # El segundo token sigue disponible para el mensaje nuevo del huesped
+    assert _webhook(variante, _payload(numero, "2 doble, somos 4"))[0] == 202
+    assert _webhook(variante, _payload(numero, "gracias")) == (429, {"status": "limitado"})
+
+    llamadas = _esperar(stub, numero, _con_pdf)
+    assert len(_endpoints(llamadas, "message/sendMedia")) == 1
+
+
+def test_reenvio_de_la_ultima_cotizacion(servicio):
+    variante, stub = servicio
+    numero = next(_numeros)
+    assert _webhook(variante, _payload(numero, "del 6 al 8, 1 superior, somos 2"))[0] == 202
+    _esperar(stub, numero, _con_pdf, reposo=0.5)  # enfriamiento y escritura del historial
+
+    assert _webhook(variante, _payload(numero, "me reenvías la cotización?"))[0] == 202
+    llamadas = _esperar(stub, numero, lambda llamadas: len(_endpoints(llamadas, "message/sendMedia")) == 2)
+    pdfs = _endpoints(llamadas, "message/sendMedia")
+    assert pdfs[1]["media"] == pdfs[0]["media"]
+    assert pdfs[1]["caption"].startswith("Cotizacion del ")
+
+
+def _sin_destinatarios(nucleo, limite=5):
+    fin = time.time() + limite
+    while nucleo.salida.estadisticas()["destinatarios"] and time.time() < fin:
+        time.sleep(0.05)
+    return nucleo.salida.estadisticas()["destinatarios"] == 0
+
+
+def test_envio_fallido_no_detiene_la_salida(servicio, entorno, monkeypatch):
+    variante, stub = servicio
+    nucleo = entorno[1]
+    numero = next(_numeros)
+    despachar = variante.modulo.despachar
+
+    def falla_al_marcar(envio):
+        if envio.tipo == MARCAR_LEIDO and envio.args[0].startswith(numero):
+            raise RuntimeError("caida simulada")
+        return despachar(envio)
+
+    monkeypatch.setattr(variante.modulo, "despachar", falla_al_marcar)
+    assert _webhook(variante, _payload(numero, "del 14 al 16, 1 doble, somos 2"))[0] == 202
+
+    llamadas = _esperar(stub, numero, _con_pdf)
+    assert [nombre for nombre, _ in llamadas] == ["chat/sendPresence", "message/sendText", "message/sendMedia"]
+    assert _sin_destinatarios(nucleo)
+
+
+def test_numero_liberado_si_el_drenador_falla(servicio, entorno, monkeypatch):
+    variante, stub = servicio
+    nucleo = entorno[1]
+    numero = next(_numeros)
+    cerrar_conversacion = nucleo.cerrar_conversacion
+
+    def falla_al_cerrar(destino, *args):
+        cerrar_conversacion(destino, *args)
+        if destino == numero:
+            raise RuntimeError("caida simulada")
+
+    monkeypatch.setattr(nucleo, "cerrar_conversacion", falla_al_cerrar)
+    assert _webhook(variante, _payload(numero, "hola, quiero cotizar"))[0] == 202
+    _esperar(stub, numero, lambda llamadas: _endpoints(llamadas, "message/sendText"))
+    assert _sin_destinatarios(nucleo)
+
+
+def test_respuestas_inmediatas(servicio):
+    variante, stub = servicio
+    numero = next(_numeros)
+    assert _webhook(variante, _payload(numero, "hola"), token="otro") == (401, {"error": "Token invalido"})
+    assert _webhook(variante, _payload(numero, "hola", evento="presence.update")) == (200, {"status": "ok"})
+    assert _webhook(variante, _payload("56999999999", "hola")) == (200, {"status": "no_autorizado"})
+    assert _webhook(variante, b'{"event": "messages.upsert", ') == (400, {"error": "JSON invalido"})
+    time.sleep(config.TIEMPO_AGRUPACION + 0.2)
+    assert _salientes(stub, numero) == []
+
+
+def test_health_y_metricas(servicio):
+    variante, _ = servicio
+    status, cuerpo = variante.get("/health")
+    assert status == 200
+    assert json.loads(cuerpo)["status"] == "activo"
+    status, cuerpo = variante.get("/metrics")
+    assert status == 200
+    assert "bot_etapa_segundos" in cuerpo
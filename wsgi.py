@@ -0,0 +1,13 @@
+"""
+Punto de entrada WSGI para despliegues con varios procesos:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+En este modo la deduplicacion, la ventana de agrupacion y el enfriamiento de
+conversaciones cerradas se coordinan a traves del almacen SQLite compartido
+(ALMACEN_BACKEND=sqlite), de modo que fragmentos de una misma conversacion que
+llegan a workers distintos producen una sola cotizacion.
+"""
+from app import app
+
+__all__ = ["app"]